@@ -0,0 +1,4 @@
+"""Offline benchmarks for FrameCrafter capture, PDF and conversion throughput
+
+Run with `python -m benchmarks.run`; see benchmarks/run.py for options.
+"""
@@ -0,0 +1,69 @@
+import os
+import re
+import threading
+import functools
+import contextlib
+import http.server
+
+# ------------------------ RANGE REQUEST SERVER ------------------------
+
+# Static file server for the segmented download benchmark; http.server alone ignores Range headers
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve files with single byte-range (206 Partial Content) support over keep-alive connections"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests += 1
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        start, end = 0, size - 1
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        remaining = end - start + 1
+        with open(path, 'rb') as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(remaining, 65536))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+        self.server.bytes_sent += end - start + 1 - remaining
+
+# Function to serve directory on a free local port; yields (base_url, server)
+@contextlib.contextmanager
+def serve_directory(directory):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(RangeRequestHandler, directory=directory))
+    server.daemon_threads = True
+    server.requests = 0
+    server.bytes_sent = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", server
+    finally:
+        server.shutdown()
+        server.server_close()
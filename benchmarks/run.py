@@ -0,0 +1,458 @@
+"""Run the FrameCrafter benchmarks and compare them against a stored baseline
+
+    python -m benchmarks.run                                   # full suite -> benchmarks/results.json
+    python -m benchmarks.run --quick                           # two small videos only
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+    python -m benchmarks.run --save-baseline                   # store this run as the new baseline
+
+Every scenario runs in a fresh process with an empty frame cache and keyframe index, so peak RSS
+and timings are per scenario. Video info comes from a stub extractor, and segmented download
+scenarios fetch from a local HTTP server; nothing touches the network.
+"""
+import os
+import sys
+import time
+import json
+import uuid
+import shutil
+import random
+import logging
+import argparse
+import platform
+import subprocess
+import resource
+import tempfile
+import contextlib
+import concurrent.futures
+import multiprocessing
+
+from benchmarks.videos import VIDEO_SPECS, QUICK_VIDEOS, ensure_video
+from benchmarks.http_server import serve_directory
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "results.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+VIDEO_CACHE_DIR = os.path.join(BENCH_DIR, ".videos")
+
+# Timestamp shapes run against every video
+SHAPES = ('dense', 'sparse', 'interval', 'custom')
+
+# Shapes that also run through the full process_conversion path
+CONVERSION_SHAPES = ('interval', 'custom')
+
+# Shapes that also run as segmented downloads from a local HTTP server (MP4 videos only)
+SEGMENTED_SHAPES = ('sparse', 'custom')
+
+# Modules timed by the import benchmark: each entry point, and the heavy libraries they load lazily
+IMPORT_TARGETS = {
+    'framecrafter': ('framecrafter',),
+    'cli': ('framecrafter_cli',),
+    'pdf': ('framecrafter_pdf',),
+    'web': ('framecrafter_web',),
+    'dependencies': ('cv2', 'numpy', 'yt_dlp', 'fpdf', 'flask', 'flask_cors'),
+}
+
+# Import time an entry point may take, as a fraction of importing all the dependencies on the same machine
+IMPORT_BUDGETS = {'framecrafter': 0.3, 'cli': 0.3}
+
+# Fresh interpreters started per import measurement; the fastest is kept, as load on the machine only adds time
+IMPORT_RUNS = 7
+
+# ------------------------ TIMESTAMP SHAPES ------------------------
+
+# Function to build the timestamps (and notes) of a shape for a video of the given duration
+def timestamp_shape(shape, duration, seed=0):
+    rng = random.Random(f"{shape}:{duration}:{seed}")
+    if shape == 'dense':
+        # Five frames a second over a 10 second window: forward decoding within GOPs
+        start = max(0.0, duration / 2 - 5)
+        return [round(start + i * 0.2, 3) for i in range(50) if start + i * 0.2 < duration], None
+    if shape == 'sparse':
+        # A handful of far-apart points: one seek each
+        return sorted(round(rng.uniform(0, duration - 1), 3) for _ in range(8)), None
+    if shape == 'interval':
+        interval = max(1, int(duration // 12))
+        return list(range(0, int(duration) + 1, interval)), None
+    if shape == 'custom':
+        # MM:SS strings with notes, as uploaded through the web form
+        seconds = sorted(rng.sample(range(0, int(duration)), min(20, int(duration))))
+        labels = [f"{s // 60}:{s % 60:02d}" for s in seconds]
+        return labels, {str(s): f"Note for {label}" for s, label in zip(seconds, labels)}
+    raise ValueError(f"Unknown timestamp shape: {shape}")
+
+# Function to return p50/p90/p99 of a list of seconds, in milliseconds
+def percentiles(values):
+    if not values:
+        return {'p50_ms': 0.0, 'p90_ms': 0.0, 'p99_ms': 0.0}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {'p50_ms': pick(0.50), 'p90_ms': pick(0.90), 'p99_ms': pick(0.99)}
+
+# Function to read the peak resident set size of this process and its children, in MB
+def peak_rss_mb():
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak_kb / 1024, 1)
+
+# ------------------------ SCENARIOS ------------------------
+
+# Stands in for yt_dlp.YoutubeDL so process_conversion runs offline against the synthetic files
+class StubExtractor:
+    """Resolve bench://<name> URLs to synthetic local videos"""
+
+    def __init__(self, videos):
+        self.videos = videos  # name -> (path, spec)
+
+    def extract_info(self, url, download=False):
+        name = url.split('://', 1)[1]
+        path, spec = self.videos[name]
+        return {
+            'title': f"Benchmark {name}",
+            'duration': spec['seconds'],
+            'formats': [{'format_id': 'bench', 'ext': spec['ext'], 'height': spec['height'],
+                         'vcodec': spec['codec'], 'url': path}],
+        }
+
+# Function to run one scenario in the current (fresh) process and return its metrics
+def run_scenario(kind, name, path, shape, options):
+    workdir = tempfile.mkdtemp(prefix="framecrafter-bench-")
+    # Caches, job store and PDFs all live in the scratch directory and start empty
+    os.environ['FRAMECRAFTER_JOB_STORE'] = 'memory'
+    os.environ['FRAMECRAFTER_FRAME_CACHE_DIR'] = os.path.join(workdir, "frame_cache")
+    os.chdir(workdir)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            import framecrafter as fc
+            # Expected per-frame warnings (e.g. the frame at t=duration) would otherwise reach stderr
+            logging.getLogger("framecrafter").setLevel(logging.ERROR)
+            rss_after_import = peak_rss_mb()
+            if kind == 'capture':
+                metrics = _bench_capture(fc, path, shape, VIDEO_SPECS[name], options)
+            elif kind == 'segmented':
+                metrics = _bench_segmented(fc, path, shape, VIDEO_SPECS[name], options)
+            else:
+                metrics = _bench_conversion(fc, name, path, shape, options)
+        metrics['rss_after_import_mb'] = rss_after_import
+        metrics['peak_rss_mb'] = peak_rss_mb()
+        return metrics
+    finally:
+        os.chdir(BENCH_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Function to return the median of a non-empty list
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+# Function to benchmark capture_screenshots and create_pdf for one video and shape
+def _bench_capture(fc, path, shape, spec, options):
+    from framecrafter_pdf import create_pdf
+
+    timestamps, notes = timestamp_shape(shape, spec['seconds'])
+    seconds = [fc.parse_timestamp(ts) for ts in timestamps]
+    pdf_path = os.path.join(os.getcwd(), "bench.pdf")
+
+    capture_runs, pdf_runs, latencies = [], [], []
+    for _ in range(options['repeat']):
+        ticks = []
+
+        def on_progress(current, total):
+            ticks.append(time.perf_counter())
+
+        shutil.rmtree(fc.Utils.get_index_dir(), ignore_errors=True)
+        started = time.perf_counter()
+        frames = fc.capture_screenshots(path, seconds, progress_callback=on_progress, workers=options['workers'],
+                                        quality=options['quality'], cache=None)
+        capture_runs.append(time.perf_counter() - started)
+        # Per-frame latency: time between consecutive progress ticks
+        latencies += [b - a for a, b in zip([started] + ticks, ticks)]
+
+        started = time.perf_counter()
+        create_pdf(frames, video_title="Benchmark", output_pdf=pdf_path, timestamp_notes=notes)
+        pdf_runs.append(time.perf_counter() - started)
+        for record in frames:
+            record.discard()
+    capture_seconds, pdf_seconds = median(capture_runs), median(pdf_runs)
+
+    index = fc.KeyframeIndex.build(path) if path.endswith('.mp4') else None
+    metrics = {
+        'frames': len(frames),
+        'capture_seconds': round(capture_seconds, 3),
+        'capture_fps': round(len(frames) / capture_seconds, 2) if capture_seconds else 0.0,
+        'pdf_seconds': round(pdf_seconds, 3),
+        'pdf_pages_per_s': round(len(frames) / pdf_seconds, 2) if pdf_seconds else 0.0,
+        'pdf_bytes': os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0,
+        'keyframes': len(index.keyframes) if index else None,
+    }
+    metrics.update({f"capture_{key}": value for key, value in percentiles(latencies).items()})
+    return metrics
+
+# Function to benchmark the full process_conversion path (stub extractor, memory job store)
+def _bench_conversion(fc, name, path, shape, options):
+    import framecrafter_web as web
+
+    spec = VIDEO_SPECS[name]
+    fc.metadata_cache = fc.MetadataCache(fc.ExtractorPool(factory=lambda: StubExtractor({name: (path, spec)})))
+    timestamps, notes = timestamp_shape(shape, spec['seconds'])
+    interval = timestamps[1] - timestamps[0] if shape == 'interval' else None
+    mode = 'interval' if shape == 'interval' else 'custom'
+
+    durations = []
+    job = {}
+    for _ in range(options['repeat']):
+        # Cold caches for every run
+        fc.frame_cache.entries = None
+        fc.frame_cache.total_bytes = 0
+        shutil.rmtree(os.environ['FRAMECRAFTER_FRAME_CACHE_DIR'], ignore_errors=True)
+        shutil.rmtree(fc.Utils.get_index_dir(), ignore_errors=True)
+
+        job_id = str(uuid.uuid4())
+        web.job_store.create(job_id, status='queued', message='Job queued', progress=0, pdf_path=None,
+                             timestamp_notes=notes or {})
+        started = time.perf_counter()
+        web.process_conversion(job_id, f"bench://{name}", mode, timestamps if mode == 'custom' else [], interval,
+                               notes or {}, workers=options['workers'], quality=options['quality'],
+                               pipeline=options.get('pipeline', False))
+        durations.append(time.perf_counter() - started)
+        job = web.job_store.get(job_id)
+        if job['status'] != 'completed':
+            raise RuntimeError(f"Conversion failed: {job.get('message')}")
+
+    frames = len(timestamps)
+    metrics = {
+        'frames': frames,
+        'repeat': options['repeat'],
+        'conversion_seconds': round(median(durations), 3),
+        'conversion_fps': round(frames / median(durations), 2),
+        'pdf_bytes': job.get('pdf_size', 0),
+    }
+    metrics.update({f"conversion_{key}": value for key, value in percentiles(durations).items()})
+    return metrics
+
+# Function to benchmark fetching only the needed byte ranges over HTTP, then capturing from the sparse file
+def _bench_segmented(fc, path, shape, spec, options):
+    timestamps, _ = timestamp_shape(shape, spec['seconds'])
+    seconds = [fc.parse_timestamp(ts) for ts in timestamps]
+    sparse_path = os.path.join(os.getcwd(), "segments.mp4")
+
+    fetch_runs, capture_runs = [], []
+    with serve_directory(os.path.dirname(path)) as (base_url, server):
+        url = f"{base_url}/{os.path.basename(path)}"
+        for _ in range(options['repeat']):
+            shutil.rmtree(fc.Utils.get_index_dir(), ignore_errors=True)
+            server.requests = server.bytes_sent = 0
+            started = time.perf_counter()
+            stats = fc.fetch_segments(url, seconds, sparse_path)
+            fetch_runs.append(time.perf_counter() - started)
+            if stats is None:
+                raise RuntimeError("Container cannot be fetched in segments")
+
+            started = time.perf_counter()
+            frames = fc.capture_screenshots(sparse_path, seconds, quality=options['quality'], cache=None)
+            capture_runs.append(time.perf_counter() - started)
+            for record in frames:
+                record.discard()
+    segmented_seconds = median(fetch_runs) + median(capture_runs)
+    return {
+        'frames': len(frames),
+        'fetch_seconds': round(median(fetch_runs), 3),
+        'segmented_seconds': round(segmented_seconds, 3),
+        'segmented_fps': round(len(frames) / segmented_seconds, 2) if segmented_seconds else 0.0,
+        'fetched_bytes': server.bytes_sent,
+        'fetched_ratio': round(server.bytes_sent / os.path.getsize(path), 4),
+        'http_requests': server.requests,
+        'http_connections': stats['connections'],
+    }
+
+# Function to time importing modules in a fresh interpreter, in milliseconds (fastest of IMPORT_RUNS)
+def measure_import(modules):
+    code = (f"import time; started = time.perf_counter(); import {', '.join(modules)}; "
+            "print(time.perf_counter() - started)")
+    # Importing the web module creates its job store, so it runs in a scratch directory
+    workdir = tempfile.mkdtemp(prefix="framecrafter-bench-")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get('PYTHONPATH')])))
+    try:
+        runs = [float(subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env, capture_output=True,
+                                     text=True, check=True).stdout) for _ in range(IMPORT_RUNS)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'import_ms': round(min(runs) * 1000, 1), 'modules': list(modules)}
+
+# Function to list the entry points whose import time is over budget, relative to importing the dependencies
+def check_import_budgets(results):
+    dependencies = results['scenarios'].get('import/dependencies', {}).get('import_ms')
+    over = []
+    for name, budget in IMPORT_BUDGETS.items():
+        metrics = results['scenarios'].get(f"import/{name}", {})
+        if dependencies and 'import_ms' in metrics and metrics['import_ms'] > budget * dependencies:
+            over.append((name, metrics['import_ms'], budget * dependencies))
+    return over
+
+# Function to run a scenario in its own spawned process so peak RSS is not shared between scenarios
+def run_isolated(kind, name, path, shape, options):
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_scenario, kind, name, path, shape, options).result()
+
+# ------------------------ BASELINE COMPARISON ------------------------
+
+# Metrics where a larger value is better; every other numeric metric is better when smaller
+HIGHER_IS_BETTER = ('capture_fps', 'pdf_pages_per_s', 'conversion_fps', 'segmented_fps')
+
+# Metrics compared against the baseline; import time is compared as a share of the dependencies' import time,
+# which tracks code changes while absolute milliseconds follow the load on the machine
+COMPARED_METRICS = HIGHER_IS_BETTER + ('capture_p90_ms', 'conversion_p90_ms', 'peak_rss_mb', 'pdf_bytes',
+                                       'fetched_bytes', 'dependency_share')
+
+# Throughput of a phase shorter than this in the baseline is timer noise and not compared
+MIN_COMPARED_SECONDS = 0.05
+PHASE_SECONDS = {'capture_fps': 'capture_seconds', 'pdf_pages_per_s': 'pdf_seconds',
+                 'conversion_fps': 'conversion_seconds', 'segmented_fps': 'segmented_seconds'}
+
+# Latency changes smaller than this are scheduler jitter, whatever their relative size
+MIN_LATENCY_DELTA_MS = 20
+
+# Function to list the metrics that regressed by more than tolerance relative to the baseline
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, metrics in results['scenarios'].items():
+        reference = baseline.get('scenarios', {}).get(key)
+        if not reference or 'error' in metrics:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = reference.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            if reference.get(PHASE_SECONDS.get(metric), MIN_COMPARED_SECONDS) < MIN_COMPARED_SECONDS:
+                continue
+            if metric.endswith('_ms') and new - old < MIN_LATENCY_DELTA_MS:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append((key, metric, old, new, change))
+    return regressions
+
+# ------------------------ ENTRY POINT ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FrameCrafter offline benchmarks")
+    parser.add_argument("--quick", action="store_true", help=f"Only run {', '.join(QUICK_VIDEOS)}")
+    parser.add_argument("--videos", type=str, default="",
+                        help=f"Comma-separated video names (default: all of {', '.join(VIDEO_SPECS)})")
+    parser.add_argument("--shapes", type=str, default=",".join(SHAPES), help="Comma-separated timestamp shapes")
+    parser.add_argument("--no-conversion", action="store_true", help="Skip the process_conversion scenarios")
+    parser.add_argument("--no-segmented", action="store_true", help="Skip the segmented download scenarios")
+    parser.add_argument("--no-import", action="store_true", help="Skip the import time scenarios")
+    parser.add_argument("--quality", type=str, default="screen", help="Quality profile (default: screen)")
+    parser.add_argument("--workers", type=int, default=1, help="Capture processes per scenario (default: 1)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run the process_conversion scenarios with pipelined capture and PDF assembly")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per scenario; timings are medians over the runs (default: 3)")
+    parser.add_argument("--output", type=str, default=DEFAULT_RESULTS, help="Results JSON path")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative regression before failing (default: 0.25)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to the baseline path too")
+    args = parser.parse_args(argv)
+
+    names = [n for n in args.videos.split(',') if n] or (list(QUICK_VIDEOS) if args.quick else list(VIDEO_SPECS))
+    shapes = [s for s in args.shapes.split(',') if s]
+    options = {'quality': args.quality, 'workers': max(1, args.workers), 'repeat': max(1, args.repeat),
+               'pipeline': args.pipeline}
+
+    results = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': options,
+        },
+        'scenarios': {},
+    }
+
+    if not args.no_import:
+        for target, modules in IMPORT_TARGETS.items():
+            try:
+                results['scenarios'][f"import/{target}"] = measure_import(modules)
+            except (subprocess.CalledProcessError, ValueError) as e:
+                results['scenarios'][f"import/{target}"] = {'error': str(e)}
+        dependencies = results['scenarios']['import/dependencies'].get('import_ms')
+        for target in IMPORT_TARGETS:
+            key = f"import/{target}"
+            metrics = results['scenarios'][key]
+            if 'error' in metrics:
+                print(f"{key:<36} ERROR {metrics['error']}")
+            elif dependencies:
+                metrics['dependency_share'] = round(metrics['import_ms'] / dependencies, 3)
+                print(f"{key:<36} {metrics['import_ms']:>8.1f} ms  ({metrics['dependency_share']:.0%} of the dependencies)")
+
+    for name in names:
+        path = ensure_video(name, VIDEO_CACHE_DIR)
+        plan = [('capture', shape) for shape in shapes]
+        if not args.no_conversion:
+            plan += [('conversion', shape) for shape in shapes if shape in CONVERSION_SHAPES]
+        if not args.no_segmented and VIDEO_SPECS[name]['ext'] == 'mp4':
+            plan += [('segmented', shape) for shape in shapes if shape in SEGMENTED_SHAPES]
+        for kind, shape in plan:
+            key = f"{name}/{shape}/{kind}"
+            try:
+                metrics = run_isolated(kind, name, path, shape, options)
+            except Exception as e:
+                metrics = {'error': str(e)}
+            results['scenarios'][key] = metrics
+            if 'error' in metrics:
+                print(f"{key:<36} ERROR {metrics['error']}")
+            elif kind == 'capture':
+                print(f"{key:<36} {metrics['frames']:>4} frames  {metrics['capture_fps']:>8.1f} fps  "
+                      f"p90 {metrics['capture_p90_ms']:>7.1f} ms  pdf {metrics['pdf_bytes'] / 1024:>8.0f} KB  "
+                      f"rss {metrics['peak_rss_mb']:>6.0f} MB")
+            elif kind == 'segmented':
+                print(f"{key:<36} {metrics['frames']:>4} frames  {metrics['segmented_fps']:>8.1f} fps  "
+                      f"fetched {metrics['fetched_ratio']:>6.1%} of the file in {metrics['http_requests']} requests  "
+                      f"rss {metrics['peak_rss_mb']:>6.0f} MB")
+            else:
+                print(f"{key:<36} {metrics['frames']:>4} frames  {metrics['conversion_fps']:>8.1f} fps  "
+                      f"p90 {metrics['conversion_p90_ms']:>7.1f} ms  pdf {metrics['pdf_bytes'] / 1024:>8.0f} KB  "
+                      f"rss {metrics['peak_rss_mb']:>6.0f} MB")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {args.output}")
+
+    over_budget = check_import_budgets(results)
+    for name, import_ms, budget_ms in over_budget:
+        print(f"Import of {name} took {import_ms:.1f} ms, over its budget of {budget_ms:.1f} ms")
+    # An entry point over its import budget fails the run even without a baseline
+    status = 1 if over_budget else 0
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return status
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return status
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+        return status
+    print(f"\nRegressions beyond {args.tolerance:.0%} against {args.baseline}:")
+    for key, metric, old, new, change in regressions:
+        print(f"  {key:<36} {metric:<18} {old:>10} -> {new:<10} ({change:+.0%})")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import os
+import json
+import hashlib
+import cv2
+import numpy as np
+
+# ------------------------ SYNTHETIC VIDEOS ------------------------
+
+# Synthetic benchmark videos: resolution, length, frame rate, requested GOP and codec.
+# The GOP is passed to the encoder as VIDEOWRITER_PROP_KEY_INTERVAL; backends that ignore it
+# keep their default (12 for mp4v/XVID, every frame for MJPG), so results record the measured keyframes.
+VIDEO_SPECS = {
+    '360p-mp4v': {'width': 640, 'height': 360, 'seconds': 60, 'fps': 30, 'gop': 12, 'codec': 'mp4v', 'ext': 'mp4'},
+    '720p-mp4v': {'width': 1280, 'height': 720, 'seconds': 120, 'fps': 25, 'gop': 250, 'codec': 'mp4v', 'ext': 'mp4'},
+    '1080p-mp4v': {'width': 1920, 'height': 1080, 'seconds': 20, 'fps': 30, 'gop': 60, 'codec': 'mp4v', 'ext': 'mp4'},
+    '480p-mjpg': {'width': 854, 'height': 480, 'seconds': 30, 'fps': 25, 'gop': 1, 'codec': 'MJPG', 'ext': 'avi'},
+    '480p-vp8': {'width': 854, 'height': 480, 'seconds': 20, 'fps': 25, 'gop': 120, 'codec': 'VP80', 'ext': 'webm'},
+}
+
+# Small subset for a quick run
+QUICK_VIDEOS = ('360p-mp4v', '480p-mjpg')
+
+# Seconds each synthetic "slide" stays on screen
+SLIDE_SECONDS = 10
+
+# Function to render frame number index of a synthetic video
+def render_frame(spec, index, background, slide_colors):
+    width, height, fps = spec['width'], spec['height'], spec['fps']
+    frame = background.copy()
+
+    # A slide panel that changes every SLIDE_SECONDS, like a recorded presentation
+    slide = int(index / fps // SLIDE_SECONDS)
+    color = tuple(int(c) for c in slide_colors[slide % len(slide_colors)])
+    cv2.rectangle(frame, (width // 10, height // 8), (width * 6 // 10, height * 7 // 8), color, -1)
+    scale = height / 360
+    cv2.putText(frame, f"Slide {slide + 1}", (width // 8, height // 4), cv2.FONT_HERSHEY_SIMPLEX, 1.5 * scale,
+                (255, 255, 255), max(1, int(3 * scale)))
+
+    # A moving object and a frame counter so neighbouring frames differ
+    x = int((index * 4) % width)
+    cv2.circle(frame, (x, height * 3 // 4), max(4, height // 12), (0, 200, 255), -1)
+    cv2.putText(frame, f"{index:06d}", (width * 7 // 10, height - height // 12), cv2.FONT_HERSHEY_SIMPLEX,
+                0.8 * scale, (20, 20, 20), max(1, int(2 * scale)))
+    return frame
+
+# Function to make the static background gradient of a synthetic video
+def make_background(spec):
+    width, height = spec['width'], spec['height']
+    ramp_x = np.linspace(40, 200, width, dtype=np.float32)
+    ramp_y = np.linspace(0, 40, height, dtype=np.float32)[:, None]
+    gray = (ramp_x[None, :] + ramp_y).astype(np.uint8)
+    return cv2.merge([gray, np.flipud(gray), np.full_like(gray, 90)])
+
+# Function to return the path of a synthetic video, generating it on first use
+def ensure_video(name, directory):
+    spec = VIDEO_SPECS[name]
+    # The file name carries a hash of the spec so changing a spec regenerates the video
+    digest = hashlib.sha1(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:10]
+    path = os.path.join(directory, f"{name}-{digest}.{spec['ext']}")
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.{spec['ext']}"
+    writer = cv2.VideoWriter(tmp_path, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*spec['codec']), spec['fps'],
+                             (spec['width'], spec['height']), [cv2.VIDEOWRITER_PROP_KEY_INTERVAL, spec['gop']])
+    if not writer.isOpened():
+        raise RuntimeError(f"No {spec['codec']} encoder available for {name}")
+
+    # Fixed seed: every run renders byte-identical input frames
+    rng = np.random.default_rng(int(digest, 16) % (2 ** 32))
+    slide_colors = rng.integers(30, 220, size=(16, 3))
+    background = make_background(spec)
+    print(f"Generating {name} ({spec['width']}x{spec['height']}, {spec['seconds']}s, {spec['codec']})...")
+    for index in range(spec['seconds'] * spec['fps']):
+        writer.write(render_frame(spec, index, background, slide_colors))
+    writer.release()
+    os.replace(tmp_path, path)
+    return path
@@ -1,19 +1,53 @@
 import os
 import time
 import json
+import logging
+import bisect
+import contextlib
+import collections
+import concurrent.futures
+import hashlib
+import http.client
+import importlib
+import multiprocessing
+import queue
+import struct
+import urllib.parse
+import urllib.request
 import re
 import subprocess
 import shutil
+import signal
+import socket
 import sys
 import threading
 import uuid
 from datetime import timedelta
-from flask import Flask, render_template, request, jsonify, url_for, send_from_directory
-from flask_cors import CORS
-import yt_dlp
-import cv2
-import numpy as np
-from fpdf import FPDF
+
+# ------------------------ LAZY IMPORTS ------------------------
+
+# Placeholder for a heavy third-party module until one of its attributes is first used
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access
+
+    The imported module then replaces the placeholder in the namespace it was bound in, so
+    later lookups go straight to the module.
+    """
+
+    def __init__(self, name, namespace, alias=None):
+        self._name = name
+        self._namespace = namespace
+        self._alias = alias or name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        self._namespace[self._alias] = module
+        return getattr(module, attr)
+
+# OpenCV, NumPy and yt-dlp dominate import time and are only needed once a video is opened or resolved
+cv2 = LazyModule('cv2', globals())
+np = LazyModule('numpy', globals(), 'np')
+yt_dlp = LazyModule('yt_dlp', globals())
 
 # ------------------------ UTILITY FUNCTIONS AND CLASSES ------------------------
 
@@ -69,6 +103,15 @@ class Utils:
         
         return best_format
     
+    @staticmethod
+    def find_video_only_format(formats):
+        """Find the best video-only MP4 format served over plain HTTP(S), or None"""
+        candidates = [f for f in formats
+                      if f.get('acodec') == 'none' and f.get('vcodec') not in (None, 'none') and f.get('ext') == 'mp4'
+                      and (f.get('protocol') or 'https') in ('http', 'https') and (f.get('height') or 0) <= 1080]
+        # H.264 first as it decodes everywhere, then the highest resolution
+        return max(candidates, key=lambda f: ('avc' in (f.get('vcodec') or ''), f.get('height') or 0), default=None)
+    
     @staticmethod
     def sanitize_title(title):
         """Sanitize a title for use in PDF"""
@@ -79,68 +122,1252 @@ class Utils:
             else:
                 sanitized += "_"
         return sanitized
+    
+    @staticmethod
+    def youtube_video_id(url):
+        """Extract the 11-character YouTube video ID from a URL, or None"""
+        match = re.search(r'(?:v=|youtu\.be/|/shorts/|/embed/|/live/|/v/)([A-Za-z0-9_-]{11})', url or '')
+        return match.group(1) if match else None
+    
+    @staticmethod
+    def get_index_dir():
+        """Get the keyframe index cache directory path"""
+        index_dir = os.environ.get('FRAMECRAFTER_KEYFRAME_INDEX_DIR') or os.path.join(os.getcwd(), "keyframe_index")
+        Utils.ensure_dir(index_dir)
+        return index_dir
+    
+    @staticmethod
+    def get_checkpoint_dir():
+        """Get the job checkpoint directory path"""
+        checkpoint_dir = os.environ.get('FRAMECRAFTER_CHECKPOINT_DIR') or os.path.join(os.getcwd(), "checkpoints")
+        Utils.ensure_dir(checkpoint_dir)
+        return checkpoint_dir
+    
+    @staticmethod
+    def video_identity(video_path):
+        """Build a stable identity string for a local file or stream URL"""
+        if os.path.isfile(video_path):
+            stat = os.stat(video_path)
+            return f"file:{os.path.abspath(video_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+        # Signed stream URLs change on every extraction, keep only the parts naming the media
+        parsed = urllib.parse.urlparse(video_path)
+        query = urllib.parse.parse_qs(parsed.query)
+        if 'id' in query and 'itag' in query:
+            return f"stream:{query['id'][0]}:{query['itag'][0]}"
+        return f"url:{parsed.scheme}://{parsed.netloc}{parsed.path}"
+
+# ------------------------ LOGGING AND METRICS ------------------------
+
+# Module logger; per-frame messages are DEBUG, per-job milestones INFO
+logger = logging.getLogger("framecrafter")
+
+# Log format of the web server; the CLI logs bare messages like its other output
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Function to configure logging at FRAMECRAFTER_LOG_LEVEL (INFO by default), or DEBUG when verbose
+def configure_logging(verbose=False, fmt=LOG_FORMAT):
+    level = logging.DEBUG if verbose else os.environ.get('FRAMECRAFTER_LOG_LEVEL', 'INFO').upper()
+    logging.basicConfig(level=level, format=fmt)
+
+# Timed conversion stages: extract (video info), open, seek, decode, resize, encode, pdf_page, pdf_write, cleanup,
+# and scenes for scene detection passes
+STAGES = ('extract', 'open', 'seek', 'decode', 'resize', 'encode', 'pdf_page', 'pdf_write', 'cleanup', 'scenes')
+
+# Upper bounds in seconds of the duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                    120.0, 300.0, 600.0)
+
+# Help text of every exported metric
+METRIC_HELP = {
+    'framecrafter_stage_seconds': ('histogram', 'Duration of each timed conversion stage'),
+    'framecrafter_job_seconds': ('histogram', 'Wall time of finished conversion jobs'),
+    'framecrafter_jobs_total': ('counter', 'Conversion jobs finished, by final status'),
+    'framecrafter_frames_total': ('counter', 'Frames captured, by source (decoded or cache)'),
+    'framecrafter_pages_total': ('counter', 'Pages written to PDFs'),
+}
+
+class Histogram:
+    """Bucket counts, sum and count of observed durations"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is the +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        """Add the observations of a histogram with the same buckets"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+# Process-wide counters and histograms, exported at /metrics
+class Metrics:
+    """Labelled counters and histograms rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = collections.defaultdict(dict)  # name -> {labels: Histogram}
+        self.counters = collections.defaultdict(dict)  # name -> {labels: value}
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            histogram = self.histograms[name].get(key)
+            if histogram is None:
+                histogram = self.histograms[name][key] = Histogram()
+            histogram.observe(value)
+
+    def merge(self, name, histogram, **labels):
+        """Add a histogram recorded elsewhere, e.g. by a capture worker process"""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            if key not in self.histograms[name]:
+                self.histograms[name][key] = Histogram(histogram.buckets)
+            self.histograms[name][key].merge(histogram)
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.counters[name][key] = self.counters[name].get(key, 0) + amount
+
+    @staticmethod
+    def _labels(labels, **extra):
+        pairs = list(labels) + list(extra.items())
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self, samples=()):
+        """Prometheus text exposition; samples are (name, type, help, value, labels dict) read by the caller"""
+        lines = []
+        with self.lock:
+            for name in sorted(self.histograms):
+                lines += [f"# HELP {name} {METRIC_HELP[name][1]}", f"# TYPE {name} histogram"]
+                for labels, histogram in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._labels(labels, le=bound)} {cumulative}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+            for name in sorted(self.counters):
+                lines += [f"# HELP {name} {METRIC_HELP[name][1]}", f"# TYPE {name} counter"]
+                for labels, value in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+        described = set()
+        for name, kind, help_text, value, labels in samples:
+            if name not in described:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                described.add(name)
+            lines.append(f"{name}{self._labels(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+
+# Process-wide metrics registry
+metrics = Metrics()
+
+# Stage timings of one job (or one CLI conversion)
+class StageTimer:
+    """Per-stage duration histograms of one job, also recorded in a shared Metrics registry"""
+
+    def __init__(self, registry=metrics):
+        self.registry = registry  # None in capture worker processes, whose timings are merged by the parent
+        self.histograms = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+        if self.registry is not None:
+            self.registry.observe('framecrafter_stage_seconds', seconds, stage=name)
+
+    def merge(self, histograms):
+        """Add the stage histograms of another timer"""
+        for name, histogram in histograms.items():
+            self.histograms.setdefault(name, Histogram(histogram.buckets)).merge(histogram)
+            if self.registry is not None:
+                self.registry.merge('framecrafter_stage_seconds', histogram, stage=name)
+
+    def summary(self):
+        """Total seconds and number of timed operations per stage, in STAGES order"""
+        return {name: {'seconds': round(self.histograms[name].sum, 3), 'count': self.histograms[name].count}
+                for name in STAGES if name in self.histograms}
+
+# Learned duration of the phases of a job, used to turn phase fractions into overall progress
+class ProgressModel:
+    """Expected seconds per unit of work of each job phase, smoothed over finished jobs"""
+
+    # Phases in execution order, with the unit their cost is measured in
+    PHASES = (('extract', 'job'), ('scenes', 'video second'), ('capture', 'frame'), ('pdf', 'page'),
+              ('finish', 'job'))
+
+    # Costs used until a job of this process has finished
+    DEFAULT_COSTS = {'extract': 2.0, 'scenes': 0.05, 'capture': 0.5, 'pdf': 0.02, 'finish': 0.2}
+
+    def __init__(self, smoothing=0.3):
+        self.smoothing = smoothing
+        self.costs = dict(self.DEFAULT_COSTS)
+        self.lock = threading.Lock()
+
+    def cost(self, phase):
+        with self.lock:
+            return self.costs[phase]
+
+    def learn(self, phase, seconds, units):
+        """Fold the measured duration of a phase into its expected cost per unit"""
+        if units <= 0:
+            return
+        with self.lock:
+            self.costs[phase] += self.smoothing * (seconds / units - self.costs[phase])
+
+# Shared by all jobs of this process
+progress_model = ProgressModel()
+
+class JobProgress:
+    """Overall progress (0-100) of one job from the fraction done of its current phase"""
+
+    def __init__(self, model=progress_model, scenes=False, frames=20, video_seconds=600):
+        self.model = model
+        # Units of work per phase; frame and video counts are estimates until set_units() is called
+        self.units = {'extract': 1, 'scenes': video_seconds if scenes else 0, 'capture': frames, 'pdf': frames,
+                      'finish': 1}
+        self.phase = None
+        self.phase_started = 0.0
+        self.durations = {}
+        self.reported = 0.0
+
+    def set_units(self, phase, units):
+        self.units[phase] = units
+
+    def enter(self, phase):
+        """Start timing phase, closing the current one"""
+        now = time.perf_counter()
+        if self.phase is not None:
+            self.durations[self.phase] = self.durations.get(self.phase, 0.0) + now - self.phase_started
+        self.phase, self.phase_started = phase, now
+
+    def percent(self, fraction=0.0):
+        """Progress with the current phase fraction done; never decreases and stays below 100 until finished"""
+        expected = [(phase, self.model.cost(phase) * self.units[phase]) for phase, _ in ProgressModel.PHASES]
+        total = sum(seconds for _, seconds in expected) or 1.0
+        done = 0.0
+        for phase, seconds in expected:
+            if phase == self.phase:
+                done += seconds * min(max(fraction, 0.0), 1.0)
+                break
+            done += seconds
+        self.reported = max(self.reported, min(99.0, 100.0 * done / total))
+        return round(self.reported, 1)
+
+    def finish(self):
+        """Close the last phase and teach the model the measured phase costs"""
+        self.enter(None)
+        for phase, seconds in self.durations.items():
+            self.model.learn(phase, seconds, self.units[phase])
+        return {phase: round(seconds, 3) for phase, seconds in self.durations.items()}
+
+# ------------------------ CANCELLATION AND BUDGETS ------------------------
+
+# Raised between units of work when a job is cancelled (DELETE /job/<job_id>, SIGINT)
+class JobCancelled(Exception):
+    """Job stopped on request before it finished"""
+
+# Raised when a job runs past one of its budgets
+class BudgetExceeded(JobCancelled):
+    """Job stopped because it exceeded its time or source duration budget"""
+
+# Per-job budgets of server jobs; 0 means unlimited
+JOB_MAX_SECONDS = float(os.environ.get('FRAMECRAFTER_MAX_JOB_SECONDS', 1800))
+JOB_MAX_FRAMES = int(os.environ.get('FRAMECRAFTER_MAX_FRAMES', 2000))
+JOB_MAX_SOURCE_SECONDS = float(os.environ.get('FRAMECRAFTER_MAX_SOURCE_SECONDS', 4 * 3600))
+
+# Cancellation flag and budgets of one job, checked by the extractor, capture loop and PDF writer
+class JobControl:
+    """Stop signal of one job plus its wall time, frame and source duration budgets
+
+    cancel() stops the job at its next check. Given a job store and job_id, a 'cancelled'
+    status written there by another server process stops it too (the record is read at
+    most every poll_interval seconds). Running out of time stops capture early and keeps
+    the frames taken so far; limit_frames() and check_source() apply the other budgets
+    before any decoding starts. Budgets of None or 0 are unlimited. A control with a parent
+    also stops whenever its parent does, and can be cancelled on its own.
+    """
+
+    def __init__(self, max_seconds=None, max_frames=None, max_source_duration=None, job_id=None, store=None,
+                 event=None, poll_interval=0.5, clock=time.time, parent=None):
+        self.max_seconds = max_seconds or None
+        self.max_frames = max_frames or None
+        self.max_source_duration = max_source_duration or None
+        self.job_id = job_id
+        self.store = store
+        # Shared with other controls (a batch) or a multiprocessing Manager event (capture workers)
+        self.event = event if event is not None else threading.Event()
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.started = clock()
+        self.polled_at = self.started
+        self.reason = "Cancelled"
+        self.parent = parent
+
+    def cancel(self, reason="Cancelled"):
+        self.reason = reason
+        self.event.set()
+
+    def cancelled(self):
+        if self.event.is_set():
+            return True
+        if self.parent is not None and self.parent.cancelled():
+            self.reason = self.parent.reason
+            return True
+        if self.store is not None and self.clock() - self.polled_at >= self.poll_interval:
+            self.polled_at = self.clock()
+            job = self.store.get(self.job_id)
+            if job is None or job.get('status') == 'cancelled':
+                self.cancel("Cancelled by user")
+                return True
+        return False
+
+    def out_of_time(self):
+        if self.parent is not None and self.parent.out_of_time():
+            return True
+        return self.max_seconds is not None and self.clock() - self.started >= self.max_seconds
+
+    def should_stop(self):
+        return self.cancelled() or self.out_of_time()
+
+    def check(self):
+        """Raise JobCancelled when cancelled, BudgetExceeded when out of time"""
+        if self.cancelled():
+            raise JobCancelled(self.reason)
+        if self.parent is not None:
+            self.parent.check()
+        if self.out_of_time():
+            raise BudgetExceeded(f"Job exceeded its {self.max_seconds:g}s time budget")
+
+    def check_source(self, duration):
+        """Raise BudgetExceeded for a video longer than the source duration budget"""
+        if self.max_source_duration is not None and duration and duration > self.max_source_duration:
+            raise BudgetExceeded(f"Video is {timedelta(seconds=int(duration))} long, "
+                                 f"the limit is {timedelta(seconds=int(self.max_source_duration))}")
+
+    def limit_frames(self, timestamps):
+        """Return timestamps cut to the frame budget, keeping the earliest ones"""
+        if self.max_frames is None or len(timestamps) <= self.max_frames:
+            return timestamps
+        return sorted(timestamps)[:self.max_frames]
+
+# ------------------------ KEYFRAME INDEX AND SEEK PLANNING ------------------------
+
+# Random access reader over a local file or an HTTP(S) URL using range requests
+class ByteSource:
+    """Read byte ranges from a local file or a remote URL"""
+
+    def __init__(self, video_path, timeout=30):
+        self.video_path = video_path
+        self.timeout = timeout
+        self.is_remote = video_path.startswith(('http://', 'https://'))
+        self.size = None
+        if not self.is_remote:
+            self.size = os.path.getsize(video_path)
+
+    def read(self, offset, length):
+        """Return up to length bytes starting at offset"""
+        if length <= 0:
+            return b""
+        if not self.is_remote:
+            with open(self.video_path, 'rb') as f:
+                f.seek(offset)
+                return f.read(length)
+        req = urllib.request.Request(self.video_path, headers={'Range': f'bytes={offset}-{offset + length - 1}'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            content_range = resp.headers.get('Content-Range', '')
+            if self.size is None and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1]
+                if total.isdigit():
+                    self.size = int(total)
+            if resp.status != 206 and offset > 0:
+                raise IOError("Server does not support range requests")
+            return resp.read(length)
+
+def _iter_boxes(read, start, end):
+    # Yield (type, payload_start, box_end) for each ISO-BMFF box in [start, end)
+    offset = start
+    while offset + 8 <= end:
+        header = read(offset, 16)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type.decode('latin-1'), offset + header_size, offset + size
+        offset += size
+
+def _find_box(data, start, end, box_type):
+    read = lambda o, n: data[o:o + n]
+    for found, payload, box_end in _iter_boxes(read, start, end):
+        if found == box_type:
+            return payload, box_end
+    return None
+
+def _find_path(data, start, end, path):
+    for box_type in path:
+        found = _find_box(data, start, end, box_type)
+        if found is None:
+            return None
+        start, end = found
+    return start, end
+
+def _sample_values(runs, samples):
+    # Expand (count, value) runs for sorted 1-based sample numbers, accumulating like stts
+    values = []
+    it = iter(samples)
+    target = next(it, None)
+    first = 1
+    total = 0
+    for count, delta in runs:
+        while target is not None and target < first + count:
+            values.append(total + (target - first) * delta)
+            target = next(it, None)
+        first += count
+        total += count * delta
+    return values
+
+def _sample_offsets(runs, samples):
+    # Look up per-sample values from (count, value) runs, like ctts
+    values = []
+    it = iter(samples)
+    target = next(it, None)
+    first = 1
+    for count, value in runs:
+        while target is not None and target < first + count:
+            values.append(value)
+            target = next(it, None)
+        first += count
+    values.extend(0 for _ in range(len(samples) - len(values)))
+    return values
+
+def _read_runs(data, box, signed=False):
+    start, _ = box
+    count = struct.unpack('>I', data[start + 4:start + 8])[0]
+    fmt = '>Ii' if signed else '>II'
+    return [struct.unpack(fmt, data[start + 8 + i * 8:start + 16 + i * 8]) for i in range(count)]
+
+def _video_tracks(data):
+    # Yield (trak_start, trak_end, stbl, timescale, media_duration, shift) for each video track in a moov payload
+    for box_type, trak_start, trak_end in _iter_boxes(lambda o, n: data[o:o + n], 0, len(data)):
+        if box_type != 'trak':
+            continue
+        hdlr = _find_path(data, trak_start, trak_end, ['mdia', 'hdlr'])
+        if hdlr is None or data[hdlr[0] + 8:hdlr[0] + 12] != b'vide':
+            continue
+        mdhd = _find_path(data, trak_start, trak_end, ['mdia', 'mdhd'])
+        stbl = _find_path(data, trak_start, trak_end, ['mdia', 'minf', 'stbl'])
+        if mdhd is None or stbl is None:
+            continue
+        if data[mdhd[0]] == 1:
+            timescale, media_duration = struct.unpack('>IQ', data[mdhd[0] + 20:mdhd[0] + 32])
+        else:
+            timescale, media_duration = struct.unpack('>II', data[mdhd[0] + 12:mdhd[0] + 20])
+        if not timescale:
+            continue
+
+        # The first edit list entry shifts media time to presentation time
+        shift = 0
+        elst = _find_path(data, trak_start, trak_end, ['edts', 'elst'])
+        if elst is not None:
+            start = elst[0]
+            version = data[start]
+            count = struct.unpack('>I', data[start + 4:start + 8])[0]
+            entry_size = 20 if version == 1 else 12
+            for i in range(count):
+                entry = start + 8 + i * entry_size
+                if version == 1:
+                    media_time = struct.unpack('>q', data[entry + 8:entry + 16])[0]
+                else:
+                    media_time = struct.unpack('>i', data[entry + 4:entry + 8])[0]
+                if media_time >= 0:
+                    shift = media_time
+                    break
+        yield trak_start, trak_end, stbl, timescale, media_duration, shift
+
+def _parse_moov(data):
+    # Return (keyframe_times, duration) for the first video track in a moov payload
+    for trak_start, trak_end, stbl, timescale, media_duration, shift in _video_tracks(data):
+        stts_box = _find_box(data, stbl[0], stbl[1], 'stts')
+        if stts_box is None:
+            continue
+        stts = _read_runs(data, stts_box)
+        sample_count = sum(count for count, _ in stts)
+
+        stss_box = _find_box(data, stbl[0], stbl[1], 'stss')
+        if stss_box is None:
+            # No sync sample table means every sample is a keyframe
+            sync = list(range(1, sample_count + 1))
+        else:
+            start = stss_box[0]
+            count = struct.unpack('>I', data[start + 4:start + 8])[0]
+            sync = sorted(struct.unpack(f'>{count}I', data[start + 8:start + 8 + count * 4]))
+
+        dts = _sample_values(stts, sync)
+        ctts_box = _find_box(data, stbl[0], stbl[1], 'ctts')
+        offsets = _sample_offsets(_read_runs(data, ctts_box, signed=data[ctts_box[0]] == 1), sync) if ctts_box else [0] * len(sync)
+
+        keyframes = [max(0.0, (d + o - shift) / timescale) for d, o in zip(dts, offsets)]
+        return keyframes, media_duration / timescale
+    return None
+
+def _expand_runs(data, box, count, signed=False):
+    # Expand (count, value) runs (stts, ctts) to one value per sample with numpy
+    start, _ = box
+    runs = struct.unpack('>I', data[start + 4:start + 8])[0]
+    table = np.frombuffer(data, dtype='>i4' if signed else '>u4', count=runs * 2, offset=start + 8).reshape(-1, 2)
+    values = np.repeat(table[:, 1].astype(np.int64), table[:, 0].astype(np.int64))[:count]
+    return np.pad(values, (0, count - len(values)))
+
+def _parse_samples(data):
+    # Return the first video track's sample table as numpy arrays (byte offset, size, presentation time
+    # in seconds, decode order) plus sorted sync sample indices and the duration, or None
+    for trak_start, trak_end, stbl, timescale, media_duration, shift in _video_tracks(data):
+        boxes = {name: _find_box(data, stbl[0], stbl[1], name) for name in ('stsz', 'stco', 'co64', 'stsc', 'stts',
+                                                                           'ctts', 'stss')}
+        chunk_box = boxes['stco'] or boxes['co64']
+        if boxes['stsz'] is None or chunk_box is None or boxes['stsc'] is None or boxes['stts'] is None:
+            continue
+        start = boxes['stsz'][0]
+        uniform_size, count = struct.unpack('>II', data[start + 4:start + 12])
+        if count == 0:
+            continue  # Fragmented file, the samples live in moof boxes
+        if uniform_size:
+            sizes = np.full(count, uniform_size, dtype=np.int64)
+        else:
+            sizes = np.frombuffer(data, dtype='>u4', count=count, offset=start + 12).astype(np.int64)
+
+        start = chunk_box[0]
+        chunks = struct.unpack('>I', data[start + 4:start + 8])[0]
+        chunk_offsets = np.frombuffer(data, dtype='>u8' if boxes['co64'] else '>u4', count=chunks,
+                                      offset=start + 8).astype(np.int64)
+
+        # Samples per chunk from the sample-to-chunk runs
+        start = boxes['stsc'][0]
+        runs = struct.unpack('>I', data[start + 4:start + 8])[0]
+        stsc = np.frombuffer(data, dtype='>u4', count=runs * 3, offset=start + 8).reshape(-1, 3).astype(np.int64)
+        per_chunk = np.zeros(chunks, dtype=np.int64)
+        for i, (first_chunk, samples, _) in enumerate(stsc):
+            last_chunk = stsc[i + 1][0] - 1 if i + 1 < len(stsc) else chunks
+            per_chunk[first_chunk - 1:last_chunk] = samples
+        chunk_of_sample = np.repeat(np.arange(chunks), per_chunk)[:count]
+        if len(chunk_of_sample) < count:
+            continue
+
+        # A sample starts after the samples before it in the same chunk
+        before = np.cumsum(sizes) - sizes
+        chunk_first = (np.cumsum(per_chunk) - per_chunk)[chunk_of_sample]
+        offsets = chunk_offsets[chunk_of_sample] + before - before[np.minimum(chunk_first, count - 1)]
+
+        deltas = _expand_runs(data, boxes['stts'], count)
+        dts = np.cumsum(deltas) - deltas
+        if boxes['ctts']:
+            dts = dts + _expand_runs(data, boxes['ctts'], count, signed=data[boxes['ctts'][0]] == 1)
+        pts = np.maximum(0.0, (dts - shift) / timescale)
+
+        if boxes['stss'] is None:
+            sync = np.arange(count)
+        else:
+            start = boxes['stss'][0]
+            entries = struct.unpack('>I', data[start + 4:start + 8])[0]
+            sync = np.sort(np.frombuffer(data, dtype='>u4', count=entries, offset=start + 8).astype(np.int64) - 1)
+        return {'offsets': offsets, 'sizes': sizes, 'pts': pts, 'sync': sync, 'duration': media_duration / timescale}
+    return None
+
+def _sidx_references(data):
+    # Return (timescale, earliest_time, first_offset, [(reference_type, size, duration, sap)]) of a sidx payload
+    version = data[0]
+    timescale = struct.unpack('>I', data[8:12])[0]
+    if version == 0:
+        earliest, first_offset = struct.unpack('>II', data[12:20])
+        pos = 20
+    else:
+        earliest, first_offset = struct.unpack('>QQ', data[12:28])
+        pos = 28
+    count = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+    pos += 4
+    references = []
+    for i in range(count):
+        size, duration, sap = struct.unpack('>III', data[pos + i * 12:pos + 12 + i * 12])
+        references.append((size >> 31, size & 0x7FFFFFFF, duration, sap))
+    return timescale, earliest, first_offset, references
+
+def _parse_sidx(data):
+    # Return (keyframe_times, duration) from a segment index payload (fragmented MP4 / DASH)
+    timescale, earliest, _, references = _sidx_references(data)
+    if not timescale:
+        return None
+    keyframes = []
+    current = earliest
+    for _, _, duration, sap in references:
+        if sap >> 31:
+            keyframes.append((current + (sap & 0x0FFFFFFF)) / timescale)
+        current += duration
+    return keyframes, (current - earliest) / timescale
+
+# Keyframe positions of a video, used to estimate the cost of seeking
+class KeyframeIndex:
+    """Sorted keyframe presentation times (seconds) for one video"""
+
+    VERSION = 1
+
+    def __init__(self, keyframes, duration=0, source="moov"):
+        self.keyframes = sorted(keyframes)
+        self.duration = duration
+        self.source = source
+
+    def gop_index(self, timestamp):
+        """Index of the keyframe at or before timestamp"""
+        return max(0, bisect.bisect_right(self.keyframes, timestamp + 1e-6) - 1)
+
+    def keyframe_before(self, timestamp):
+        """Time of the keyframe at or before timestamp"""
+        if not self.keyframes:
+            return 0.0
+        return self.keyframes[self.gop_index(timestamp)]
+
+    def nearest_keyframe(self, timestamp):
+        """Time of the keyframe closest to timestamp"""
+        if not self.keyframes:
+            return timestamp
+        i = bisect.bisect_left(self.keyframes, timestamp)
+        candidates = self.keyframes[max(0, i - 1):i + 1]
+        return min(candidates, key=lambda k: abs(k - timestamp))
+
+    def to_dict(self):
+        return {'version': self.VERSION, 'keyframes': self.keyframes, 'duration': self.duration, 'source': self.source}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != cls.VERSION:
+            return None
+        return cls(data['keyframes'], data.get('duration', 0), data.get('source', 'moov'))
+
+    @staticmethod
+    def cache_path(video_path):
+        """Location of the on-disk index for this video"""
+        key = hashlib.sha1(Utils.video_identity(video_path).encode('utf-8')).hexdigest()
+        return os.path.join(Utils.get_index_dir(), f"{key}.json")
+
+    @classmethod
+    def build(cls, video_path, max_boxes=64):
+        """Read the keyframe table from the container, returns None if it is unavailable"""
+        source = ByteSource(video_path)
+        header = source.read(0, 16)  # Also learns the size of remote files
+        end = source.size if source.size is not None else len(header)
+        for i, (box_type, payload, box_end) in enumerate(_iter_boxes(source.read, 0, end)):
+            if i >= max_boxes:
+                break
+            if box_type == 'moov':
+                parsed = _parse_moov(source.read(payload, box_end - payload))
+                if parsed and parsed[0]:
+                    return cls(parsed[0], parsed[1], source='moov')
+            elif box_type == 'sidx':
+                parsed = _parse_sidx(source.read(payload, box_end - payload))
+                if parsed and parsed[0]:
+                    return cls(parsed[0], parsed[1], source='sidx')
+            elif box_type == 'moof':
+                # Fragments without a segment index, nothing cheap to read
+                break
+        return None
+
+    @classmethod
+    def load_or_build(cls, video_path):
+        """Return the cached index for video_path, building and caching it on a miss"""
+        path = cls.cache_path(video_path)
+        try:
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    index = cls.from_dict(json.load(f))
+                if index is not None:
+                    return index
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable keyframe index {path}: {str(e)}")
+
+        try:
+            index = cls.build(video_path)
+        except Exception as e:
+            logger.warning(f"Could not build keyframe index: {str(e)}")
+            return None
+        if index is None:
+            return None
+
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index.to_dict(), f)
+        os.replace(tmp_path, path)
+        logger.info(f"Built keyframe index with {len(index.keyframes)} keyframes")
+        return index
+
+# Planner that picks seek or forward decode for each capture target
+class SeekPlanner:
+    """Turn sorted timestamps into (timestamp, action, gop) steps using a KeyframeIndex"""
+
+    def __init__(self, index, fps, seek_cost_frames=10):
+        self.index = index
+        self.fps = fps if fps > 0 else 25.0
+        # Fixed overhead of a seek (demuxer reset, network round trip) in decoded-frame units
+        self.seek_cost_frames = seek_cost_frames
+
+    def plan(self, timestamps, snap_tolerance=0):
+        """Return a step per timestamp, snapping to keyframes within snap_tolerance seconds"""
+        steps = []
+        position = None  # Time of the last decoded frame
+        for timestamp in sorted(timestamps):
+            if snap_tolerance > 0:
+                nearest = self.index.nearest_keyframe(timestamp)
+                if abs(nearest - timestamp) <= snap_tolerance:
+                    timestamp = nearest
+            gop = self.index.gop_index(timestamp)
+            keyframe = self.index.keyframe_before(timestamp)
+
+            current = position if position is not None else -1.0 / self.fps
+            if timestamp < current:
+                action = 'seek'
+            elif keyframe <= current:
+                # Target is in the GOP being decoded, seeking would re-decode from the same keyframe
+                action = 'forward'
+            else:
+                forward_cost = (timestamp - current) * self.fps
+                seek_cost = self.seek_cost_frames + (timestamp - keyframe) * self.fps
+                action = 'forward' if forward_cost <= seek_cost else 'seek'
+
+            steps.append((timestamp, action, gop))
+            position = timestamp
+        return steps
+
+# ------------------------ SEGMENTED DOWNLOAD ------------------------
+
+# Concurrent HTTP connections used to fetch byte ranges
+SEGMENT_CONNECTIONS = 4
+
+# Ranges are fetched in requests of at most this many bytes
+SEGMENT_CHUNK_SIZE = 1 << 20
+
+# Ranges closer than this are fetched as one; the bytes between cost less than another request
+SEGMENT_MERGE_GAP = 64 * 1024
+
+# Samples fetched past the end of a GOP so the decoder can flush reordered (B-)frames
+SEGMENT_REORDER_SAMPLES = 16
+
+# OpenCV seeks this many frames before the target and decodes forward, so GOPs that far back are fetched too
+SEGMENT_SEEK_BACKOFF_FRAMES = 16
+
+# Byte range reader for one URL that reuses its HTTP connections
+class RangeFetcher:
+    """Fetch byte ranges of an HTTP(S) URL over a pool of keep-alive connections"""
+
+    def __init__(self, url, connections=SEGMENT_CONNECTIONS, timeout=30, max_retries=3):
+        self.url = url
+        self.connections = connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.size = None  # Learned from the first response
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+        self.bytes = 0
+
+    def _connect(self):
+        parsed = urllib.parse.urlsplit(self.url)
+        connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        with self.lock:
+            self.opened += 1
+        return connection_class(parsed.netloc, timeout=self.timeout)
+
+    def read(self, offset, length):
+        """Return length bytes starting at offset (fewer at the end of the file)"""
+        if length <= 0:
+            return b""
+        redirects = 0
+        attempt = 0
+        while True:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+            parsed = urllib.parse.urlsplit(self.url)
+            try:
+                connection.request('GET', parsed.path + (f'?{parsed.query}' if parsed.query else ''),
+                                   headers={'Range': f'bytes={offset}-{offset + length - 1}'})
+                response = connection.getresponse()
+                if response.status in (301, 302, 303, 307, 308) and redirects < 5:
+                    response.read()
+                    connection.close()
+                    redirects += 1
+                    self.url = urllib.parse.urljoin(self.url, response.getheader('Location'))
+                    continue
+                if response.status == 200 and int(response.getheader('Content-Length') or length + 1) > length:
+                    connection.close()
+                    raise ValueError("Server does not support range requests")
+                if response.status not in (200, 206):
+                    connection.close()
+                    raise ValueError(f"HTTP {response.status} for bytes {offset}-{offset + length - 1}")
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                attempt += 1
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"Range request failed ({str(e)}), retry {attempt}")
+                continue
+            total = (response.getheader('Content-Range') or '').rsplit('/', 1)[-1]
+            with self.lock:
+                if self.size is None:
+                    self.size = int(total) if total.isdigit() else len(data)
+                self.requests += 1
+                self.bytes += len(data)
+            self.idle.put(connection)
+            return data
+
+    def fetch(self, ranges, write, control=None):
+        """Fetch (start, end) ranges concurrently, calling write(offset, data) for each"""
+        def fetch_range(start, end):
+            # A cancelled job stops before its next request
+            if control is not None:
+                control.check()
+            write(start, self.read(start, end - start))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.connections) as pool:
+            futures = [pool.submit(fetch_range, start, end) for start, end in ranges]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+# Function to merge sorted-or-not (start, end) byte ranges closer than gap, then split them into chunks
+def merge_ranges(ranges, gap=SEGMENT_MERGE_GAP, chunk_size=None):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    if chunk_size is None:
+        return [tuple(r) for r in merged]
+    return [(offset, min(offset + chunk_size, end)) for start, end in merged for offset in range(start, end, chunk_size)]
+
+# Map from timestamps to the bytes of an MP4 that are needed to decode them
+class SegmentMap:
+    """Container boxes every reader needs plus the byte ranges of each decode unit (GOP or DASH fragment)
+
+    Decode units are sorted by start time; units(i) returns the byte ranges of unit i.
+    """
+
+    def __init__(self, size, header_ranges, unit_starts, unit_ranges, index, fps, source):
+        self.size = size
+        self.header_ranges = header_ranges
+        self.unit_starts = unit_starts
+        self.unit_ranges = unit_ranges
+        self.index = index
+        self.fps = fps
+        self.source = source
+
+    @classmethod
+    def build(cls, fetcher, max_boxes=64):
+        """Read the container index through fetcher, returns None for layouts that cannot be fetched in parts"""
+        fetcher.read(0, 16)  # Learns the file size
+        headers = []
+        samples = None
+        for i, (box_type, payload, box_end) in enumerate(_iter_boxes(fetcher.read, 0, fetcher.size)):
+            if i >= max_boxes or box_type == 'moof':
+                # Fragments without a segment index: no way to find a time without reading them all
+                return None
+            if box_type == 'mdat':
+                headers.append((payload - 16, payload))
+                continue
+            headers.append((payload - 16, box_end))
+            if box_type == 'moov':
+                samples = _parse_samples(fetcher.read(payload, box_end - payload))
+            elif box_type == 'sidx':
+                return cls._from_sidx(fetcher, fetcher.read(payload, box_end - payload), box_end)
+        if samples is None:
+            return None
+        return cls._from_samples(fetcher.size, headers, samples)
+
+    @classmethod
+    def _from_samples(cls, size, headers, samples):
+        # One unit per GOP, in decode order from its sync sample to the next one
+        offsets, sizes, pts, sync = samples['offsets'], samples['sizes'], samples['pts'], samples['sync']
+        if len(sync) == 0 or sync[0] != 0:
+            sync = np.concatenate(([0], sync))
+        bounds = list(sync) + [len(sizes)]
+
+        def unit_ranges(i):
+            first, last = bounds[i], min(bounds[i + 1] + SEGMENT_REORDER_SAMPLES, len(sizes))
+            starts, ends = offsets[first:last], offsets[first:last] + sizes[first:last]
+            return merge_ranges(zip(starts.tolist(), ends.tolist()), gap=0)
+
+        keyframes = pts[sync].tolist()
+        duration = samples['duration']
+        fps = len(sizes) / duration if duration > 0 else 25.0
+        # Header boxes are clipped to the file, a 16-byte header read may run past a short last box
+        headers = [(max(0, start), min(end, size)) for start, end in headers]
+        return cls(size, headers, keyframes, unit_ranges, KeyframeIndex(keyframes, duration), fps, 'moov')
+
+    @classmethod
+    def _from_sidx(cls, fetcher, data, sidx_end):
+        # One unit per DASH subsegment; the init segment and index before them are the header
+        timescale, earliest, first_offset, references = _sidx_references(data)
+        if not timescale or any(reference_type for reference_type, _, _, _ in references):
+            return None  # Hierarchical indexes are not followed
+        parsed = _parse_sidx(data)
+        offset, current = sidx_end + first_offset, earliest
+        starts, ranges = [], []
+        for _, size, duration, _ in references:
+            starts.append(current / timescale)
+            ranges.append([(offset, offset + size)])
+            offset += size
+            current += duration
+        index = KeyframeIndex(parsed[0], parsed[1], source='sidx')
+        return cls(fetcher.size, [(0, sidx_end + first_offset)], starts, lambda i: ranges[i], index, 30.0, 'sidx')
+
+    def _units_between(self, start, end):
+        first = max(0, bisect.bisect_right(self.unit_starts, start + 1e-6) - 1)
+        last = max(0, bisect.bisect_right(self.unit_starts, end + 1e-6) - 1)
+        return range(first, last + 1)
+
+    def ranges_for(self, timestamps, snap_tolerance=0.0, seek_cost_frames=10):
+        """Byte ranges needed to capture timestamps with the same plan capture_screenshots will use"""
+        # The first unit is always read: opening the file probes its first frames
+        units = {0}
+        backoff = SEGMENT_SEEK_BACKOFF_FRAMES / self.fps
+        planner = SeekPlanner(self.index, self.fps, seek_cost_frames=seek_cost_frames)
+        previous = None
+        for timestamp, action, _ in planner.plan(timestamps, snap_tolerance=snap_tolerance):
+            keyframe = self.index.keyframe_before(max(0.0, timestamp - backoff))
+            if previous is None:
+                start = 0.0 if action == 'forward' else keyframe
+            elif action == 'forward' or keyframe - previous <= 1.0:
+                # Decoding forward (or close to it, should the capture's frame rate differ) spans every unit between
+                start = previous
+            else:
+                start = keyframe
+            units.update(self._units_between(start, timestamp))
+            previous = timestamp
+        ranges = list(self.header_ranges)
+        for i in sorted(units):
+            ranges.extend(self.unit_ranges(i))
+        return merge_ranges(ranges), len(units)
+
+# Function to fetch the parts of an MP4 URL needed for timestamps into a sparse local file of the same layout
+# Returns download stats, or None when the container cannot be fetched in parts (the caller then streams it)
+def fetch_segments(url, timestamps, output_path, connections=SEGMENT_CONNECTIONS, snap_tolerance=0.0, control=None):
+    fetcher = RangeFetcher(url, connections=connections)
+    try:
+        segment_map = SegmentMap.build(fetcher)
+        if segment_map is None:
+            logger.info("No seekable MP4 index, the video cannot be fetched in segments")
+            return None
+        ranges, units = segment_map.ranges_for(timestamps, snap_tolerance=snap_tolerance)
+
+        # Every range lands at its original offset; bytes never fetched read back as zeros
+        lock = threading.Lock()
+        with open(output_path, 'wb') as f:
+            f.truncate(segment_map.size)
+
+            def write(offset, data):
+                with lock:
+                    f.seek(offset)
+                    f.write(data)
+
+            fetcher.fetch(merge_ranges(ranges, gap=0, chunk_size=SEGMENT_CHUNK_SIZE), write, control=control)
+        fetched = fetcher.bytes
+        stats = {'size': segment_map.size, 'fetched': fetched, 'ranges': len(ranges), 'units': units,
+                 'requests': fetcher.requests, 'connections': fetcher.opened, 'source': segment_map.source}
+        logger.info(f"Fetched {fetched / (1024 * 1024):.1f} of {segment_map.size / (1024 * 1024):.1f} MB "
+                    f"({units} {'GOPs' if segment_map.source == 'moov' else 'fragments'} in {len(ranges)} ranges) "
+                    f"with {fetcher.requests} requests over {fetcher.opened} connection(s)")
+        return stats
+    finally:
+        fetcher.close()
+
+# ------------------------ VIDEO METADATA EXTRACTION ------------------------
+
+# Options shared by all pooled extractor sessions
+EXTRACTOR_OPTIONS = {
+    "format": "bestvideo[height<=1080]+bestaudio/best[height<=1080]/best",
+    "quiet": True,
+    "no_warnings": True,
+    "socket_timeout": 30,
+}
+
+# Pool of reusable yt_dlp sessions; each keeps its HTTP connections open between jobs
+class ExtractorPool:
+    """Bounded pool of extractor sessions shared by all jobs
+
+    factory builds a session exposing extract_info(url, download=False); it defaults to
+    yt_dlp.YoutubeDL and can be replaced with a stub in tests.
+    """
+
+    def __init__(self, size=None, factory=None, options=None):
+        self.size = size or int(os.environ.get('FRAMECRAFTER_EXTRACTORS', 4))
+        self.options = dict(options or EXTRACTOR_OPTIONS)
+        self.factory = factory or (lambda: yt_dlp.YoutubeDL(self.options))
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.idle = []
+        self.lock = threading.Lock()
+        self.created = 0
+
+    @contextlib.contextmanager
+    def session(self):
+        """Borrow a session; sessions are not thread-safe so each is used by one job at a time"""
+        self.slots.acquire()
+        with self.lock:
+            session = self.idle.pop() if self.idle else None
+        try:
+            if session is None:
+                session = self.factory()
+                with self.lock:
+                    self.created += 1
+            yield session
+        except Exception:
+            # Drop a session that failed mid-request rather than reusing broken state
+            close = getattr(session, 'close', None)
+            if callable(close):
+                close()
+            session = None
+            raise
+        finally:
+            if session is not None:
+                with self.lock:
+                    self.idle.append(session)
+            self.slots.release()
+
+# Extracted video info cached in front of the extractor pool
+class MetadataCache:
+    """TTL cache of extracted info (title, duration, formats, chosen format URL)
+
+    An entry expires after ttl seconds or shortly before its stream URL's own expiry,
+    whichever comes first, and is re-extracted transparently on the next lookup.
+    """
+
+    def __init__(self, pool, ttl=3600, expiry_margin=300, clock=time.time):
+        self.pool = pool
+        self.ttl = ttl
+        self.expiry_margin = expiry_margin
+        self.clock = clock
+        self.entries = {}
+        self.key_locks = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def key(url):
+        """Normalize a video URL so different spellings share an entry"""
+        video_id = Utils.youtube_video_id(url)
+        return f"youtube:{video_id}" if video_id else url.strip()
+
+    def _expires_at(self, stream_url, now):
+        expires_at = now + self.ttl
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(stream_url or '').query)
+        expire = query.get('expire', [''])[0]
+        if expire.isdigit():
+            expires_at = min(expires_at, int(expire) - self.expiry_margin)
+        return expires_at
+
+    def _extract(self, url):
+        with self.pool.session() as session:
+            info = session.extract_info(url, download=False)
+        formats = info.get('formats') or [info]
+        best_format = Utils.find_best_format(formats)
+        now = self.clock()
+        return {
+            'title': info.get('title', 'Unknown'),
+            'duration': info.get('duration', 0),
+            'formats': [{k: f.get(k) for k in ('format_id', 'ext', 'height', 'vcodec', 'acodec', 'protocol', 'url')}
+                        for f in formats],
+            'url': best_format['url'],
+            'format_id': best_format.get('format_id'),
+            'height': best_format.get('height'),
+            'vcodec': best_format.get('vcodec'),
+            'fetched_at': now,
+            'expires_at': self._expires_at(best_format['url'], now),
+        }
+
+    def get(self, url):
+        """Return the info dict for url, extracting it when missing or stale"""
+        key = self.key(url)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry['expires_at'] > self.clock():
+                self.hits += 1
+                return entry
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        # One extraction per video at a time; concurrent callers wait for its result
+        with key_lock:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry['expires_at'] > self.clock():
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+                if entry is not None:
+                    self.refreshes += 1
+            entry = self._extract(url)
+            with self.lock:
+                self.entries[key] = entry
+                self._prune()
+            return entry
+
+    def invalidate(self, url):
+        """Forget url, e.g. after its stream URL was rejected"""
+        with self.lock:
+            self.entries.pop(self.key(url), None)
+
+    def _prune(self):
+        now = self.clock()
+        for key in [k for k, entry in self.entries.items() if entry['expires_at'] <= now]:
+            del self.entries[key]
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'refreshes': self.refreshes,
+                    'entries': len(self.entries), 'sessions': self.pool.created}
+
+# Process-wide extractor sessions and metadata cache
+extractor_pool = ExtractorPool()
+metadata_cache = MetadataCache(extractor_pool)
 
 # ------------------------ VIDEO PROCESSING FUNCTIONS ------------------------
 
 # Function to get the direct video stream URL from YouTube
-def get_youtube_stream_url(youtube_link):
-    # Create a unique filename for this download
-    temp_dir = Utils.get_temp_dir()
-    temp_video_path = os.path.join(temp_dir, f"temp_video_{int(time.time())}.mp4")
+# The video goes under output_dir, the job's own directory, or the shared temp directory without one
+def get_youtube_stream_url(youtube_link, control=None, output_dir=None):
+    # Each download gets its own directory, so its partial files can be removed without touching other downloads
+    download_dir = os.path.join(output_dir or Utils.get_temp_dir(), f"download_{uuid.uuid4().hex}")
+    Utils.ensure_dir(download_dir)
     
-    print("Downloading video to temporary file. This may take a moment...")
+    logger.info("Downloading video to temporary file. This may take a moment...")
     
     ydl_opts = {
         "format": "bestvideo[height<=1080]+bestaudio/best[height<=1080]/best",
         "quiet": False,  # Show download progress
         "no_warnings": True,
         "socket_timeout": 30,
-        "outtmpl": temp_video_path,
+        # yt-dlp picks the extension (merged downloads may not be MP4)
+        "outtmpl": os.path.join(download_dir, "video.%(ext)s"),
     }
     
+    # yt_dlp calls progress hooks between downloaded chunks; raising there stops the download
+    def check_cancelled(status):
+        if control is not None and control.should_stop():
+            raise yt_dlp.utils.DownloadCancelled(control.reason)
+    ydl_opts["progress_hooks"] = [check_cancelled]
+    
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(youtube_link, download=True)
-            
-            if os.path.exists(temp_video_path) and os.path.getsize(temp_video_path) > 0:
-                print(f"Video downloaded successfully to: {temp_video_path}")
-                print(f"Selected format - Resolution: {info.get('height', 'unknown')}p, Codec: {info.get('vcodec', 'unknown')}")
-                return temp_video_path, info.get("title", "Unknown"), info.get("duration", 0)
-            else:
-                # Check if yt-dlp used a different filename (sometimes adds extension)
-                for filename in os.listdir(temp_dir):
-                    if filename.startswith(os.path.basename(temp_video_path.split('.')[0])):
-                        full_path = os.path.join(temp_dir, filename)
-                        print(f"Video downloaded successfully to: {full_path}")
-                        return full_path, info.get("title", "Unknown"), info.get("duration", 0)
-                        
-                print("Download appears to have failed. No file found.")
-                return None, None, None
+        
+        # The finished video is the one file left that is not a partial download or fragment
+        for filename in sorted(os.listdir(download_dir)):
+            video_path = os.path.join(download_dir, filename)
+            if filename.startswith("video.") and not filename.endswith(('.part', '.ytdl')) and \
+                    os.path.getsize(video_path) > 0:
+                logger.info(f"Video downloaded successfully to: {video_path}")
+                logger.info(f"Selected format - Resolution: {info.get('height', 'unknown')}p, "
+                            f"Codec: {info.get('vcodec', 'unknown')}")
+                return video_path, info.get("title", "Unknown"), info.get("duration", 0)
+        
+        logger.error("Download appears to have failed. No file found.")
     except Exception as e:
-        print(f"Error: Could not download YouTube video - {str(e)}")
-        return None, None, None
+        logger.error(f"Could not download YouTube video - {str(e)}")
+    # Remove this download's partial files (.part and fragment files) straight away
+    shutil.rmtree(download_dir, ignore_errors=True)
+    return None, None, None
 
-# Function to get streaming URL without downloading
+# Function to get streaming URL without downloading (served from the metadata cache when fresh)
 def get_streaming_url(youtube_link):
-    ydl_opts = {
-        "format": "bestvideo[height<=1080]+bestaudio/best[height<=1080]/best",
-        "quiet": True,
-        "no_warnings": True,
-        "socket_timeout": 30,
-    }
-    
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(youtube_link, download=False)
-            formats = info.get('formats', [])
-            
-            best_format = Utils.find_best_format(formats)
-            
-            print(f"Selected format - Resolution: {best_format.get('height', 'unknown')}p, Codec: {best_format.get('vcodec', 'unknown')}")
-            return best_format['url'], info.get("title", "Unknown"), info.get("duration", 0)
+        info = metadata_cache.get(youtube_link)
+        logger.info(f"Selected format - Resolution: {info.get('height') or 'unknown'}p, Codec: {info.get('vcodec') or 'unknown'}")
+        return info['url'], info['title'], info['duration']
+    except Exception as e:
+        logger.error(f"Could not process YouTube link - {str(e)}")
+        return None, None, None
+
+# Function to fetch only the video data needed for timestamps into a sparse local MP4 (no audio, no unused GOPs)
+# Returns the local path, or None when no format or container allows it; the caller then streams instead
+# The file goes in output_dir, the job's own directory, or the shared temp directory without one
+def get_segmented_video(youtube_link, timestamps, connections=SEGMENT_CONNECTIONS, snap_tolerance=0.0, control=None,
+                        output_dir=None):
+    temp_video_path = os.path.join(Utils.ensure_dir(output_dir) if output_dir else Utils.get_temp_dir(),
+                                   f"segments_{uuid.uuid4().hex}.mp4")
+    video_path = None
+    try:
+        info = metadata_cache.get(youtube_link)
+        video_format = Utils.find_video_only_format(info['formats'])
+        if video_format is None:
+            # A muxed MP4 still works: only its video samples are fetched
+            best = next((f for f in info['formats'] if f.get('url') == info['url']), {})
+            if best.get('ext') != 'mp4' or not info['url'].startswith(('http://', 'https://')):
+                logger.info("No video-only MP4 format available for segmented download")
+                return None
+            video_format = best
+        logger.info(f"Segmented download of format {video_format.get('format_id')} "
+                    f"({video_format.get('height') or 'unknown'}p, {video_format.get('vcodec') or 'unknown'})")
+        if fetch_segments(video_format['url'], timestamps, temp_video_path, connections=connections,
+                          snap_tolerance=snap_tolerance, control=control) is not None:
+            video_path = temp_video_path
+    except JobCancelled:
+        raise
     except Exception as e:
-        print(f"Error: Could not process YouTube link - {str(e)}")
+        logger.error(f"Segmented download failed - {str(e)}")
+    finally:
+        # A partial file is removed whether the download failed or was cancelled
+        if video_path is None and os.path.exists(temp_video_path):
+            os.remove(temp_video_path)
+    return video_path
+
+# Function to get title and duration of a local video file
+def get_local_video_info(video_path):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logger.error(f"Could not open video file {video_path}")
         return None, None, None
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    cap.release()
+    duration = frame_count / fps if fps > 0 else 0
+    return video_path, os.path.splitext(os.path.basename(video_path))[0], duration
 
 # Function to parse time format (supports HH:MM:SS, MM:SS, or seconds)
 def parse_timestamp(timestamp_str):
@@ -162,7 +1389,7 @@ def parse_timestamp(timestamp_str):
         else:
             raise ValueError(f"Invalid time format: {timestamp_str}")
     except Exception as e:
-        print(f"Error parsing timestamp '{timestamp_str}': {str(e)}")
+        logger.warning(f"Error parsing timestamp '{timestamp_str}': {str(e)}")
         # Return 0 as a fallback to avoid breaking the process
         return 0
 
@@ -170,695 +1397,1156 @@ def parse_timestamp(timestamp_str):
 def generate_interval_timestamps(duration, interval):
     return list(range(0, int(duration) + 1, interval))
 
-# Function to capture screenshots at specific timestamps
-def capture_screenshots(video_path, timestamps, output_dir="high_res_screenshots", max_retries=3, progress_callback=None):
-    # Ensure output_dir is a full path
-    if not os.path.isabs(output_dir):
-        output_dir = os.path.join(os.getcwd(), output_dir)
-    
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    images = []
-    total = len(timestamps)
-    
-    # Check if we're working with a local file
-    is_local_file = os.path.exists(video_path) and os.path.isfile(video_path)
+# Scene detection defaults: change score (0-1) that starts a new scene, analysis sample rate and frame width
+SCENE_THRESHOLD = 0.03
+SCENE_SAMPLE_FPS = 2.0
+SCENE_ANALYSIS_WIDTH = 160
+
+# Pixels whose gray level moves by more than this count as changed
+SCENE_PIXEL_DELTA = 24
+
+# Function to summarize a small grayscale frame as a normalized 32-bin histogram
+def _scene_histogram(gray):
+    return np.bincount((gray >> 3).ravel(), minlength=32) / gray.size
+
+# Function to score the change between two small grayscale frames, 0 (identical) to 1 (nothing in common)
+def scene_change_score(gray_a, hist_a, gray_b, hist_b):
+    # Histogram distance catches cuts and fades; changed-pixel fraction catches new text on a similar background
+    hist_distance = 0.5 * np.abs(hist_a - hist_b).sum()
+    changed = np.count_nonzero(np.abs(gray_a.astype(np.int16) - gray_b) > SCENE_PIXEL_DELTA) / gray_a.size
+    return float(max(hist_distance, changed))
+
+# Function to find the timestamps where a video's content changes (slides, cuts)
+def detect_scenes(video_path, threshold=SCENE_THRESHOLD, sample_fps=SCENE_SAMPLE_FPS, min_scene_length=2.0,
+                  settle_time=2.0, progress_callback=None, control=None, decoder_threads=None):
+    # Single sequential decode; only sampled frames are retrieved and scored at SCENE_ANALYSIS_WIDTH
+    cap = cv2.VideoCapture(video_path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, decoder_threads] if decoder_threads else [])
+    if not cap.isOpened():
+        logger.error(f"Could not open video for scene detection: {video_path}")
+        return []
     
-    # Get video information first to validate timestamps
-    print("Checking video duration...")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(1, int(round(fps / sample_fps)))
+    scenes = []
+    reference = previous = None
+    pending_since = None
+    index = 0
+    size = None
+    # Decode and analysis buffers are reused for every sampled frame
+    decoded = small = None
     try:
-        # Use OpenCV for local files or if ffmpeg is not available
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            print("Error: Cannot open video file for initial check")
-            return []
-            
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        # For local files, we can rely on frame count * fps
-        if is_local_file and fps > 0 and total_frames > 0:
-            duration = total_frames / fps
-        else:
-            # For streams, try to use other methods to get duration
-            duration = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
-            if duration <= 0:
-                # If we get here, use the duration passed from yt_dlp
-                if len(timestamps) > 0 and max(timestamps) > 0:
-                    duration = max(timestamps) + 60  # Add a buffer
-        
-        cap.release()
-        
-        # Proceed with taking screenshots
-        print(f"Starting screenshot capture of {total} timestamps...")
-        
-        for i, timestamp in enumerate(timestamps):
-            # Report progress if callback is provided
-            if progress_callback and callable(progress_callback):
-                progress_callback(i, total)
-                
-            # Skip timestamps beyond video duration
-            if timestamp > duration:
-                print(f"Skipping timestamp {timestamp}s as it exceeds video duration of {duration}s")
-                continue
-            
-            # Output filename will include the timestamp
-            output_filename = os.path.join(output_dir, f"screenshot_{i:03d}_{int(timestamp)}s.png")
-            
-            # Check if we already have this screenshot
-            if os.path.exists(output_filename) and os.path.getsize(output_filename) > 0:
-                print(f"Screenshot for {timestamp}s already exists, skipping")
-                images.append(output_filename)
+        while True:
+            if index % step:
+                if not cap.grab():
+                    break
+                index += 1
                 continue
+            if control is not None:
+                control.check()
+            ret, decoded = cap.read(decoded)
+            if not ret:
+                break
+            timestamp = index / fps
+            index += 1
             
-            print(f"Taking screenshot at {timestamp}s")
-            success = False
-            retry_count = 0
+            if size is None:
+                height, width = decoded.shape[:2]
+                size = (SCENE_ANALYSIS_WIDTH, max(1, int(round(height * SCENE_ANALYSIS_WIDTH / width))))
+            small = cv2.resize(decoded, size, dst=small, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            current = (gray, _scene_histogram(gray))
             
-            while not success and retry_count < max_retries:
-                try:
-                    # Use OpenCV to capture the frame
-                    cap = cv2.VideoCapture(video_path)
-                    if not cap.isOpened():
-                        print("Error: Cannot open video file")
-                        break
-                        
-                    # Convert timestamp to milliseconds for seek
-                    cap.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
-                    
-                    # Read the frame
-                    ret, frame = cap.read()
-                    if not ret:
-                        print(f"Failed to read frame at {timestamp}s, retry {retry_count + 1}")
-                        retry_count += 1
-                        cap.release()
-                        time.sleep(0.5)  # Short delay before retry
-                        continue
-                    
-                    # Save the frame as an image
-                    cv2.imwrite(output_filename, frame)
-                    
-                    # Check if the image was saved
-                    if os.path.exists(output_filename) and os.path.getsize(output_filename) > 0:
-                        success = True
-                        images.append(output_filename)
-                    else:
-                        print(f"Failed to save image for {timestamp}s, retry {retry_count + 1}")
-                        retry_count += 1
-                    
-                    cap.release()
-                    
-                except Exception as e:
-                    print(f"Error capturing screenshot at {timestamp}s: {str(e)}")
-                    retry_count += 1
+            if reference is None:
+                scenes.append(round(timestamp, 3))
+                reference = current
+            elif scene_change_score(*current, *reference) >= threshold:
+                # Wait for the picture to settle so transitions and builds aren't captured half-drawn
+                if pending_since is None:
+                    pending_since = timestamp
+                settled = scene_change_score(*current, *previous) < threshold / 2
+                if (settled or timestamp - pending_since >= settle_time) and timestamp - scenes[-1] >= min_scene_length:
+                    scenes.append(round(timestamp, 3))
+                    reference = current
+                    pending_since = None
+            else:
+                pending_since = None
+            previous = current
             
-            if not success:
-                print(f"Failed to capture screenshot at {timestamp}s after {max_retries} attempts")
-        
-        # Report final progress
-        if progress_callback and callable(progress_callback):
-            progress_callback(total, total)
-        
-        return images
-        
-    except Exception as e:
-        print(f"Error in capture_screenshots: {str(e)}")
-        return []
-
-# Function to create a PDF from the screenshots
-def create_pdf(image_paths, video_title="YouTube Video", output_pdf="screenshots.pdf", timestamp_notes=None):
-    if not image_paths:
-        print("No images to add to PDF")
-        return None
-        
-    # Use original title if possible, but ensure it's sanitized for PDF
-    safe_title = Utils.sanitize_title(video_title)
-    print(f"Creating PDF with title: {safe_title}")
-    
-    # If not specified, create a default output filename in PDF directory
-    if output_pdf == "screenshots.pdf":
-        pdf_dir = Utils.get_pdf_dir()
-        output_pdf = os.path.join(pdf_dir, f"{Utils.sanitize_filename(video_title)}.pdf")
+            if progress_callback and total_frames > 0:
+                progress_callback(min(index, total_frames), total_frames)
+    finally:
+        cap.release()
     
-    try:    
-        # Sort the images by timestamp (which is included in the filename)
-        image_paths.sort(key=lambda path: int(os.path.basename(path).split('_')[2].split('s')[0]))
-        
-        # Initialize PDF object
-        pdf = FPDF(orientation='P', unit='mm', format='A4')
-        # Set minimal margins
-        pdf.set_margins(0, 0, 0)
-        pdf.set_auto_page_break(False)
-        
-        # Add metadata
-        pdf.set_title(safe_title)
-        pdf.set_author("YouTube Screenshot PDF Generator")
-        pdf.set_creator("https://github.com/example/youtube-screenshot-pdf")
-        
-        # Add a cover page with all notes
-        pdf.add_page()
-        pdf.set_font("Arial", "B", 18)
-        pdf.set_text_color(50, 50, 50)
-        pdf.set_xy(10, 10)
-        pdf.cell(0, 15, "YouTube Video Screenshots", 0, 1, "C")
-        
-        pdf.set_font("Arial", "", 12)
-        pdf.set_text_color(80, 80, 80)
-        pdf.set_xy(10, 30)
-        pdf.multi_cell(0, 8, f"Title: {safe_title}\nGenerated: {time.strftime('%Y-%m-%d %H:%M:%S')}\nNumber of screenshots: {len(image_paths)}", 0, "L")
-        
-        # Add notes section if there are any notes
-        if timestamp_notes and any(note.strip() for note in timestamp_notes.values()):
-            pdf.set_xy(10, 60)
-            pdf.set_font("Arial", "B", 14)
-            pdf.set_text_color(50, 50, 50)
-            pdf.cell(0, 10, "Notes:", 0, 1, "L")
-            
-            y_position = 75
-            for i, img_path in enumerate(image_paths):
-                # Extract timestamp from filename
-                timestamp_seconds = int(os.path.basename(img_path).split('_')[2].split('s')[0])
-                formatted_time = str(timedelta(seconds=timestamp_seconds))
-                
-                # Check if there's a note for this timestamp
-                note = ""
-                if timestamp_notes and str(timestamp_seconds) in timestamp_notes:
-                    note = timestamp_notes[str(timestamp_seconds)]
-                
-                if note and note.strip():
-                    pdf.set_xy(10, y_position)
-                    pdf.set_font("Arial", "B", 11)
-                    pdf.set_text_color(80, 80, 80)
-                    pdf.cell(0, 6, f"Timestamp {formatted_time}:", 0, 1, "L")
-                    
-                    pdf.set_xy(20, y_position + 6)
-                    pdf.set_font("Arial", "", 10)
-                    pdf.set_text_color(100, 100, 100)
-                    pdf.multi_cell(170, 6, note.strip(), 0, "L")
-                    
-                    y_position += 20  # Move down for next note
-                    
-                    # Add a new page if we're running out of space
-                    if y_position > 270:
-                        pdf.add_page()
-                        y_position = 20
-        
-        # Add screenshots as full pages
-        for i, img_path in enumerate(image_paths):
-            # Add a new page for each image
-            pdf.add_page()
-            
-            # Extract timestamp from filename for the small timestamp overlay
-            timestamp_seconds = int(os.path.basename(img_path).split('_')[2].split('s')[0])
-            formatted_time = str(timedelta(seconds=timestamp_seconds))
-            
-            # Get image dimensions
-            img = cv2.imread(img_path)
-            img_h, img_w = img.shape[:2]
-            
-            # Calculate dimensions to fit the entire page
-            page_w = 210  # A4 width in mm
-            page_h = 297  # A4 height in mm
-            
-            # Calculate scaling factor to fit the page while preserving aspect ratio
-            scale_w = page_w / img_w
-            scale_h = page_h / img_h
-            scale = min(scale_w, scale_h)  # Use min to ensure the full image is visible without cropping
-            
-            new_w = img_w * scale
-            new_h = img_h * scale
-            
-            # Center the image on the page
-            x_pos = (page_w - new_w) / 2
-            y_pos = (page_h - new_h) / 2
-            
-            # Fill page with black background (to ensure no white margins around images)
-            pdf.set_fill_color(0, 0, 0)
-            pdf.rect(0, 0, page_w, page_h, 'F')
-            
-            # Add image to PDF as full page background
-            pdf.image(img_path, x=x_pos, y=y_pos, w=new_w, h=new_h)
-            
-            # Add a small, dark timestamp overlay
-            pdf.set_xy(5, 5)
-            pdf.set_font("Arial", "B", 10)
-            pdf.set_text_color(255, 255, 255)  # White text
-            
-            # Draw a small dark background for the timestamp
-            pdf.set_fill_color(0, 0, 0)
-            pdf.rect(5, 5, 50, 8, style='F')  # 'F' means filled rectangle
-            
-            # Add the timestamp text
-            pdf.set_xy(7, 6)
-            pdf.cell(0, 6, f"Time: {formatted_time}", 0, 0, "L")
-            
-            # Add page number at the bottom
-            pdf.set_xy(5, 287)
-            pdf.set_font("Arial", "I", 8)
-            
-            # Draw a small dark background for the page number
-            pdf.set_fill_color(0, 0, 0)
-            pdf.rect(5, 287, 30, 8, style='F')
-            
-            # Add the page number
-            pdf.set_xy(7, 288)
-            pdf.set_text_color(255, 255, 255)  # White text
-            pdf.cell(0, 6, f"Page {i+1}/{len(image_paths)}", 0, 0, "L")
-            
-            print(f"Added image {i+1}/{len(image_paths)} to PDF")
-        
-        # Save PDF
-        pdf.output(output_pdf)
-        print(f"PDF created successfully: {output_pdf}")
-        return output_pdf
-        
-    except Exception as e:
-        print(f"Error creating PDF: {str(e)}")
-        return None
+    logger.info(f"Detected {len(scenes)} scenes in {index} frames (sampled every {step} frames)")
+    return scenes
 
-# Function to clean up temporary files
-def cleanup_temp_files(video_path):
-    try:
-        if video_path and os.path.exists(video_path):
-            # If it's in our temp directory, delete it
-            temp_dir = Utils.get_temp_dir()
-            if os.path.dirname(video_path) == temp_dir:
-                os.remove(video_path)
-                print(f"Deleted temporary video: {video_path}")
-        
-        # Delete screenshot directory if it exists and is empty
-        screenshots_dir = os.path.join(os.getcwd(), "high_res_screenshots")
-        if os.path.exists(screenshots_dir) and not os.listdir(screenshots_dir):
-            os.rmdir(screenshots_dir)
-            print(f"Deleted empty screenshots directory: {screenshots_dir}")
-    except Exception as e:
-        print(f"Error cleaning up temporary files: {str(e)}")
+# Frames whose dHashes differ in at most this many of 64 bits are treated as the same picture
+DEDUP_DISTANCE = 6
 
-# ------------------------ FLASK WEB APPLICATION ------------------------
+# Function to compute the 64-bit difference hash (dHash) of a BGR or grayscale frame
+def frame_dhash(frame):
+    small = cv2.resize(frame, (9, 8), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    # One bit per horizontally adjacent pixel pair: is the right one brighter
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
 
-app = Flask(__name__, static_folder='static', template_folder='templates')
-CORS(app)
+# Function to read width, height and PDF image parameters from PNG bytes
+def _parse_png(data):
+    if data[:8] != b'\x89PNG\r\n\x1a\n' or data[12:16] != b'IHDR':
+        raise ValueError("Not a PNG image")
+    width, height, bpc, color_type = struct.unpack('>IIBB', data[16:26])
+    if color_type not in (0, 2) or data[28] != 0:
+        raise ValueError("Only non-interlaced grayscale or RGB PNG frames are supported")
+    colors = 3 if color_type == 2 else 1
+    # Concatenate the IDAT chunks, PDF can use them as-is with a PNG predictor
+    idat = []
+    pos = 8
+    while pos + 8 <= len(data):
+        length, chunk = struct.unpack('>I4s', data[pos:pos + 8])
+        if chunk == b'IDAT':
+            idat.append(data[pos + 8:pos + 8 + length])
+        elif chunk == b'IEND':
+            break
+        pos += 12 + length
+    return {
+        'w': width, 'h': height, 'bpc': bpc, 'f': 'FlateDecode',
+        'cs': 'DeviceRGB' if colors == 3 else 'DeviceGray',
+        'dp': f'/Predictor 15 /Colors {colors} /BitsPerComponent {bpc} /Columns {width}',
+        'pal': '', 'trns': '', 'data': b''.join(idat),
+    }
 
-# Store ongoing conversion jobs
-jobs = {}
+# Function to read width, height and PDF image parameters from baseline/progressive JPEG bytes
+def _parse_jpeg(data):
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("Not a JPEG image")
+        marker = data[pos + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            bpc, height, width, components = struct.unpack('>BHHB', data[pos + 4:pos + 10])
+            colorspace = {1: 'DeviceGray', 3: 'DeviceRGB', 4: 'DeviceCMYK'}.get(components, 'DeviceRGB')
+            # The JPEG stream is embedded as-is (DCTDecode), no re-encode
+            return {'w': width, 'h': height, 'cs': colorspace, 'bpc': bpc, 'f': 'DCTDecode', 'data': data}
+        pos += 2 + length
+    raise ValueError("No JPEG frame header found")
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+# Output quality profiles: target DPI on the A4 page and how frames are encoded
+QUALITY_PROFILES = {
+    'draft': {'dpi': 72, 'encoding': 'jpeg', 'jpeg_quality': 60},
+    'screen': {'dpi': 150, 'encoding': 'jpeg', 'jpeg_quality': 80},
+    'print': {'dpi': 300, 'encoding': 'png'},
+}
+DEFAULT_QUALITY = 'print'
 
-@app.route('/start_conversion', methods=['POST'])
-def start_conversion():
-    try:
-        data = request.json
-        youtube_url = data.get('youtube_url')
-        mode = data.get('mode', 'interval')
-        
-        if not youtube_url:
-            return jsonify({'error': 'YouTube URL is required'}), 400
-        
-        # Generate a unique job ID
-        job_id = str(uuid.uuid4())
-        
-        # Initialize variables
-        interval = None
-        timestamp_list = []
-        timestamp_notes = {}
-        
-        # Process based on mode
-        if mode == 'interval':
-            interval = int(data.get('interval', 60))
-            if interval < 5:
-                return jsonify({'error': 'Interval must be at least 5 seconds'}), 400
-        else:  # custom mode
-            timestamp_json = data.get('timestamp_list')
-            if not timestamp_json:
-                return jsonify({'error': 'Timestamp list is required for custom mode'}), 400
-            
+# Page size the frames are fitted to (A4 portrait, in mm)
+PAGE_WIDTH_MM = 210
+PAGE_HEIGHT_MM = 297
+
+# Function to compute the pixel size a frame needs for a profile's DPI on the page (never upscales)
+def target_frame_size(width, height, quality=DEFAULT_QUALITY):
+    profile = QUALITY_PROFILES[quality]
+    scale = min(PAGE_WIDTH_MM / width, PAGE_HEIGHT_MM / height)
+    placed_width_in = width * scale / 25.4
+    target_width = int(round(placed_width_in * profile['dpi']))
+    if target_width >= width:
+        return width, height
+    return target_width, max(1, int(round(height * target_width / width)))
+
+# A captured frame handed from capture to PDF assembly
+class FrameRecord:
+    """Encoded frame bytes with size and timestamp, kept in memory or spilled to a file"""
+
+    def __init__(self, timestamp, data=None, width=0, height=0, encoding='png', path=None, index=0, quality=None):
+        self.timestamp = timestamp
+        self.data = data
+        self.width = width
+        self.height = height
+        self.encoding = encoding
+        self.path = path  # Only set when the frame was spilled to disk
+        self.index = index
+        self.quality = quality  # Profile the frame was encoded for, None if unknown
+        self.cached = False  # True when served from the frame cache
+        self.dhash = None  # 64-bit perceptual hash, see frame_dhash()
+
+    @staticmethod
+    def encode(frame, quality=DEFAULT_QUALITY):
+        """Resize a BGR frame to the profile's target size and encode it, returns (bytes, width, height)"""
+        profile = QUALITY_PROFILES[quality]
+        height, width = frame.shape[:2]
+        target_width, target_height = target_frame_size(width, height, quality)
+        if (target_width, target_height) != (width, height):
+            frame = cv2.resize(frame, (target_width, target_height), interpolation=cv2.INTER_AREA)
+        if profile['encoding'] == 'jpeg':
+            ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, profile['jpeg_quality']])
+        else:
+            ok, buffer = cv2.imencode('.png', frame)
+        if not ok:
+            return None, 0, 0
+        return buffer.tobytes(), target_width, target_height
+
+    @classmethod
+    def from_frame(cls, frame, timestamp, index=0, path=None, quality=DEFAULT_QUALITY):
+        """Encode a decoded BGR frame, writing it to path instead of keeping it in memory if given"""
+        data, width, height = cls.encode(frame, quality)
+        if data is None:
+            return None
+        if path:
+            with open(path, 'wb') as f:
+                f.write(data)
+            data = None
+        record = cls(timestamp, data, width, height, QUALITY_PROFILES[quality]['encoding'], path, index, quality)
+        # Hashing the decoded frame now is far cheaper than decoding it again for deduplication
+        record.dhash = frame_dhash(frame)
+        return record
+
+    @classmethod
+    def from_bytes(cls, data, timestamp, index=0, quality=None):
+        """Wrap already encoded PNG or JPEG bytes, reading the size from the image header"""
+        if data[:2] == b'\xff\xd8':
+            info = _parse_jpeg(data)
+            return cls(timestamp, data, info['w'], info['h'], 'jpeg', None, index, quality)
+        width, height = struct.unpack('>II', data[16:24])
+        return cls(timestamp, data, width, height, 'png', None, index, quality)
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a record from a screenshot_<index>_<seconds>s.<png|jpg> file"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        parts = os.path.basename(path).split('_')
+        record = cls.from_bytes(data, int(parts[2].split('s')[0]), int(parts[1]))
+        record.data = None
+        record.path = path
+        return record
+
+    def transcode(self, quality):
+        """Re-encode this record for another quality profile if it does not already match"""
+        profile = QUALITY_PROFILES[quality]
+        target = target_frame_size(self.width, self.height, quality)
+        if self.quality == quality or (self.encoding == profile['encoding'] and target == (self.width, self.height)):
+            return self
+        frame = cv2.imdecode(np.frombuffer(self.load(), np.uint8), cv2.IMREAD_COLOR)
+        data, width, height = self.encode(frame, quality)
+        return FrameRecord(self.timestamp, data, width, height, profile['encoding'], None, self.index, quality)
+
+    @property
+    def size(self):
+        """Encoded size in bytes"""
+        if self.data is not None:
+            return len(self.data)
+        return os.path.getsize(self.path) if self.path and os.path.exists(self.path) else 0
+
+    def load(self):
+        """Return the encoded bytes, reading the spill file if needed"""
+        if self.data is not None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def perceptual_hash(self):
+        """Return the frame's dHash, decoding a reduced-size grayscale copy if it was not captured here"""
+        if self.dhash is None:
+            gray = cv2.imdecode(np.frombuffer(self.load(), np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+            self.dhash = frame_dhash(gray)
+        return self.dhash
+
+    def pdf_info(self):
+        """FPDF image info for this frame, parsed from the encoded bytes without decoding pixels"""
+        data = self.load()
+        return _parse_jpeg(data) if self.encoding == 'jpeg' else _parse_png(data)
+
+    def spill(self, path):
+        """Move the encoded bytes out of memory into path"""
+        with open(path, 'wb') as f:
+            f.write(self.data)
+        self.data = None
+        self.path = path
+
+    def discard(self):
+        """Drop the encoded bytes and delete any spill file"""
+        self.data = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+# Encoded frames shared across jobs, addressed by what produced them
+class FrameCache:
+    """Content-addressed on-disk cache of encoded frames with a size limit and LRU eviction
+
+    Entries are keyed by (video identity, selected format, exact timestamp, quality profile).
+    The limit defaults to FRAMECRAFTER_FRAME_CACHE_MB (1024 MB).
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get('FRAMECRAFTER_FRAME_CACHE_MB', 1024)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = None  # name -> size, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(video_key, timestamp, quality):
+        """Cache file name for one frame"""
+        return hashlib.sha1(f"{video_key}|{float(timestamp):.3f}|{quality}".encode('utf-8')).hexdigest()
+
+    def _load(self):
+        # Rebuild the LRU order from modification times, which are refreshed on every hit
+        if self.entries is not None:
+            return
+        if self.directory is None:
+            self.directory = os.environ.get('FRAMECRAFTER_FRAME_CACHE_DIR') or os.path.join(os.getcwd(), "frame_cache")
+        Utils.ensure_dir(self.directory)
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
             try:
-                timestamp_data = json.loads(timestamp_json)
-                
-                # Handle different formats of timestamp data
-                if isinstance(timestamp_data, dict):
-                    # Check if this is the format with video ID as the key
-                    # Format: {"videoId": {"timestamps": {"63": "note1", "369": "note2"}, "title": "Video Title"}}
-                    for video_id, video_data in timestamp_data.items():
-                        if isinstance(video_data, dict) and 'timestamps' in video_data:
-                            # Extract timestamps from nested structure
-                            timestamp_dict = video_data['timestamps']
-                            if isinstance(timestamp_dict, dict):
-                                timestamp_list = list(timestamp_dict.keys())
-                                timestamp_notes = timestamp_dict
-                                break  # We only process the first video ID entry
-                        else:
-                            # Regular format: {"1:30": "note1", "2:45": "note2"}
-                            timestamp_list = list(timestamp_data.keys())
-                            timestamp_notes = timestamp_data
-                elif isinstance(timestamp_data, list):
-                    timestamp_list = timestamp_data
-                else:
-                    return jsonify({'error': 'Invalid timestamp format'}), 400
-            except json.JSONDecodeError:
-                return jsonify({'error': 'Invalid JSON format for timestamps'}), 400
-        
-        # Create job entry
-        jobs[job_id] = {
-            'status': 'queued',
-            'message': 'Job queued',
-            'progress': 0,
-            'pdf_path': None,
-            'timestamp_notes': timestamp_notes
-        }
-        
-        # Start conversion in a separate thread
-        thread = threading.Thread(
-            target=process_conversion,
-            args=(job_id, youtube_url, mode, timestamp_list, interval, timestamp_notes)
-        )
-        thread.daemon = True
-        thread.start()
-        
-        return jsonify({
-            'job_id': job_id
-        })
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name, stat.st_size))
+        files.sort()
+        self.entries = collections.OrderedDict((name, size) for _, name, size in files)
+        self.total_bytes = sum(size for _, _, size in files)
 
-def process_conversion(job_id, youtube_url, mode, timestamp_list, interval, timestamp_notes=None):
-    try:
-        # Update job status
-        jobs[job_id]['status'] = 'processing'
-        jobs[job_id]['message'] = 'Getting video stream...'
-        jobs[job_id]['progress'] = 5
-        jobs[job_id]['details'] = 'Analyzing YouTube video and preparing for capture'
-        
-        # Get video stream URL and info without downloading
-        stream_url, video_title, duration = get_streaming_url(youtube_url)
-        
-        if not stream_url:
-            jobs[job_id]['status'] = 'error'
-            jobs[job_id]['message'] = 'Failed to get video stream'
+    def path(self, video_key, timestamp, quality):
+        """Path of one frame's cache file, whether or not it is cached"""
+        with self.lock:
+            self._load()
+        return os.path.join(self.directory, self.key(video_key, timestamp, quality))
+
+    def get(self, video_key, timestamp, quality, index=0):
+        """Return a cached FrameRecord or None"""
+        name = self.key(video_key, timestamp, quality)
+        with self.lock:
+            self._load()
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.misses += 1
+                self.total_bytes -= self.entries.pop(name, 0)
+            return None
+        with self.lock:
+            self.hits += 1
+            # Another process may have stored this entry
+            if name not in self.entries:
+                self.entries[name] = len(data)
+                self.total_bytes += len(data)
+            self.entries.move_to_end(name)
+        record = FrameRecord.from_bytes(data, timestamp, index, quality)
+        record.cached = True
+        return record
+
+    def put(self, video_key, timestamp, quality, data):
+        """Store encoded frame bytes and evict least recently used entries over the limit"""
+        if not data or len(data) > self.max_bytes:
             return
-        
-        # Update job status
-        jobs[job_id]['message'] = 'Preparing to capture screenshots...'
-        jobs[job_id]['progress'] = 15
-        jobs[job_id]['details'] = f'Video title: {video_title}, Duration: {duration} seconds'
-        
-        # Determine timestamps
-        if mode == 'interval':
-            timestamps = generate_interval_timestamps(duration, interval)
-            jobs[job_id]['details'] = f'Video title: {video_title}, Taking screenshots every {interval} seconds'
-        else:  # custom timestamps
-            # Convert string timestamps to seconds
-            timestamps = []
-            for ts in timestamp_list:
-                try:
-                    seconds = parse_timestamp(ts)
-                    timestamps.append(seconds)
-                except Exception as e:
-                    print(f"Error parsing timestamp {ts}: {str(e)}")
-            
-            if not timestamps:
-                timestamps = generate_interval_timestamps(duration, 60)  # Default fallback
-                jobs[job_id]['details'] = f'Video title: {video_title}, Using default intervals (60s) as custom timestamps failed'
-            else:
-                jobs[job_id]['details'] = f'Video title: {video_title}, Using {len(timestamps)} custom timestamps'
-        
-        # Capture screenshots
-        screenshots_dir = os.path.join(os.getcwd(), "screenshots_" + job_id)
-        Utils.ensure_dir(screenshots_dir)
-        
-        # Update job status before starting capture
-        jobs[job_id]['message'] = 'Capturing screenshots...'
-        jobs[job_id]['progress'] = 20
-        
-        # Track progress for each screenshot
-        total_screenshots = len(timestamps)
-        screenshot_progress_weight = 50  # Screenshots account for 50% of total progress
-        base_progress = 20  # Starting progress for screenshot phase
-        
-        # Define a progress callback function
-        def update_screenshot_progress(current_index, total):
-            if total <= 0:
-                return
-            screenshot_progress = (current_index / total) * screenshot_progress_weight
-            jobs[job_id]['progress'] = base_progress + screenshot_progress
-            jobs[job_id]['details'] = f'Capturing screenshot {current_index} of {total} ({int(current_index/total*100)}%)'
-        
-        # Capture screenshots with progress updates
-        image_paths = capture_screenshots(stream_url, timestamps, output_dir=screenshots_dir, progress_callback=update_screenshot_progress)
-        
-        if not image_paths:
-            jobs[job_id]['status'] = 'error'
-            jobs[job_id]['message'] = 'Failed to capture screenshots'
+        name = self.key(video_key, timestamp, quality)
+        with self.lock:
+            self._load()
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not store frame in cache: {str(e)}")
             return
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+            self.stores += 1
+            self._trim()
+
+    def _trim(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def merge_stats(self, stats):
+        """Add counters reported by a capture worker process"""
+        with self.lock:
+            self.hits += stats.get('hits', 0)
+            self.misses += stats.get('misses', 0)
+            self.stores += stats.get('stores', 0)
+            self.evictions += stats.get('evictions', 0)
+            # Workers may have added files, rescan on next use
+            self.entries = None
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self.lock:
+            self._load()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+# Process-wide frame cache
+frame_cache = FrameCache()
+
+# ------------------------ CHECKPOINTS ------------------------
+
+# Web jobs and CLI runs keep a checkpoint so they can resume after a crash (FRAMECRAFTER_CHECKPOINTS=0 disables)
+CHECKPOINTS = os.environ.get('FRAMECRAFTER_CHECKPOINTS', '1') != '0'
+
+# Append-only record of a job's finished work, used to resume it after a crash or restart
+class Checkpoint:
+    """Append-only JSONL manifest of a job's completed work and where its captured frames are kept
+
+    Each line is one event: 'job' (the request, written when it is accepted), 'start' (a
+    process took the job over), 'plan' (the timestamps to capture), 'frame' (timestamp,
+    quality, size and SHA-1 of a captured frame) and 'pdf' (pages written to the streamed PDF,
+    at most one line per percent). A frame already in the frame cache is
+    recorded by its cache key and path; only frames with no cache entry are copied next to
+    the manifest. Every line is flushed as it is written, and a line torn by a crash is
+    skipped when reading. Frames are only reused while they match the recorded size and hash,
+    so one evicted from the cache since is captured again.
+    """
+
+    def __init__(self, name, directory=None):
+        self.name = name
+        self.directory = directory or Utils.get_checkpoint_dir()
+        self.path = os.path.join(self.directory, f"{name}.jsonl")
+        self.frames_dir = os.path.join(self.directory, name)
+        self.lock = threading.Lock()
+        self.job = None  # Request of the last 'job' event
+        self.owner = None  # (host, pid) of the last 'job' or 'start' event
+        self.timestamps = None  # Timestamps of the last 'plan' event
+        self.frames = {}  # frame_key() -> 'frame' event
+        self.pdf_pages = 0  # Pages of the last 'pdf' event
+        self.pdf_total = None
+        self.pdf_recorded = 0  # Pages recorded by this process
+        self.restored = 0
+        self._load()
+
+    @staticmethod
+    def frame_key(timestamp, quality):
+        return f"{float(timestamp):.3f}|{quality}"
+
+    @classmethod
+    def saved(cls, directory=None):
+        """All checkpoints in directory"""
+        directory = directory or Utils.get_checkpoint_dir()
+        return [cls(name[:-len('.jsonl')], directory) for name in sorted(os.listdir(directory)) if name.endswith('.jsonl')]
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            event = entry.get('event')
+            if event in ('job', 'start'):
+                self.owner = (entry.get('host'), entry.get('pid'))
+                if event == 'job':
+                    self.job = entry.get('request')
+            elif event == 'plan':
+                self.timestamps = entry.get('timestamps')
+            elif event == 'frame':
+                self.frames[self.frame_key(entry['timestamp'], entry['quality'])] = entry
+            elif event == 'pdf':
+                self.pdf_pages, self.pdf_total = entry.get('pages', 0), entry.get('total')
+
+    def _append(self, event, **fields):
+        line = json.dumps(dict(fields, event=event), sort_keys=True)
+        with self.lock:
+            Utils.ensure_dir(self.directory)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def start(self, request=None):
+        """Record the job's request, or without one that this process took the job over"""
+        self.owner = (socket.gethostname(), os.getpid())
+        if request is not None:
+            self.job = request
+            self._append('job', request=request, host=self.owner[0], pid=self.owner[1])
+        else:
+            self._append('start', host=self.owner[0], pid=self.owner[1])
+
+    def owner_alive(self):
+        """True while another process on this host that last took the job is still running"""
+        host, pid = self.owner or (None, None)
+        if host != socket.gethostname() or not pid or pid == os.getpid() or os.name != 'posix':
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def plan(self, timestamps):
+        """Record the timestamps the job captures, so a resumed job skips working them out again"""
+        self.timestamps = list(timestamps)
+        self._append('plan', timestamps=self.timestamps)
+
+    def add_frame(self, record, cache_path=None):
+        """Record a captured frame, pointing at its frame cache file (cache_path) when that holds it, else at a copy"""
+        key = self.frame_key(record.timestamp, record.quality)
+        if key in self.frames:
+            return
+        data = record.load()
+        entry = {'timestamp': record.timestamp, 'quality': record.quality, 'index': record.index,
+                 'size': len(data), 'sha1': hashlib.sha1(data).hexdigest()}
+        if cache_path is not None and os.path.isfile(cache_path) and os.path.getsize(cache_path) == len(data):
+            entry.update(cache_key=os.path.basename(cache_path), path=cache_path)
+        else:
+            extension = 'jpg' if record.encoding == 'jpeg' else 'png'
+            name = f"frame_{record.index:05d}_{float(record.timestamp):.3f}_{record.quality}.{extension}"
+            path = os.path.join(Utils.ensure_dir(self.frames_dir), name)
+            with open(f"{path}.tmp", 'wb') as f:
+                f.write(data)
+            os.replace(f"{path}.tmp", path)
+            entry['file'] = name
+        self.frames[key] = entry
+        self._append('frame', **entry)
+
+    def pdf_progress(self, pages, total=None):
+        """Record pages written to the PDF so far; a progress_callback for create_pdf and capture_to_pdf"""
+        step = max(1, (total or 0) // 100)
+        if pages - self.pdf_recorded < step and pages != total:
+            return
+        self.pdf_recorded = pages
+        self.pdf_pages, self.pdf_total = pages, total
+        self._append('pdf', pages=pages, total=total)
+
+    def resumed_pdf(self):
+        """Describe how far the interrupted run got with the PDF, or None if it had not started it"""
+        if not self.pdf_pages:
+            return None
+        of_total = f" of {self.pdf_total}" if self.pdf_total else ""
+        return f"{self.pdf_pages}{of_total} PDF pages had been written"
+
+    def restore(self, timestamp, quality, index=0):
+        """Return the checkpointed FrameRecord for timestamp, or None if there is none or its copy is damaged"""
+        entry = self.frames.get(self.frame_key(timestamp, quality))
+        if entry is None:
+            return None
+        try:
+            with open(entry.get('path') or os.path.join(self.frames_dir, entry['file']), 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = None
+        if data is None or len(data) != entry['size'] or hashlib.sha1(data).hexdigest() != entry['sha1']:
+            # Forget it so the frame captured in its place is checkpointed again
+            logger.warning(f"Checkpointed frame at {timestamp}s is missing or damaged, capturing it again")
+            self.frames.pop(self.frame_key(timestamp, quality), None)
+            return None
+        self.restored += 1
+        return FrameRecord.from_bytes(data, timestamp, index, quality)
+
+    def remove(self):
+        """Delete the manifest and frame copies of a finished job (frames in the frame cache stay there)"""
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            shutil.rmtree(self.frames_dir, ignore_errors=True)
+
+# Frame reader that keeps a single video source open across timestamps
+class CaptureEngine:
+    """Read frames at ascending timestamps from one open video source
+
+    With a quality profile, every frame is scaled down to the profile's target size as soon as
+    it is decoded. Decoding and scaling write into buffers reused across reads, so no full-size
+    frame outlives the next read. threads sets the decoder's thread count (None keeps
+    OpenCV's default of one per CPU).
+    """
+
+    def __init__(self, video_path, max_retries=3, max_forward_gap=5.0, timer=None, quality=None, threads=None):
+        self.video_path = video_path
+        self.max_retries = max_retries
+        self.timer = timer if timer is not None else StageTimer()
+        self.quality = quality
+        self.threads = threads
+        self.decoded = None  # Decode buffer at source size
+        self.resized = None  # Output buffer at the profile's target size
+        # Gaps up to this many seconds are decoded forward with grab() instead of seeking
+        self.max_forward_gap = max_forward_gap
+        self.cap = None
+        self.fps = 0
+        self.frame_count = 0
+        self.frame_ms = 40.0
+        self.last_ms = None  # Timestamp of the most recently decoded frame
+        self.last_frame = None
+        self.opens = 0
+        self.seeks = 0
+        self.grabs = 0
+
+    def open(self):
+        """(Re)open the video source, returns True on success"""
+        self.release()
+        params = [cv2.CAP_PROP_N_THREADS, self.threads] if self.threads else []
+        with self.timer.stage('open'):
+            self.cap = cv2.VideoCapture(self.video_path, cv2.CAP_ANY, params)
+        self.opens += 1
+        if not self.cap.isOpened():
+            self.cap = None
+            return False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_ms = 1000.0 / self.fps if self.fps > 0 else 40.0
+        return True
+
+    def release(self):
+        """Release the video source if it is open"""
+        if self.cap is not None:
+            self.cap.release()
+        self.cap = None
+        self.last_ms = None
+        self.last_frame = None
+
+    def _output(self, ret, frame):
+        # Keep the decode buffer for the next read and scale the frame into the output buffer
+        if not ret:
+            return None
+        self.decoded = frame
+        if self.quality is None:
+            return frame
+        height, width = frame.shape[:2]
+        size = target_frame_size(width, height, self.quality)
+        if size == (width, height):
+            return frame
+        if self.resized is None or self.resized.shape != (size[1], size[0]) + frame.shape[2:]:
+            self.resized = np.empty((size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+        with self.timer.stage('resize'):
+            return cv2.resize(frame, size, dst=self.resized, interpolation=cv2.INTER_AREA)
+
+    def _seek(self, target_ms):
+        self.seeks += 1
+        with self.timer.stage('seek'):
+            self.cap.set(cv2.CAP_PROP_POS_MSEC, target_ms)
+        with self.timer.stage('decode'):
+            ret, frame = self.cap.read(self.decoded)
+        return self._output(ret, frame)
+
+    def _forward(self, target_ms):
+        # Decode forward until the next frame would be past the target
+        with self.timer.stage('decode'):
+            while True:
+                if not self.cap.grab():
+                    return None
+                self.grabs += 1
+                if self.cap.get(cv2.CAP_PROP_POS_MSEC) + self.frame_ms / 2 >= target_ms:
+                    break
+            ret, frame = self.cap.retrieve(self.decoded)
+        return self._output(ret, frame)
+
+    def read_at(self, timestamp, action=None):
+        """Return the frame at timestamp (seconds) or None after max_retries failures
+
+        action forces 'seek' or 'forward' (as planned by SeekPlanner), otherwise the
+        gap to the current position decides. The frame is overwritten by the next read.
+        """
+        target_ms = timestamp * 1000
+        for attempt in range(self.max_retries):
+            if self.cap is None and not self.open():
+                logger.warning(f"Cannot open video file, retry {attempt + 1}")
+                time.sleep(0.5)
+                continue
+
+            # Repeated timestamps resolve to the frame we already have
+            if self.last_frame is not None and abs(target_ms - self.last_ms) <= self.frame_ms / 2:
+                return self.last_frame
+
+            # Position of the next frame the decoder will produce
+            next_ms = self.last_ms + self.frame_ms if self.last_ms is not None else 0
+            gap_ms = target_ms - next_ms + self.frame_ms / 2
+            if action is None:
+                forward = 0 <= gap_ms <= self.max_forward_gap * 1000
+            else:
+                forward = action == 'forward' and gap_ms >= 0
+            if forward:
+                frame = self._forward(target_ms)
+            else:
+                frame = self._seek(target_ms)
+
+            if frame is not None:
+                self.last_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+                self.last_frame = frame
+                return frame
+
+            # Only a failed read forces the source to be reopened
+            logger.warning(f"Failed to read frame at {timestamp}s, retry {attempt + 1}")
+            self.release()
+            time.sleep(0.5)
+        return None
+
+# Function to estimate the decode cost (in frames) of each planned capture step
+def estimate_capture_costs(targets, actions, fps, index=None, seek_cost_frames=10, max_forward_gap=5.0):
+    fps = fps if fps > 0 else 25.0
+    costs = []
+    previous = -1.0 / fps
+    for timestamp, action in zip(targets, actions):
+        gap = max(0.0, timestamp - previous)
+        if action == 'forward' or (action is None and gap <= max_forward_gap):
+            cost = gap * fps
+        else:
+            # Without an index assume the keyframe is about a second back
+            keyframe = index.keyframe_before(timestamp) if index is not None else max(0.0, timestamp - 1.0)
+            cost = seek_cost_frames + (timestamp - keyframe) * fps
+        costs.append(max(cost, 1.0))
+        previous = timestamp
+    return costs
+
+# Function to split ascending steps into contiguous segments of roughly equal cost
+def split_segments(steps, costs, workers, seek_cost_frames=10):
+    if workers <= 1 or len(steps) <= 1:
+        return [steps]
+    workers = min(workers, len(steps))
+    budget = sum(costs) / workers
+    segments = []
+    current = []
+    spent = 0.0
+    for step, cost in zip(steps, costs):
+        if current and spent + cost / 2 > budget and len(segments) < workers - 1:
+            segments.append(current)
+            current = []
+            # Each segment starts with a seek instead of a forward decode from the previous target
+            spent = seek_cost_frames
+        current.append(step)
+        spent += cost
+    segments.append(current)
+    return segments
+
+# Function to drop frames that look the same as the last frame kept before them
+def dedupe_frames(frames, timestamp_notes=None, max_distance=DEDUP_DISTANCE):
+    # Returns (kept frames, notes with dropped frames' notes moved to the kept frame, number dropped)
+    notes = dict(timestamp_notes or {})
+    stats = {'dropped': 0}
+    kept = list(iter_deduped(sorted(frames, key=lambda record: record.timestamp), notes, max_distance, stats))
+    if stats['dropped']:
+        logger.info(f"Dropped {stats['dropped']} near-duplicate frames (Hamming distance <= {max_distance})")
+    return kept, notes, stats['dropped']
+
+# Function to yield the frames of a timestamp-ordered stream that differ from the last frame kept before them
+# Dropped frames are discarded and their notes moved to the kept frame in notes (updated in place);
+# only the kept frame's hash is remembered, so it may be discarded as soon as it is consumed
+def iter_deduped(frames, notes, max_distance=DEDUP_DISTANCE, stats=None):
+    kept_hash, kept_key = None, None
+    for record in frames:
+        frame_hash = record.perceptual_hash()
+        if kept_hash is not None and (frame_hash ^ kept_hash).bit_count() <= max_distance:
+            note = notes.pop(str(int(record.timestamp)), None)
+            if note and note.strip():
+                notes[kept_key] = f"{notes[kept_key].strip()}\n{note.strip()}" if notes.get(kept_key, '').strip() else note
+            record.discard()
+            if stats is not None:
+                stats['dropped'] = stats.get('dropped', 0) + 1
+            continue
+        kept_hash, kept_key = frame_hash, str(int(record.timestamp))
+        yield record
+
+# Function to build the spill file path for a frame
+def _spill_path(output_dir, index, timestamp, quality):
+    extension = 'jpg' if QUALITY_PROFILES[quality]['encoding'] == 'jpeg' else 'png'
+    return os.path.join(output_dir, f"screenshot_{index:03d}_{int(timestamp)}s.{extension}")
+
+# Function to capture (index, timestamp, action) steps with an open engine
+# With on_record, every step is handed over as on_record(index, record or None) instead of returned
+def _capture_steps(engine, steps, output_dir, duration, max_retries, on_step=None, quality=DEFAULT_QUALITY,
+                   cache=None, video_key=None, control=None, on_record=None):
+    # Frames stay in memory unless output_dir is given for disk spill
+    records = []
+    
+    def keep(i, record):
+        if record is not None:
+            records.append(record)
+    
+    on_record = on_record or keep
+    for step, (i, timestamp, action) in enumerate(steps):
+        # Stop between frames once the job is cancelled or out of time, keeping what was captured
+        if control is not None and control.should_stop():
+            logger.info(f"Capture stopped after {step} of {len(steps)} frames")
+            break
+        if on_step:
+            on_step()
         
-        # Update job status
-        jobs[job_id]['status'] = 'generating_pdf'
-        jobs[job_id]['message'] = 'Creating PDF...'
-        jobs[job_id]['progress'] = 70
-        jobs[job_id]['details'] = f'Combining {len(image_paths)} screenshots into PDF'
-        
-        # Create PDF
-        safe_title = Utils.sanitize_filename(video_title if video_title else "YouTube_Video")
-        pdf_filename = f"{safe_title}_{job_id}.pdf"
-        pdf_path = os.path.join(Utils.get_pdf_dir(), pdf_filename)
-        
-        # Pass timestamp notes to the PDF creation function
-        jobs[job_id]['progress'] = 80
-        jobs[job_id]['details'] = 'Generating PDF with timestamps and notes'
-        
-        create_pdf(image_paths, video_title=video_title, output_pdf=pdf_path, timestamp_notes=timestamp_notes)
-        
-        # Cleanup phase
-        jobs[job_id]['progress'] = 95
-        jobs[job_id]['details'] = 'Cleaning up temporary files'
+        # Skip timestamps beyond video duration
+        if timestamp > duration:
+            logger.debug(f"Skipping timestamp {timestamp}s as it exceeds video duration of {duration}s")
+            on_record(i, None)
+            continue
         
-        # Delete screenshots after PDF creation
-        for img_path in image_paths:
-            if os.path.exists(img_path):
-                os.remove(img_path)
+        logger.debug(f"Taking screenshot at {timestamp}s")
+        frame = engine.read_at(timestamp, action)
+        if frame is None:
+            logger.warning(f"Failed to capture screenshot at {timestamp}s after {max_retries} attempts")
+            on_record(i, None)
+            continue
         
-        if os.path.exists(screenshots_dir):
-            os.rmdir(screenshots_dir)
+        with engine.timer.stage('encode'):
+            record = FrameRecord.from_frame(frame, timestamp, index=i, quality=quality)
+        if record is None or record.size == 0:
+            logger.warning(f"Failed to encode image for {timestamp}s")
+            on_record(i, None)
+            continue
         
-        # Delete temporary files
-        temp_dir = Utils.get_temp_dir()
-        for filename in os.listdir(temp_dir):
-            file_path = os.path.join(temp_dir, filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        if cache is not None:
+            cache.put(video_key, timestamp, quality, record.data)
+        if output_dir:
+            record.spill(_spill_path(output_dir, i, timestamp, quality))
+        on_record(i, record)
+    return records
+
+# Process pool entry point: capture one contiguous segment with its own capture handle
+def _capture_segment_worker(video_path, steps, output_dir, duration, max_retries, progress_queue, quality=DEFAULT_QUALITY,
+                            cache_config=None, video_key=None, log_level=logging.INFO, stop_event=None,
+                            decoder_threads=None, record_queue=None):
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    if decoder_threads:
+        # OpenCV's own thread pool (resize, color conversion) gets the same share of the CPUs as the decoder
+        cv2.setNumThreads(decoder_threads)
+    # Timings travel back to the parent, which records them in its own registry
+    timer = StageTimer(registry=None)
+    engine = CaptureEngine(video_path, max_retries=max_retries, timer=timer, quality=quality, threads=decoder_threads)
+    cache = FrameCache(*cache_config) if cache_config else None
+    try:
+        if not engine.open():
+            logger.error("Cannot open video file in capture worker")
+            return [], {}, timer.histograms
+        # Jump straight to the segment instead of decoding forward from the start
+        first_index, first_timestamp, first_action = steps[0]
+        if first_timestamp > engine.max_forward_gap:
+            steps = [(first_index, first_timestamp, 'seek')] + list(steps[1:])
+        records = _capture_steps(engine, steps, output_dir, duration, max_retries,
+                                 on_step=lambda: progress_queue.put(1), quality=quality,
+                                 cache=cache, video_key=video_key,
+                                 control=JobControl(event=stop_event) if stop_event is not None else None,
+                                 on_record=(lambda i, record: record_queue.put((i, record))) if record_queue else None)
+        return records, (cache.stats() if cache is not None else {}), timer.histograms
+    except Exception as e:
+        logger.error(f"Error in capture worker: {str(e)}")
+        return [], {}, timer.histograms
+    finally:
+        engine.release()
+
+# Function to run capture segments on a process pool, merging progress into one callback
+# With on_record, workers send each step through a queue of queue_size records as they go (see _capture_steps)
+def _capture_parallel(video_path, segments, output_dir, duration, max_retries, total, progress_callback=None,
+                      quality=DEFAULT_QUALITY, cache=None, video_key=None, done=0, timer=None, control=None,
+                      decoder_threads=None, on_record=None, queue_size=0):
+    ctx = multiprocessing.get_context('spawn')  # OpenCV is not fork-safe once its threads are running
+    cache_config = (cache.directory, cache.max_bytes) if cache is not None else None
+    results = []
+    # Workers ignore Ctrl+C; the parent stops them through stop_event so their frames are cleaned up
+    with ctx.Manager() as manager, concurrent.futures.ProcessPoolExecutor(
+            max_workers=len(segments), mp_context=ctx, initializer=signal.signal,
+            initargs=(signal.SIGINT, signal.SIG_IGN)) as pool:
+        progress_queue = manager.Queue()
+        # Set when the job stops; workers check it between frames
+        stop_event = manager.Event()
+        # Bounded, so workers wait while the consumer of on_record falls behind
+        record_queue = manager.Queue(queue_size) if on_record else None
+        futures = [pool.submit(_capture_segment_worker, video_path, segment, output_dir, duration, max_retries, progress_queue,
+                               quality, cache_config, video_key, logger.getEffectiveLevel(), stop_event, decoder_threads,
+                               record_queue)
+                   for segment in segments]
         
-        # Update job status
-        jobs[job_id]['status'] = 'completed'
-        jobs[job_id]['message'] = 'Conversion completed successfully!'
-        jobs[job_id]['progress'] = 100
-        jobs[job_id]['details'] = f'PDF created successfully: {pdf_filename}'
-        jobs[job_id]['pdf_path'] = pdf_path
-        jobs[job_id]['pdf_filename'] = pdf_filename
+        def drain_records(wait=0):
+            # Workers block on a full queue, so it is drained until every worker has returned
+            while record_queue is not None:
+                try:
+                    i, record = record_queue.get(timeout=wait) if wait else record_queue.get_nowait()
+                except queue.Empty:
+                    break
+                on_record(i, record)
+                wait = 0
         
-    except Exception as e:
-        print(f"Error in conversion process: {str(e)}")
-        jobs[job_id]['status'] = 'error'
-        jobs[job_id]['message'] = f'Error: {str(e)}'
-        jobs[job_id]['details'] = f'Failed at step: {jobs[job_id].get("details", "Unknown step")}'
-
-@app.route('/job_status/<job_id>', methods=['GET'])
-def get_job_status(job_id):
-    if job_id not in jobs:
-        return jsonify({'status': 'failed', 'message': 'Job not found'}), 404
-    
-    job = jobs[job_id]
-    response = {
-        'status': job['status'] if job['status'] != 'error' else 'failed',
-        'message': job['message'],
-        'progress': job['progress'] / 100  # Convert to 0-1 range for frontend
-    }
-    
-    if job.get('details'):
-        response['details'] = job['details']
-    
-    if job['status'] == 'completed' and job.get('pdf_filename'):
-        response['pdf_filename'] = job['pdf_filename']
-    
-    return jsonify(response)
+        pending = set(futures)
+        while pending:
+            # While records flow, waiting for the next one paces this loop instead
+            _, pending = concurrent.futures.wait(pending, timeout=0 if record_queue is not None else 0.25)
+            if control is not None and not stop_event.is_set() and control.should_stop():
+                stop_event.set()
+            drain_records(wait=0.25)
+            while True:
+                try:
+                    done += progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+            if progress_callback and callable(progress_callback):
+                progress_callback(min(done, total), total)
+        drain_records()
+        for future in futures:
+            records, stats, histograms = future.result()
+            results.extend(records)
+            if cache is not None:
+                cache.merge_stats(stats)
+            if timer is not None:
+                timer.merge(histograms)
+    return results
 
-@app.route('/download/<filename>', methods=['GET'])
-def download_file(filename):
-    pdf_dir = Utils.get_pdf_dir()
-    
-    # Check if file exists
-    file_path = os.path.join(pdf_dir, filename)
-    if not os.path.exists(file_path):
-        return jsonify({'error': 'File not found'}), 404
-    
-    # Schedule file deletion after a short delay (3 minutes)
-    def delete_file_later(file_path, delay=180):
-        time.sleep(delay)
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"Deleted temporary file: {file_path}")
-        except Exception as e:
-            print(f"Error deleting file {file_path}: {str(e)}")
+# Function to capture screenshots at specific timestamps
+# Returns FrameRecords in timestamp order, resized right after decode and encoded once for the quality profile;
+# frames are only written to output_dir with spill_to_disk. decoder_threads is per capture process and defaults
+# to an even share of the CPUs between workers (OpenCV's default with one worker)
+# With a sink (FramePipeline), every frame is handed over as sink.put(rank in timestamp order, record or None)
+# as soon as it is captured or served from the cache, and the returned list is empty. With a Checkpoint, frames
+# it holds are restored instead of decoded and every other frame is added to it as soon as it is captured
+def capture_screenshots(video_path, timestamps, output_dir="high_res_screenshots", max_retries=3, progress_callback=None,
+                        use_keyframe_index=True, fast_mode=False, snap_tolerance=1.0, workers=1, spill_to_disk=False,
+                        quality=DEFAULT_QUALITY, cache=frame_cache, timer=None, control=None, decoder_threads=None,
+                        sink=None, checkpoint=None):
+    timer = timer if timer is not None else StageTimer()
+    if decoder_threads is None and workers > 1:
+        decoder_threads = max(1, (os.cpu_count() or 1) // workers)
+    if control is not None:
+        control.check()
+    if spill_to_disk:
+        # Ensure output_dir is a full path
+        if not os.path.isabs(output_dir):
+            output_dir = os.path.join(os.getcwd(), output_dir)
+        
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+    else:
+        output_dir = None
     
-    # Start a thread to delete the file after it's been downloaded
-    threading.Thread(target=delete_file_later, args=(file_path,), daemon=True).start()
+    total = len(timestamps)
     
-    return send_from_directory(pdf_dir, filename, as_attachment=True)
-
-# Command line interface function
-def cli_main():
-    parser = argparse.ArgumentParser(description="YouTube Video to PDF Converter - Terminal Version")
-    parser.add_argument("--url", '-u', type=str, help="YouTube URL to process")
-    parser.add_argument("--mode", '-m', type=str, choices=["stream", "download"], default="stream",
-                        help="Processing mode: stream (default) or download")
-    parser.add_argument("--timestamp-type", '-t', type=str, choices=["specific", "interval"], default="interval",
-                        help="Timestamp type: specific (list of times) or interval (regular intervals)")
-    parser.add_argument("--timestamps", '-ts', type=str, default="",
-                        help="Comma-separated list of specific timestamps (e.g., '0:30,1:45,2:10')")
-    parser.add_argument("--interval", '-i', type=int, default=30,
-                        help="Interval in seconds between screenshots (default: 30)")
-    parser.add_argument("--output", '-o', type=str, default="",
-                        help="Output PDF file path (default: auto-generate from video title)")
+    # Check if we're working with a local file
+    is_local_file = os.path.exists(video_path) and os.path.isfile(video_path)
+    seek_cost_frames = 10 if is_local_file else 100
+    video_key = Utils.video_identity(video_path)
     
-    args = parser.parse_args()
+    # Visit timestamps in ascending order so the decoder only moves forward
+    order = sorted(range(total), key=lambda idx: timestamps[idx])
+    steps = [(i, timestamps[i], None) for i in order]
+    cached = []
+    rank = {i: position for position, i in enumerate(order)}
+    decoded = [0]
+    collected = []
     
-    # If no URL is provided, prompt for it
-    youtube_url = args.url
-    if not youtube_url:
-        youtube_url = input("Enter YouTube URL: ")
+    def emit(i, record):
+        # Decoded frames are checkpointed as they arrive, then handed to the sink or collected
+        if record is not None:
+            decoded[0] += 1
+            if checkpoint is not None:
+                checkpoint.add_frame(record, cache.path(video_key, record.timestamp, quality) if cache is not None else None)
+        if sink is not None:
+            sink.put(rank[i], record)
+        elif record is not None:
+            collected.append(record)
     
-    mode = args.mode
-    timestamp_type = args.timestamp_type
-    timestamp_input = args.timestamps
-    interval = args.interval
-    output_file = args.output
+    on_record = emit if sink is not None or checkpoint is not None else None
     
-    print(f"\nYouTube to PDF Converter - Terminal Version")
-    print(f"=======================================\n")
-    print(f"Processing YouTube URL: {youtube_url}")
-    print(f"Mode: {mode}")
-    print(f"Timestamp type: {timestamp_type}")
+    def take_cached(steps):
+        # Serve frames from the checkpoint or the cache and return the steps that still need decoding
+        if cache is None and checkpoint is None:
+            return steps
+        remaining = []
+        for i, timestamp, action in steps:
+            record = checkpoint.restore(timestamp, quality, index=i) if checkpoint is not None else None
+            if record is None and cache is not None:
+                record = cache.get(video_key, timestamp, quality, index=i)
+                if record is not None and checkpoint is not None:
+                    checkpoint.add_frame(record, cache.path(video_key, timestamp, quality))
+            if record is None:
+                remaining.append((i, timestamp, action))
+                continue
+            if output_dir:
+                record.spill(_spill_path(output_dir, i, timestamp, quality))
+            cached.append(record)
+            if sink is not None:
+                sink.put(rank[i], record)
+        return remaining
     
-    if timestamp_type == "specific":
-        if not timestamp_input:
-            timestamp_input = input("Enter comma-separated timestamps (e.g., 0:30,1:45,2:10): ")
-        print(f"Using specific timestamps: {timestamp_input}")
-    else:
-        print(f"Using interval: {interval} seconds")
+    # Exact timestamps are known up front, so the cache is checked before the source is even opened
+    if not fast_mode:
+        steps = take_cached(steps)
+        if not steps:
+            logger.info(f"All {total} screenshots served from the checkpoint or the frame cache")
+            restored = checkpoint.restored if checkpoint is not None else 0
+            metrics.inc('framecrafter_frames_total', len(cached) - restored, source='cache')
+            metrics.inc('framecrafter_frames_total', restored, source='checkpoint')
+            if progress_callback and callable(progress_callback):
+                progress_callback(total, total)
+            return [] if sink is not None else sorted(cached, key=lambda record: record.timestamp)
     
-    if output_file:
-        print(f"Output file: {output_file}")
+    # A single engine keeps the source open for the whole capture
+    engine = CaptureEngine(video_path, max_retries=max_retries, timer=timer, quality=quality, threads=decoder_threads)
     
+    # Get video information first to validate timestamps
+    logger.info("Checking video duration...")
     try:
-        # Process video based on mode
-        if mode == "download":
-            video_path, video_title, duration = get_youtube_stream_url(youtube_url)
-        else:  # stream mode
-            video_path, video_title, duration = get_streaming_url(youtube_url)
+        if not engine.open():
+            logger.error("Cannot open video file for initial check")
+            return []
         
-        if not video_path or not video_title:
-            print("Failed to process video URL.")
-            return
+        # For local files, we can rely on frame count * fps
+        if is_local_file and engine.fps > 0 and engine.frame_count > 0:
+            duration = engine.frame_count / engine.fps
+        else:
+            # For streams, try to use other methods to get duration
+            duration = engine.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if duration <= 0:
+                # If we get here, use the duration passed from yt_dlp
+                if len(timestamps) > 0 and max(timestamps) > 0:
+                    duration = max(timestamps) + 60  # Add a buffer
         
-        print(f"Video title: {video_title}")
-        print(f"Video duration: {timedelta(seconds=int(duration))}")
+        # Proceed with taking screenshots
+        logger.info(f"Starting screenshot capture of {total} timestamps...")
         
-        # Process timestamps
-        timestamps = []
-        if timestamp_type == "specific":
-            # Parse specific timestamps
-            if timestamp_input:
-                timestamp_strings = timestamp_input.split(',')
-                try:
-                    timestamps = [parse_timestamp(ts.strip()) for ts in timestamp_strings if ts.strip()]
-                    timestamps.sort()  # Ensure timestamps are in order
-                except ValueError as e:
-                    print(f"Error parsing timestamps: {e}")
-                    return
-            if not timestamps:
-                print("No valid timestamps provided.")
-                return
-        else:  # interval mode
-            timestamps = generate_interval_timestamps(duration, interval)
+        # Plan seeks against the container's keyframes when an index is available
+        index = KeyframeIndex.load_or_build(video_path) if use_keyframe_index else None
+        if index is not None:
+            planner = SeekPlanner(index, engine.fps, seek_cost_frames=seek_cost_frames)
+            planned = planner.plan([step[1] for step in steps], snap_tolerance=snap_tolerance if fast_mode else 0)
+            steps = [(step[0], timestamp, action) for step, (timestamp, action, _) in zip(steps, planned)]
+            logger.info(f"Planned {len(steps)} timestamps across {len(set(gop for _, _, gop in planned))} GOPs, "
+                        f"{[action for _, action, _ in planned].count('seek')} seek(s)")
+        elif fast_mode:
+            logger.info("No keyframe index available, capturing exact timestamps")
         
-        print(f"Processing {len(timestamps)} timestamps...")
+        # Snapped timestamps are only known after planning
+        if fast_mode:
+            steps = take_cached(steps)
+        restored = checkpoint.restored if checkpoint is not None else 0
+        if restored:
+            logger.info(f"{restored} of {total} screenshots restored from the checkpoint")
+        if cache is not None:
+            logger.info(f"{len(cached) - restored} of {total} screenshots served from the frame cache")
         
-        # Capture screenshots
-        screenshots_dir = "high_res_screenshots"
-        image_paths = capture_screenshots(video_path, timestamps, screenshots_dir)
+        if workers > 1 and len(steps) > 1:
+            # Balance contiguous segments by estimated decode cost rather than by count
+            costs = estimate_capture_costs([step[1] for step in steps], [step[2] for step in steps], engine.fps, index,
+                                           seek_cost_frames, engine.max_forward_gap)
+            segments = split_segments(steps, costs, workers, seek_cost_frames)
+            logger.info(f"Capturing in {len(segments)} parallel segment(s) of sizes {[len(s) for s in segments]}")
+            engine.release()
+            results = _capture_parallel(video_path, segments, output_dir, duration, max_retries, total, progress_callback,
+                                        quality=quality, cache=cache, video_key=video_key, done=len(cached), timer=timer,
+                                        control=control, decoder_threads=decoder_threads, on_record=on_record,
+                                        queue_size=sink.maxsize if sink is not None else 0)
+        elif steps:
+            progress = {'done': len(cached)}
+            
+            def on_step():
+                # Report progress if callback is provided
+                if progress_callback and callable(progress_callback):
+                    progress_callback(progress['done'], total)
+                progress['done'] += 1
+            
+            results = _capture_steps(engine, steps, output_dir, duration, max_retries, on_step=on_step, quality=quality,
+                                     cache=cache, video_key=video_key, control=control, on_record=on_record)
+            logger.info(f"Capture finished: {engine.opens} open(s), {engine.seeks} seek(s), {engine.grabs} forward grab(s)")
+        else:
+            results = []
+        if on_record is not None:
+            results = collected
         
-        if not image_paths:
-            print("No screenshots were captured.")
-            return
+        # Frames of a cancelled job are thrown away; a job out of time keeps them (see JobControl)
+        if control is not None and control.cancelled():
+            for record in results + cached:
+                record.discard()
+            raise JobCancelled(control.reason)
         
-        # Create PDF
-        pdf_path = create_pdf(image_paths, video_title, output_file)
+        # Report final progress
+        if progress_callback and callable(progress_callback):
+            progress_callback(total, total)
         
-        if pdf_path and os.path.exists(pdf_path):
-            print(f"\nPDF created successfully at: {pdf_path}")
-        else:
-            print("Failed to create PDF.")
+        metrics.inc('framecrafter_frames_total', decoded[0] if on_record is not None else len(results), source='decoded')
+        metrics.inc('framecrafter_frames_total', len(cached) - restored, source='cache')
+        metrics.inc('framecrafter_frames_total', restored, source='checkpoint')
+        if sink is not None:
+            return []
         
-        # Clean up
-        cleanup_temp_files(video_path)
+        # Merge results back in timestamp order
+        results.extend(cached)
+        results.sort(key=lambda record: record.timestamp)
+        return results
         
-        # Clean up screenshot directory
-        for img_path in image_paths:
-            if os.path.exists(img_path):
-                os.remove(img_path)
-                
+    except JobCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Error in capture_screenshots: {str(e)}")
+        return []
+    finally:
+        engine.release()
+
+# Function to clean up temporary files
+def cleanup_temp_files(video_path):
+    try:
+        if video_path and os.path.exists(video_path):
+            # If it's in our temp directory, delete it, with the directory of its download
+            temp_dir = Utils.get_temp_dir()
+            video_dir = os.path.dirname(os.path.abspath(video_path))
+            if video_dir == temp_dir:
+                os.remove(video_path)
+                logger.info(f"Deleted temporary video: {video_path}")
+            elif os.path.dirname(video_dir) == temp_dir and os.path.basename(video_dir).startswith("download_"):
+                shutil.rmtree(video_dir)
+                logger.info(f"Deleted temporary video: {video_path}")
+        
+        # Delete screenshot directory if it exists and is empty
+        screenshots_dir = os.path.join(os.getcwd(), "high_res_screenshots")
         if os.path.exists(screenshots_dir) and not os.listdir(screenshots_dir):
             os.rmdir(screenshots_dir)
-            
+            logger.info(f"Deleted empty screenshots directory: {screenshots_dir}")
     except Exception as e:
-        print(f"Error processing video: {str(e)}")
+        logger.error(f"Error cleaning up temporary files: {str(e)}")
+
+# ------------------------ ENTRY POINTS ------------------------
+
+# Names defined by the PDF, web and command line modules that stay importable from here
+MOVED_NAMES = {
+    'framecrafter_pdf': ('FramePDF', 'create_pdf', 'FramePipeline', 'capture_to_pdf'),
+    'framecrafter_web': ('app', 'job_store', 'scheduler', 'process_conversion', 'resume_interrupted_jobs'),
+    'framecrafter_cli': ('convert_video', 'run_manifest', 'cli_main'),
+}
+
+# Function to resolve a moved name on first use, importing its module (keeps framecrafter:app working)
+def __getattr__(name):
+    for module_name, names in MOVED_NAMES.items():
+        if name in names:
+            return getattr(importlib.import_module(module_name), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    # Ensure necessary directories exist
-    Utils.get_temp_dir()
-    pdf_dir = Utils.get_pdf_dir()
-    
-    # Clean up existing files in PDF directory
-    def cleanup_directories():
-        print("Running directory cleanup...")
-        # Clean PDF directory
-        for filename in os.listdir(pdf_dir):
-            if filename.endswith('.pdf'):
-                try:
-                    file_path = os.path.join(pdf_dir, filename)
-                    # Check if file is older than 1 hour
-                    if os.path.exists(file_path) and time.time() - os.path.getmtime(file_path) > 3600:
-                        os.remove(file_path)
-                        print(f"Cleaned up old PDF file: {filename}")
-                except Exception as e:
-                    print(f"Error removing file {filename}: {str(e)}")
-        
-        # Clean temp directory
-        temp_dir = Utils.get_temp_dir()
-        for filename in os.listdir(temp_dir):
-            try:
-                file_path = os.path.join(temp_dir, filename)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    print(f"Cleaned up temp file: {filename}")
-            except Exception as e:
-                print(f"Error removing temp file {filename}: {str(e)}")
-    
-    # Run initial cleanup
-    cleanup_directories()
-    
-    # Start periodic cleanup thread
-    def periodic_cleanup():
-        while True:
-            time.sleep(1800)  # Run every 30 minutes
-            cleanup_directories()
-    
-    cleanup_thread = threading.Thread(target=periodic_cleanup, daemon=True)
-    cleanup_thread.start()
-    
-    # Run the Flask app
-    app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    # Arguments run the command line tool, none start the web server. Both import this file
+    # again as the framecrafter module, which then holds all state.
+    if len(sys.argv) > 1:
+        import framecrafter_cli
+        framecrafter_cli.cli_main()
+    else:
+        import framecrafter_web
+        framecrafter_web.main()
@@ -0,0 +1,418 @@
+import os
+import csv
+import json
+import time
+import signal
+import shutil
+import hashlib
+import argparse
+import threading
+import uuid
+import collections
+import concurrent.futures
+from datetime import timedelta
+from framecrafter import (CHECKPOINTS, DEDUP_DISTANCE, DEFAULT_QUALITY, QUALITY_PROFILES, SCENE_THRESHOLD,
+                          SEGMENT_CONNECTIONS, STAGES, Checkpoint, JobControl, MetadataCache, StageTimer, Utils,
+                          capture_screenshots, cleanup_temp_files, configure_logging, dedupe_frames, detect_scenes,
+                          frame_cache, generate_interval_timestamps, get_local_video_info, get_segmented_video,
+                          get_streaming_url, get_youtube_stream_url, logger, parse_timestamp)
+
+# ------------------------ COMMAND LINE INTERFACE ------------------------
+
+# Function to run one command line conversion, returns the outcome with per-stage timings
+def convert_video(source, timestamp_type="interval", timestamps="", interval=30, output_file="", mode="stream",
+                  quality=DEFAULT_QUALITY, workers=1, spill_to_disk=False, use_cache=True, fast=False,
+                  scene_threshold=SCENE_THRESHOLD, dedupe=False, dedupe_distance=DEDUP_DISTANCE,
+                  screenshots_dir="high_res_screenshots", connections=SEGMENT_CONNECTIONS, control=None,
+                  decoder_threads=None, pipeline=False, resume=False):
+    # fpdf is imported by the first conversion, not by --help or a manifest with nothing left to do
+    from framecrafter_pdf import capture_to_pdf, create_pdf
+
+    result = {'source': source, 'output': None, 'frames': 0, 'pages_saved': 0, 'stages': {}, 'error': None}
+    stages = result['stages']
+    timer = StageTimer()
+    # Without a control (SIGINT, budgets) the conversion runs to the end
+    control = control if control is not None else JobControl()
+    video_path = None
+    frames = []
+    checkpoint = None
+    # Downloaded video goes in this run's own temp directory, removed when the run ends
+    run_dir = os.path.join(Utils.get_temp_dir(), f"cli_{uuid.uuid4().hex}")
+    try:
+        control.check()
+        
+        # The same source and settings share a checkpoint; resume picks it up, otherwise it starts over
+        if CHECKPOINTS:
+            checkpoint = Checkpoint(cli_checkpoint_name(source, output_file, timestamp_type, timestamps, interval, quality,
+                                                        fast, scene_threshold))
+            if checkpoint.exists() and not resume:
+                checkpoint.remove()
+                checkpoint = Checkpoint(checkpoint.name)
+            checkpoint.start()
+            if checkpoint.frames:
+                resumed_pdf = checkpoint.resumed_pdf()
+                print(f"Resuming: {len(checkpoint.frames)} screenshots were already captured"
+                      + (f", {resumed_pdf}" if resumed_pdf else ""))
+        
+        # Resolve the source: a local file, or a URL streamed, downloaded or fetched in segments
+        stage_started = time.time()
+        if os.path.isfile(source):
+            video_path, video_title, duration = get_local_video_info(source)
+        elif mode == "download":
+            video_path, video_title, duration = get_youtube_stream_url(source, control=control, output_dir=run_dir)
+        else:  # stream mode; segmented mode needs the timestamps first and starts from the stream too
+            video_path, video_title, duration = get_streaming_url(source)
+        stages['metadata'] = time.time() - stage_started
+        timer.add('extract', stages['metadata'])
+        control.check()
+        
+        if not video_path or not video_title:
+            raise ValueError("Failed to process video URL.")
+        control.check_source(duration)
+        
+        print(f"Video title: {video_title}")
+        print(f"Video duration: {timedelta(seconds=int(duration))}")
+        
+        # Process timestamps
+        if checkpoint is not None and checkpoint.timestamps is not None:
+            # A resumed run captures what it planned before, without detecting scenes again
+            timestamps = checkpoint.timestamps
+        elif timestamp_type == "specific":
+            # Parse specific timestamps, given as a comma-separated string or a list
+            timestamp_strings = timestamps.split(',') if isinstance(timestamps, str) else timestamps
+            timestamps = sorted(parse_timestamp(str(ts).strip()) for ts in timestamp_strings if str(ts).strip())
+            if not timestamps:
+                raise ValueError("No valid timestamps provided.")
+        elif timestamp_type == "scenes":
+            # Cheap low-resolution pass first; full-resolution frames are only grabbed at the detected changes
+            stage_started = time.time()
+            timestamps = detect_scenes(video_path, threshold=scene_threshold, control=control,
+                                       decoder_threads=decoder_threads)
+            stages['scenes'] = time.time() - stage_started
+            if not timestamps:
+                raise ValueError("No scenes detected.")
+        else:  # interval mode
+            timestamps = generate_interval_timestamps(duration, int(interval))
+        if checkpoint is not None and checkpoint.timestamps is None:
+            checkpoint.plan(timestamps)
+        
+        requested = len(timestamps)
+        timestamps = control.limit_frames(timestamps)
+        if len(timestamps) < requested:
+            print(f"Frame limit: capturing the first {len(timestamps)} of {requested} timestamps")
+        
+        # Fetch only the GOPs the timestamps need; scenes mode has already read the whole video
+        if mode == "segmented" and not os.path.isfile(source):
+            if timestamp_type == "scenes":
+                logger.info("Scenes mode analyses the whole video, streaming it instead of fetching segments")
+            else:
+                stage_started = time.time()
+                segmented_path = get_segmented_video(source, timestamps, connections=connections,
+                                                     snap_tolerance=1.0 if fast and timestamp_type == "interval" else 0.0,
+                                                     control=control, output_dir=run_dir)
+                stages['download'] = time.time() - stage_started
+                if segmented_path:
+                    video_path = segmented_path
+                else:
+                    logger.info("Falling back to streaming the video")
+        
+        print(f"Processing {len(timestamps)} timestamps...")
+        
+        capture_options = dict(spill_to_disk=spill_to_disk, fast_mode=fast and timestamp_type == "interval",
+                               workers=max(1, workers), quality=quality, cache=frame_cache if use_cache else None,
+                               decoder_threads=decoder_threads, checkpoint=checkpoint)
+        pdf_progress = checkpoint.pdf_progress if checkpoint is not None else None
+        if pipeline:
+            # Capture and PDF run together; their time is reported as one 'capture' stage
+            stage_started = time.time()
+            pipelined = capture_to_pdf(video_path, timestamps, video_title, output_file,
+                                       dedupe_distance=dedupe_distance if dedupe else None, pdf_progress=pdf_progress,
+                                       timer=timer, control=control, output_dir=screenshots_dir,
+                                       spill_dir=screenshots_dir, **capture_options)
+            stages['capture'] = time.time() - stage_started
+            pdf_path = pipelined['pdf']
+            captured, result['pages_saved'] = pipelined['frames'], pipelined['pages_saved']
+            result['frames'] = captured - result['pages_saved']
+        else:
+            # Capture screenshots
+            stage_started = time.time()
+            frames = capture_screenshots(video_path, timestamps, screenshots_dir, timer=timer, control=control,
+                                         **capture_options)
+            stages['capture'] = time.time() - stage_started
+            captured = len(frames)
+        
+        if not captured:
+            control.check()
+            raise ValueError("No screenshots were captured.")
+        if control.out_of_time() and captured < len(timestamps):
+            print(f"Time limit: stopped after {captured} of {len(timestamps)} screenshots")
+        
+        if not pipeline:
+            if dedupe:
+                stage_started = time.time()
+                frames, _, result['pages_saved'] = dedupe_frames(frames, max_distance=dedupe_distance)
+                stages['dedupe'] = time.time() - stage_started
+            result['frames'] = len(frames)
+            
+            # Create PDF
+            stage_started = time.time()
+            pdf_path = create_pdf(frames, video_title, output_file, progress_callback=pdf_progress, timer=timer,
+                                  control=control)
+            stages['pdf'] = time.time() - stage_started
+        if dedupe:
+            print(f"Pages saved by deduplication: {result['pages_saved']}")
+        
+        if not pdf_path or not os.path.exists(pdf_path):
+            raise ValueError("Failed to create PDF.")
+        result['output'] = pdf_path
+        result['size'] = os.path.getsize(pdf_path)
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        # A finished run drops its checkpoint; a failed or cancelled one keeps it for --resume
+        if checkpoint is not None:
+            if result['error'] is None:
+                checkpoint.remove()
+            elif checkpoint.frames:
+                result['checkpoint'] = checkpoint.path
+        # Clean up the downloaded video and any spilled screenshots
+        with timer.stage('cleanup'):
+            cleanup_temp_files(video_path)
+            shutil.rmtree(run_dir, ignore_errors=True)
+            for record in frames:
+                record.discard()
+            if os.path.exists(screenshots_dir) and not os.listdir(screenshots_dir):
+                os.rmdir(screenshots_dir)
+        # Fine-grained timings of the same run (open, seek, decode, encode, pdf_page, ...)
+        result['timings'] = timer.summary()
+    return result
+
+# Function to name the checkpoint of a CLI run after its source and the settings that decide its frames
+def cli_checkpoint_name(source, output_file, timestamp_type, timestamps, interval, quality, fast, scene_threshold):
+    identity = Utils.video_identity(source) if os.path.isfile(source) else MetadataCache.key(source)
+    settings = json.dumps([identity, output_file, timestamp_type, timestamps, int(interval), quality, bool(fast), float(scene_threshold)])
+    return f"cli_{hashlib.sha1(settings.encode('utf-8')).hexdigest()[:16]}"
+
+# Function to read a JSONL or CSV manifest into a list of entry dicts
+def read_manifest(manifest_path):
+    with open(manifest_path, newline='', encoding='utf-8') as f:
+        if manifest_path.lower().endswith('.csv'):
+            entries = list(csv.DictReader(f))
+        else:
+            entries = [json.loads(line) for line in f if line.strip() and not line.lstrip().startswith('#')]
+    # Empty CSV cells mean "use the command line default"
+    return [{key: value for key, value in entry.items() if value not in ('', None)} for entry in entries]
+
+# Function to run every manifest entry on a bounded pool and print an aggregate report
+def run_manifest(manifest_path, args, stop=None):
+    def flag(value):
+        return value if isinstance(value, bool) else str(value).strip().lower() in ('1', 'true', 'yes')
+    
+    entries = read_manifest(manifest_path)
+    print(f"Manifest {manifest_path}: {len(entries)} entries, {max(1, args.jobs)} at a time")
+    started = time.time()
+    results = []
+    skipped = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {}
+        for n, entry in enumerate(entries, 1):
+            source = entry.get('url') or entry.get('source') or entry.get('path')
+            output_file = entry.get('output', '')
+            if not source:
+                results.append({'source': f"entry {n}", 'frames': 0, 'stages': {}, 'error': "No url, source or path given"})
+                continue
+            # Re-running a manifest only converts what is missing
+            if output_file and os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+                print(f"Skipping {source}: {output_file} already exists")
+                skipped += 1
+                continue
+            future = executor.submit(
+                convert_video, source,
+                timestamp_type=entry.get('timestamp_type', args.timestamp_type),
+                timestamps=entry.get('timestamps', args.timestamps),
+                interval=int(entry.get('interval', args.interval)),
+                output_file=output_file,
+                mode=entry.get('mode', args.mode),
+                quality=entry.get('quality', args.quality),
+                workers=int(entry.get('workers', args.workers)),
+                spill_to_disk=flag(entry.get('spill_to_disk', args.spill_to_disk)),
+                use_cache=not args.no_cache,
+                fast=flag(entry.get('fast', args.fast)),
+                scene_threshold=float(entry.get('scene_threshold', args.scene_threshold)),
+                dedupe=flag(entry.get('dedupe', args.dedupe)),
+                dedupe_distance=int(entry.get('dedupe_distance', args.dedupe_distance)),
+                # Separate spill directories so concurrent entries never share screenshot files
+                screenshots_dir=os.path.join("high_res_screenshots", f"entry_{n}"),
+                connections=int(entry.get('connections', args.connections)),
+                decoder_threads=int(entry.get('decoder_threads', args.decoder_threads)) or None,
+                pipeline=flag(entry.get('pipeline', args.pipeline)),
+                resume=args.resume,
+                # Budgets apply per video; stop (SIGINT) cancels every entry, including those not started yet
+                control=JobControl(args.max_seconds, args.max_frames, args.max_source_duration, event=stop),
+            )
+            futures[future] = source
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            if result['error']:
+                print(f"[{done}/{len(futures)}] FAILED {result['source']}: {result['error']}"
+                      + (" (checkpointed, rerun with --resume)" if result.get('checkpoint') else ""))
+            else:
+                print(f"[{done}/{len(futures)}] {result['source']} -> {result['output']} ({result['frames']} frames)")
+    print_batch_report(results, skipped, time.time() - started)
+    if os.path.isdir("high_res_screenshots") and not os.listdir("high_res_screenshots"):
+        os.rmdir("high_res_screenshots")
+    return results
+
+# Function to print throughput, per-stage time and failures for a batch of conversions
+def print_batch_report(results, skipped, elapsed):
+    converted = [result for result in results if not result['error']]
+    failed = [result for result in results if result['error']]
+    frames = sum(result['frames'] for result in converted)
+    elapsed = max(elapsed, 1e-9)
+    stage_totals = collections.Counter()
+    timing_totals = collections.Counter()
+    for result in results:
+        stage_totals.update(result['stages'])
+        timing_totals.update({name: timing['seconds'] for name, timing in result.get('timings', {}).items()})
+    
+    print(f"\nBatch report")
+    print(f"============")
+    print(f"Videos: {len(converted)} converted, {skipped} skipped, {len(failed)} failed in {elapsed:.1f}s "
+          f"({len(converted) / elapsed:.3f} videos/s)")
+    print(f"Frames: {frames} ({frames / elapsed:.2f} frames/s), "
+          f"{sum(result.get('pages_saved', 0) for result in converted)} pages saved by deduplication")
+    print(f"Output: {sum(result.get('size', 0) for result in converted) / (1024 * 1024):.1f} MB")
+    if stage_totals:
+        # Stages of concurrent entries overlap, so these can add up to more than the wall time
+        print("Stage time (summed over videos):")
+        for stage in ('metadata', 'scenes', 'download', 'capture', 'dedupe', 'pdf'):
+            if stage in stage_totals:
+                print(f"  {stage:<10}{stage_totals[stage]:8.1f}s")
+    if timing_totals:
+        print("Operation time (summed over videos):")
+        for stage in STAGES:
+            if stage in timing_totals:
+                print(f"  {stage:<10}{timing_totals[stage]:8.1f}s")
+    if failed:
+        print("Failures:")
+        for result in failed:
+            print(f"  {result['source']}: {result['error']}")
+
+# Command line interface function
+def cli_main():
+    parser = argparse.ArgumentParser(description="YouTube Video to PDF Converter - Terminal Version")
+    parser.add_argument("--url", '-u', type=str, help="YouTube URL or local video file to process")
+    parser.add_argument("--manifest", type=str, default="",
+                        help="JSONL or CSV file of videos to convert (url, output and per-video timestamp settings)")
+    parser.add_argument("--jobs", '-j', type=int, default=2,
+                        help="With --manifest: number of videos converted at the same time (default: 2)")
+    parser.add_argument("--mode", '-m', type=str, choices=["stream", "download", "segmented"], default="stream",
+                        help="Processing mode: stream (default), download, or segmented (fetch only the video data the timestamps need)")
+    parser.add_argument("--timestamp-type", '-t', type=str, choices=["specific", "interval", "scenes"], default="interval",
+                        help="Timestamp type: specific (list of times), interval (regular intervals) or scenes (content changes)")
+    parser.add_argument("--timestamps", '-ts', type=str, default="",
+                        help="Comma-separated list of specific timestamps (e.g., '0:30,1:45,2:10')")
+    parser.add_argument("--interval", '-i', type=int, default=30,
+                        help="Interval in seconds between screenshots (default: 30)")
+    parser.add_argument("--scene-threshold", type=float, default=SCENE_THRESHOLD,
+                        help=f"Scenes mode only: change score between 0 and 1 that starts a new scene (default: {SCENE_THRESHOLD})")
+    parser.add_argument("--output", '-o', type=str, default="",
+                        help="Output PDF file path (default: auto-generate from video title)")
+    parser.add_argument("--workers", '-w', type=int, default=1,
+                        help="Number of capture processes (default: 1)")
+    parser.add_argument("--decoder-threads", type=int, default=0,
+                        help="Decoder threads per capture process (default: the CPUs shared evenly between workers)")
+    parser.add_argument("--connections", type=int, default=SEGMENT_CONNECTIONS,
+                        help=f"Segmented mode: concurrent HTTP connections (default: {SEGMENT_CONNECTIONS})")
+    parser.add_argument("--spill-to-disk", action="store_true",
+                        help="Write frames to disk during capture instead of keeping them in memory (very large jobs)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Write PDF pages while frames are still being captured instead of after capture")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run of the same command from its checkpoint")
+    parser.add_argument("--quality", '-q', type=str, choices=list(QUALITY_PROFILES), default=DEFAULT_QUALITY,
+                        help="Output quality profile: draft, screen or print (default: print)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or write the shared frame cache")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Drop screenshots that look the same as the one before them")
+    parser.add_argument("--dedupe-distance", type=int, default=DEDUP_DISTANCE,
+                        help=f"With --dedupe: max perceptual hash distance (0-64) to count as a duplicate (default: {DEDUP_DISTANCE})")
+    parser.add_argument("--fast", action="store_true",
+                        help="Interval mode only: capture the nearest keyframe (within 1s) instead of the exact time")
+    parser.add_argument("--max-seconds", type=float, default=0,
+                        help="Stop capturing after this many seconds per video and build the PDF from the frames taken (default: no limit)")
+    parser.add_argument("--max-frames", type=int, default=0,
+                        help="Capture at most this many screenshots per video, the earliest first (default: no limit)")
+    parser.add_argument("--max-source-duration", type=float, default=0,
+                        help="Refuse videos longer than this many seconds (default: no limit)")
+    parser.add_argument("--verbose", "-v", action="store_true",
+                        help="Log every captured frame and PDF page (sets FRAMECRAFTER_LOG_LEVEL to DEBUG)")
+    
+    args = parser.parse_args()
+    configure_logging(verbose=args.verbose, fmt="%(message)s")
+    
+    # The first Ctrl+C stops the conversion between units of work and cleans up; a second one aborts at once
+    stop = threading.Event()
+    
+    def interrupt(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        print("\nCancelling, press Ctrl+C again to abort immediately...")
+        stop.set()
+    
+    signal.signal(signal.SIGINT, interrupt)
+    
+    # Batch mode: every video in the manifest, converted in this one process
+    if args.manifest:
+        run_manifest(args.manifest, args, stop=stop)
+        return
+    
+    # If no URL is provided, prompt for it
+    youtube_url = args.url
+    if not youtube_url:
+        youtube_url = input("Enter YouTube URL: ")
+    
+    mode = args.mode
+    timestamp_type = args.timestamp_type
+    timestamp_input = args.timestamps
+    interval = args.interval
+    output_file = args.output
+    
+    print(f"\nYouTube to PDF Converter - Terminal Version")
+    print(f"=======================================\n")
+    print(f"Processing YouTube URL: {youtube_url}")
+    print(f"Mode: {mode}")
+    print(f"Timestamp type: {timestamp_type}")
+    
+    if timestamp_type == "specific":
+        if not timestamp_input:
+            timestamp_input = input("Enter comma-separated timestamps (e.g., 0:30,1:45,2:10): ")
+        print(f"Using specific timestamps: {timestamp_input}")
+    elif timestamp_type == "scenes":
+        print(f"Using scene changes (threshold {args.scene_threshold})")
+    else:
+        print(f"Using interval: {interval} seconds")
+    
+    if output_file:
+        print(f"Output file: {output_file}")
+    
+    started = time.time()
+    result = convert_video(youtube_url, timestamp_type, timestamp_input, interval, output_file, mode=mode,
+                           quality=args.quality, workers=args.workers, spill_to_disk=args.spill_to_disk,
+                           use_cache=not args.no_cache, fast=args.fast, scene_threshold=args.scene_threshold,
+                           dedupe=args.dedupe, dedupe_distance=args.dedupe_distance, connections=args.connections,
+                           decoder_threads=args.decoder_threads or None, pipeline=args.pipeline, resume=args.resume,
+                           control=JobControl(args.max_seconds, args.max_frames, args.max_source_duration, event=stop))
+    
+    if result['error']:
+        print(f"Error processing video: {result['error']}")
+        if result.get('checkpoint'):
+            print("Progress was checkpointed; run the same command with --resume to continue")
+        return
+    
+    print(f"\nPDF created successfully at: {result['output']}")
+    print(f"Size: {result['size'] / (1024 * 1024):.1f} MB, time: {time.time() - started:.1f}s, quality: {args.quality}")
+    print("Stages: " + ", ".join(f"{stage} {timing['seconds']:.2f}s ({timing['count']}x)"
+                                 for stage, timing in result['timings'].items()))
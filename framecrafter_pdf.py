@@ -0,0 +1,594 @@
+import os
+import time
+import uuid
+import zlib
+import queue
+import threading
+from datetime import timedelta
+from fpdf import FPDF
+from framecrafter import (PAGE_HEIGHT_MM, PAGE_WIDTH_MM, FrameRecord, JobCancelled, JobControl, StageTimer, Utils,
+                          capture_screenshots, iter_deduped, logger, metrics)
+
+# ------------------------ PDF GENERATION ------------------------
+
+# FPDF that embeds FrameRecords and can stream the document to disk page by page
+class FramePDF(FPDF):
+    """FPDF with in-memory frame records and a bounded-memory streaming output mode
+
+    After open_stream(), every finished page is written to the file together with the
+    images it introduced, and only the object offsets are kept in memory. Documents whose
+    page count is not known up front use total_cell() and move_to_front() (see create_pdf).
+    """
+
+    # Output paths currently being streamed, mapped to an Event set when they are complete
+    in_progress = {}
+    in_progress_lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stream = None
+        self.stream_path = None
+        self.stream_pos = 0
+        self.page_objects = []
+        # Pages from this index on are moved to the front of the document when it is closed
+        self.front_from = None
+        # (font index, size, color) of total_cell(); the count itself is written by close()
+        self.total_font = None
+
+    def frame_image(self, record, x, y, w, h):
+        """Place a FrameRecord on the current page"""
+        key = f"frame:{len(self.images) + 1}"
+        info = record.pdf_info()
+        info['i'] = len(self.images) + 1
+        self.images[key] = info
+        self.image(key, x=x, y=y, w=w, h=h)
+
+    def total_cell(self, h, txt):
+        """Write txt as a left-aligned cell followed by the final page count, not counting pages moved to the front"""
+        x = (self.x + self.c_margin + self.get_string_width(txt)) * self.k
+        y = (self.h - (self.y + 0.5 * h + 0.3 * self.font_size)) * self.k
+        self.cell(0, h, txt, 0, 0, "L")
+        # The count is a form drawn here and written once, after the last page
+        self.total_font = (self.current_font['i'], self.font_size_pt, self.text_color)
+        self._out('q 1 0 0 1 %.2f %.2f cm /Total Do Q' % (x, y))
+
+    def move_to_front(self):
+        """Show the pages added from now on before all earlier ones"""
+        # The current page is flushed by the next add_page(), so it still counts as an earlier page
+        self.front_from = len(self.page_objects) + (1 if self.state == 2 else 0)
+
+    def open_stream(self, path):
+        """Start writing the document to path; must be called before the first page"""
+        self.stream_path = os.path.abspath(path)
+        self.stream = open(self.stream_path, 'wb')
+        with FramePDF.in_progress_lock:
+            FramePDF.in_progress[self.stream_path] = threading.Event()
+        self._out('%PDF-' + self.pdf_version)
+
+    def abort_stream(self):
+        """Stop streaming after an error and remove the partial file"""
+        if self.stream is None:
+            return
+        self.stream.close()
+        self.stream = None
+        if os.path.exists(self.stream_path):
+            os.remove(self.stream_path)
+        self._finish_stream()
+
+    def _finish_stream(self):
+        with FramePDF.in_progress_lock:
+            done = FramePDF.in_progress.pop(self.stream_path, None)
+        if done is not None:
+            done.set()
+
+    def _out(self, s):
+        # Page content is still assembled in memory, everything else goes to the stream
+        if self.stream is None or self.state == 2:
+            return super()._out(s)
+        if isinstance(s, str):
+            s = s.encode('latin1')
+        elif not isinstance(s, bytes):
+            s = str(s).encode('latin1')
+        self.stream.write(s + b"\n")
+        self.stream_pos += len(s) + 1
+
+    def _newobj(self):
+        if self.stream is None:
+            return super()._newobj()
+        self.n += 1
+        self.offsets[self.n] = self.stream_pos
+        self._out(f'{self.n} 0 obj')
+
+    def _endpage(self):
+        super()._endpage()
+        if self.stream is not None:
+            self._flush_page(self.page)
+
+    def _flush_page(self, n):
+        # Page object first, so the first page keeps object number 3 for /OpenAction
+        self._newobj()
+        self.page_objects.append(self.n)
+        self._out('<</Type /Page')
+        self._out('/Parent 1 0 R')
+        if n in self.orientation_changes:
+            self._out('/MediaBox [0 0 %.2f %.2f]' % (self.fh_pt, self.fw_pt))
+        self._out('/Resources 2 0 R')
+        self._out(f'/Contents {self.n + 1} 0 R>>')
+        self._out('endobj')
+
+        content = self.pages[n].encode('latin1')
+        if self.compress:
+            content = zlib.compress(content)
+        self._newobj()
+        self._out('<<' + ('/Filter /FlateDecode ' if self.compress else '') + f'/Length {len(content)}>>')
+        self._putstream(content)
+        self._out('endobj')
+        self.pages[n] = ''
+
+        # Write images introduced on this page and drop their data
+        for info in self.images.values():
+            if 'data' in info:
+                self._putimage(info)
+                del info['data']
+        self.stream.flush()
+
+    def _putxobjectdict(self):
+        super()._putxobjectdict()
+        if self.total_font is not None:
+            self._out(f'/Total {self.total_object} 0 R')
+
+    def _putcatalog(self):
+        if not self.page_objects or self.page_objects[0] == 3:
+            return super()._putcatalog()
+        # /OpenAction names the first page, which is no longer object 3 once pages were moved
+        out = self._out
+        self._out = lambda s: out(s.replace('[3 0 R', f'[{self.page_objects[0]} 0 R'))
+        try:
+            super()._putcatalog()
+        finally:
+            del self._out
+
+    def _puttotal(self, total):
+        font_index, size, color = self.total_font
+        font = next(font['n'] for font in self.fonts.values() if font['i'] == font_index)
+        content = f'BT /F{font_index} {size:.2f} Tf {color} ({total}) Tj ET'.encode('latin1')
+        self._newobj()
+        self.total_object = self.n
+        self._out(f'<</Type /XObject /Subtype /Form /BBox [0 -100 1000 100] '
+                  f'/Resources <</Font <</F{font_index} {font} 0 R>>>> /Length {len(content)}>>')
+        self._putstream(content)
+        self._out('endobj')
+
+    def _enddoc(self):
+        if self.stream is None:
+            return super()._enddoc()
+        try:
+            self._putfonts()
+            if self.total_font is not None:
+                frame_pages = self.front_from if self.front_from is not None else len(self.page_objects)
+                self._puttotal(frame_pages)
+            if self.front_from is not None:
+                self.page_objects = self.page_objects[self.front_from:] + self.page_objects[:self.front_from]
+
+            # Resource dictionary shared by all pages
+            self.offsets[2] = self.stream_pos
+            self._out('2 0 obj')
+            self._out('<<')
+            self._putresourcedict()
+            self._out('>>')
+            self._out('endobj')
+
+            # Pages root
+            w_pt, h_pt = (self.fw_pt, self.fh_pt) if self.def_orientation == 'P' else (self.fh_pt, self.fw_pt)
+            self.offsets[1] = self.stream_pos
+            self._out('1 0 obj')
+            self._out('<</Type /Pages')
+            self._out('/Kids [' + ' '.join(f'{obj} 0 R' for obj in self.page_objects) + ']')
+            self._out(f'/Count {len(self.page_objects)}')
+            self._out('/MediaBox [0 0 %.2f %.2f]' % (w_pt, h_pt))
+            self._out('>>')
+            self._out('endobj')
+
+            self._newobj()
+            self._out('<<')
+            self._putinfo()
+            self._out('>>')
+            self._out('endobj')
+            self._newobj()
+            self._out('<<')
+            self._putcatalog()
+            self._out('>>')
+            self._out('endobj')
+
+            # Cross-reference table and trailer
+            xref = self.stream_pos
+            self._out('xref')
+            self._out(f'0 {self.n + 1}')
+            self._out('0000000000 65535 f ')
+            for i in range(1, self.n + 1):
+                self._out('%010d 00000 n ' % self.offsets[i])
+            self._out('trailer')
+            self._out('<<')
+            self._puttrailer()
+            self._out('>>')
+            self._out('startxref')
+            self._out(xref)
+            self._out('%%EOF')
+            self.state = 3
+            self.stream.close()
+            self.stream = None
+        finally:
+            self._finish_stream()
+
+# Function to add the cover page with the title, frame count and any notes
+def _add_cover_pages(pdf, safe_title, timestamps, timestamp_notes=None):
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 18)
+    pdf.set_text_color(50, 50, 50)
+    pdf.set_xy(10, 10)
+    pdf.cell(0, 15, "YouTube Video Screenshots", 0, 1, "C")
+    
+    pdf.set_font("Arial", "", 12)
+    pdf.set_text_color(80, 80, 80)
+    pdf.set_xy(10, 30)
+    pdf.multi_cell(0, 8, f"Title: {safe_title}\nGenerated: {time.strftime('%Y-%m-%d %H:%M:%S')}\nNumber of screenshots: {len(timestamps)}", 0, "L")
+    
+    # Add notes section if there are any notes
+    if timestamp_notes and any(note.strip() for note in timestamp_notes.values()):
+        pdf.set_xy(10, 60)
+        pdf.set_font("Arial", "B", 14)
+        pdf.set_text_color(50, 50, 50)
+        pdf.cell(0, 10, "Notes:", 0, 1, "L")
+        
+        y_position = 75
+        for timestamp in timestamps:
+            timestamp_seconds = int(timestamp)
+            formatted_time = str(timedelta(seconds=timestamp_seconds))
+            
+            # Check if there's a note for this timestamp
+            note = ""
+            if timestamp_notes and str(timestamp_seconds) in timestamp_notes:
+                note = timestamp_notes[str(timestamp_seconds)]
+            
+            if note and note.strip():
+                pdf.set_xy(10, y_position)
+                pdf.set_font("Arial", "B", 11)
+                pdf.set_text_color(80, 80, 80)
+                pdf.cell(0, 6, f"Timestamp {formatted_time}:", 0, 1, "L")
+                
+                pdf.set_xy(20, y_position + 6)
+                pdf.set_font("Arial", "", 10)
+                pdf.set_text_color(100, 100, 100)
+                pdf.multi_cell(170, 6, note.strip(), 0, "L")
+                
+                y_position += 20  # Move down for next note
+                
+                # Add a new page if we're running out of space
+                if y_position > 270:
+                    pdf.add_page()
+                    y_position = 20
+
+# Function to add one frame as a full page; total None leaves the page count to the end of the document
+def _add_frame_page(pdf, record, number, total, quality=None):
+    # Add a new page for each image
+    pdf.add_page()
+    
+    # Timestamp for the small timestamp overlay
+    timestamp_seconds = int(record.timestamp)
+    formatted_time = str(timedelta(seconds=timestamp_seconds))
+    
+    # Frames captured for another profile are resized and re-encoded once here
+    if quality:
+        record = record.transcode(quality)
+    
+    # Image dimensions travel with the record, no decode needed
+    img_w, img_h = record.width, record.height
+    
+    # Calculate dimensions to fit the entire page
+    page_w = PAGE_WIDTH_MM  # A4 width in mm
+    page_h = PAGE_HEIGHT_MM  # A4 height in mm
+    
+    # Calculate scaling factor to fit the page while preserving aspect ratio
+    scale_w = page_w / img_w
+    scale_h = page_h / img_h
+    scale = min(scale_w, scale_h)  # Use min to ensure the full image is visible without cropping
+    
+    new_w = img_w * scale
+    new_h = img_h * scale
+    
+    # Center the image on the page
+    x_pos = (page_w - new_w) / 2
+    y_pos = (page_h - new_h) / 2
+    
+    # Fill page with black background (to ensure no white margins around images)
+    pdf.set_fill_color(0, 0, 0)
+    pdf.rect(0, 0, page_w, page_h, 'F')
+    
+    # Add image to PDF as full page background
+    pdf.frame_image(record, x=x_pos, y=y_pos, w=new_w, h=new_h)
+    
+    # Add a small, dark timestamp overlay
+    pdf.set_xy(5, 5)
+    pdf.set_font("Arial", "B", 10)
+    pdf.set_text_color(255, 255, 255)  # White text
+    
+    # Draw a small dark background for the timestamp
+    pdf.set_fill_color(0, 0, 0)
+    pdf.rect(5, 5, 50, 8, style='F')  # 'F' means filled rectangle
+    
+    # Add the timestamp text
+    pdf.set_xy(7, 6)
+    pdf.cell(0, 6, f"Time: {formatted_time}", 0, 0, "L")
+    
+    # Add page number at the bottom
+    pdf.set_xy(5, 287)
+    pdf.set_font("Arial", "I", 8)
+    
+    # Draw a small dark background for the page number
+    pdf.set_fill_color(0, 0, 0)
+    pdf.rect(5, 287, 30, 8, style='F')
+    
+    # Add the page number
+    pdf.set_xy(7, 288)
+    pdf.set_text_color(255, 255, 255)  # White text
+    if total is None:
+        pdf.total_cell(6, f"Page {number}/")
+    else:
+        pdf.cell(0, 6, f"Page {number}/{total}", 0, 0, "L")
+
+# Function to create a PDF from the screenshots (FrameRecords or screenshot file paths)
+# quality re-encodes frames that were not captured for that profile; None embeds them as they are
+# progress_callback(pages_done, total) is called after every page
+# A list is sorted and laid out as a whole. Any other iterable (a FramePipeline) is streamed: frames must arrive
+# in timestamp order and are discarded once their page is written, total is only the expected count for progress,
+# and the cover goes last in the file but first in the document, so it sees the final count and notes
+def create_pdf(image_paths, video_title="YouTube Video", output_pdf="screenshots.pdf", timestamp_notes=None, quality=None,
+               progress_callback=None, timer=None, control=None, total=None):
+    streamed = not isinstance(image_paths, (list, tuple))
+    if not streamed and not image_paths:
+        logger.warning("No images to add to PDF")
+        return None
+    timer = timer if timer is not None else StageTimer()
+    
+    # Accept screenshot files from older callers as well as in-memory records
+    frames = image_paths
+    if not streamed:
+        frames = [FrameRecord.from_file(item) if isinstance(item, str) else item for item in image_paths]
+        total = len(frames)
+        
+    # Use original title if possible, but ensure it's sanitized for PDF
+    safe_title = Utils.sanitize_title(video_title)
+    logger.info(f"Creating PDF with title: {safe_title}")
+    
+    # If not specified, create a default output filename in PDF directory
+    if not output_pdf or output_pdf == "screenshots.pdf":
+        pdf_dir = Utils.get_pdf_dir()
+        output_pdf = os.path.join(pdf_dir, f"{Utils.sanitize_filename(video_title)}.pdf")
+    
+    pdf = None
+    try:    
+        # Initialize PDF object, streaming pages to output_pdf as they are finished
+        pdf = FramePDF(orientation='P', unit='mm', format='A4')
+        pdf.open_stream(output_pdf)
+        # Set minimal margins
+        pdf.set_margins(0, 0, 0)
+        pdf.set_auto_page_break(False)
+        
+        # Add metadata
+        pdf.set_title(safe_title)
+        pdf.set_author("YouTube Screenshot PDF Generator")
+        pdf.set_creator("https://github.com/example/youtube-screenshot-pdf")
+        
+        if streamed:
+            timestamps = []
+        else:
+            # Sort the frames by timestamp and add a cover page with all notes
+            frames.sort(key=lambda record: record.timestamp)
+            timestamps = [record.timestamp for record in frames]
+            _add_cover_pages(pdf, safe_title, timestamps, timestamp_notes)
+        
+        # Add screenshots as full pages
+        pages = 0
+        for item in frames:
+            # Only cancellation stops the writer; a job out of time still gets a PDF of what it captured
+            if control is not None and control.cancelled():
+                raise JobCancelled(control.reason)
+            page_started = time.perf_counter()
+            pages += 1
+            record = FrameRecord.from_file(item) if isinstance(item, str) else item
+            _add_frame_page(pdf, record, pages, None if streamed else total, quality)
+            if streamed:
+                # The page holds the image bytes until it is flushed; screenshot files are left alone
+                timestamps.append(record.timestamp)
+                if record is item:
+                    record.discard()
+            
+            # The previous page is flushed to the stream by add_page(), so page time includes writing it
+            timer.add('pdf_page', time.perf_counter() - page_started)
+            logger.debug(f"Added image {pages}/{total or '?'} to PDF")
+            if progress_callback and callable(progress_callback):
+                progress_callback(pages, max(total or 0, pages))
+        
+        if streamed:
+            if not pages:
+                logger.warning("No images to add to PDF")
+                pdf.abort_stream()
+                return None
+            pdf.move_to_front()
+            _add_cover_pages(pdf, safe_title, timestamps, timestamp_notes)
+        
+        # Finish the PDF (fonts, page tree and xref)
+        with timer.stage('pdf_write'):
+            pdf.close()
+        metrics.inc('framecrafter_pages_total', pages)
+        logger.info(f"PDF created successfully: {output_pdf}")
+        return output_pdf
+        
+    except JobCancelled:
+        # The partial PDF is removed before the job reports cancelled
+        if pdf is not None:
+            pdf.abort_stream()
+        raise
+    except Exception as e:
+        logger.error(f"Error creating PDF: {str(e)}")
+        if pdf is not None:
+            pdf.abort_stream()
+        return None
+
+# ------------------------ CAPTURE TO PDF PIPELINE ------------------------
+
+# Frame records a pipelined job holds between capture and the PDF writer before capture waits
+PIPELINE_QUEUE_SIZE = int(os.environ.get('FRAMECRAFTER_PIPELINE_QUEUE', '16'))
+
+# Bounded, ordered hand-off of frame records from capture to the PDF writer
+class FramePipeline:
+    """Frame records passed from a capture thread to a consumer in timestamp order
+
+    Capture calls put(position, record) once per planned frame, with None for frames that
+    failed, and waits while maxsize records are queued. Iterating yields the records by
+    position; records that arrive early wait in a reorder buffer, and beyond maxsize of
+    them are spilled to spill_dir, so memory stays flat however long the video is.
+    """
+
+    def __init__(self, maxsize=PIPELINE_QUEUE_SIZE, spill_dir=None):
+        self.maxsize = max(1, maxsize)
+        self.queue = queue.Queue(self.maxsize)
+        self.spill_dir = spill_dir or Utils.get_temp_dir()
+        self.token = uuid.uuid4().hex[:8]
+        self.pending = {}  # position -> record that arrived ahead of its turn
+        self.abandoned = threading.Event()
+        self.finished = False
+        self.frames = 0
+        self.cached = 0
+        self.spilled = 0
+
+    def _put(self, item):
+        # Polls so a consumer that went away never leaves capture blocked
+        while not self.abandoned.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            if self.abandoned.is_set():
+                # The consumer went away as this went in and may have emptied the queue already
+                self._drain()
+                return False
+            return True
+        return False
+
+    def _drain(self):
+        records = []
+        while True:
+            try:
+                records.append(self.queue.get_nowait()[1])
+            except queue.Empty:
+                break
+        for record in records:
+            if isinstance(record, FrameRecord):
+                record.discard()
+
+    def put(self, position, record):
+        """Hand a record to the consumer; returns False, discarding the record, once the consumer is gone"""
+        if self._put((position, record)):
+            return True
+        if record is not None:
+            record.discard()
+        return False
+
+    def close(self, error=None):
+        """Mark the end of capture; the consumer raises error, if given, when it gets there"""
+        self._put((None, error))
+
+    def abandon(self):
+        """Called by the consumer when it stops: discard every record it has not taken"""
+        self.abandoned.set()
+        for record in self.pending.values():
+            if record is not None:
+                record.discard()
+        self.pending.clear()
+        self._drain()
+
+    def _hold(self, position, record):
+        # Early arrivals beyond maxsize wait on disk (frames spilled by capture already are)
+        if len(self.pending) >= self.maxsize and record.data is not None:
+            extension = 'jpg' if record.encoding == 'jpeg' else 'png'
+            Utils.ensure_dir(self.spill_dir)
+            record.spill(os.path.join(self.spill_dir, f"pipeline_{self.token}_{position:05d}.{extension}"))
+            self.spilled += 1
+        self.pending[position] = record
+
+    def __iter__(self):
+        position = 0
+        while True:
+            if position in self.pending:
+                record = self.pending.pop(position)
+                position += 1
+                if record is not None:
+                    yield record
+                continue
+            arrived, record = self.queue.get()
+            if arrived is None:
+                self.finished = True
+                if record is not None:
+                    raise record
+                # Frames after a stop never arrive; what did arrive is still yielded in order
+                for key in sorted(self.pending):
+                    record = self.pending.pop(key)
+                    if record is not None:
+                        yield record
+                return
+            if record is not None:
+                self.frames += 1
+                self.cached += record.cached
+            if arrived == position:
+                self.pending[arrived] = record
+            elif record is not None:
+                self._hold(arrived, record)
+            else:
+                self.pending[arrived] = None
+
+# Function to capture frames and write the PDF at the same time, joined by a FramePipeline
+# Capture runs on a thread while this one writes pages as frames arrive, so the job takes about as long as the
+# slower of the two rather than their sum. capture_options go to capture_screenshots; near-duplicates are dropped
+# on the way when dedupe_distance is set. Returns a dict with the PDF path (None if no page was written),
+# frames captured, frames from the cache and duplicate pages dropped. Out-of-order frames wait in spill_dir
+def capture_to_pdf(video_path, timestamps, video_title="YouTube Video", output_pdf="screenshots.pdf", timestamp_notes=None,
+                   dedupe_distance=None, pdf_progress=None, timer=None, control=None, queue_size=PIPELINE_QUEUE_SIZE,
+                   spill_dir=None, **capture_options):
+    timer = timer if timer is not None else StageTimer()
+    notes = dict(timestamp_notes or {})
+    pipeline = FramePipeline(queue_size, spill_dir)
+    # Capture has its own control so a failed writer can stop it without cancelling the job
+    capture_control = JobControl(parent=control)
+    stats = {'dropped': 0}
+    
+    def produce():
+        error = None
+        try:
+            capture_screenshots(video_path, timestamps, timer=timer, control=capture_control, sink=pipeline,
+                                **capture_options)
+        except BaseException as e:
+            error = e
+        finally:
+            pipeline.close(error)
+    
+    producer = threading.Thread(target=produce, name='capture', daemon=True)
+    producer.start()
+    try:
+        frames = iter(pipeline)
+        if dedupe_distance is not None:
+            frames = iter_deduped(frames, notes, dedupe_distance, stats)
+        pdf_path = create_pdf(frames, video_title=video_title, output_pdf=output_pdf, timestamp_notes=notes,
+                              progress_callback=pdf_progress, timer=timer, control=control, total=len(timestamps))
+    finally:
+        if not pipeline.finished:
+            capture_control.cancel("PDF writer stopped")
+        pipeline.abandon()
+        producer.join()
+    
+    if stats['dropped']:
+        logger.info(f"Dropped {stats['dropped']} near-duplicate frames (Hamming distance <= {dedupe_distance})")
+    if pipeline.spilled:
+        logger.info(f"{pipeline.spilled} out-of-order frames waited on disk")
+    return {'pdf': pdf_path, 'frames': pipeline.frames, 'cached_frames': pipeline.cached,
+            'pages_saved': stats['dropped']}
@@ -0,0 +1,1799 @@
+import os
+import time
+import json
+import math
+import heapq
+import uuid
+import hashlib
+import functools
+import shutil
+import sqlite3
+import threading
+import contextlib
+import collections
+from flask import Flask, Response, render_template, request, jsonify, url_for, send_from_directory
+from flask_cors import CORS
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.wsgi import ClosingIterator
+from framecrafter import (CHECKPOINTS, DEDUP_DISTANCE, DEFAULT_QUALITY, JOB_MAX_FRAMES, JOB_MAX_SECONDS,
+                          JOB_MAX_SOURCE_SECONDS, QUALITY_PROFILES, SCENE_THRESHOLD, BudgetExceeded, Checkpoint,
+                          JobCancelled, JobControl, JobProgress, MetadataCache, ProgressModel, StageTimer, Utils,
+                          capture_screenshots, configure_logging, dedupe_frames, detect_scenes, frame_cache,
+                          generate_interval_timestamps, get_streaming_url, logger, metadata_cache, metrics,
+                          parse_timestamp, progress_model)
+from framecrafter_pdf import FramePDF, capture_to_pdf, create_pdf
+
+# ------------------------ JOB STORE ------------------------
+
+# States a job never leaves once it reaches them
+TERMINAL_JOB_STATES = ('completed', 'error', 'cancelled')
+
+# Interface shared by the job store backends
+class JobStore:
+    """Job records keyed by job ID, each a dict of fields including 'status'
+
+    update() and transition() return False when the job does not exist (or has expired);
+    transition() also returns False when the job is not in one of from_states, so two
+    writers can never both move a job out of the same state. Records expire ttl seconds
+    after their last write (FRAMECRAFTER_JOB_TTL, default one day).
+
+    Every write made through this instance bumps version and wakes wait_for_change();
+    writes from other processes are only seen by re-reading.
+
+    attach() creates a job under a request key unless a live job already holds that key,
+    in which case the request subscribes to it instead (see conversion_key()). cancel()
+    unsubscribes one of them and moves the job to 'cancelled' once nobody is left.
+    """
+
+    def __init__(self, ttl=None, clock=time.time):
+        self.ttl = ttl if ttl is not None else float(os.environ.get('FRAMECRAFTER_JOB_TTL', 86400))
+        self.clock = clock
+        self.expired = 0
+        self.last_expiry = 0.0
+        self.version = 0
+        self.changed = threading.Condition()
+        self.created = 0
+        self.attached = 0
+
+    def _notify(self):
+        with self.changed:
+            self.version += 1
+            self.changed.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        """Block until a write newer than version is made in this process or timeout passes"""
+        with self.changed:
+            if self.version == version:
+                self.changed.wait(timeout)
+            return self.version
+
+    def create(self, job_id, **fields):
+        raise NotImplementedError
+
+    def attach(self, key, job_id, reuse_window, **fields):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def update(self, job_id, batch=False, **fields):
+        raise NotImplementedError
+
+    def transition(self, job_id, from_states, to_state, **fields):
+        raise NotImplementedError
+
+    def cancel(self, job_id):
+        """Drop one subscriber, cancelling the job when it was the last; returns (status, subscribers) or None"""
+        raise NotImplementedError
+
+    def count_download(self, job_id):
+        """Count one finished download of the job's PDF; returns the updated record or None"""
+        raise NotImplementedError
+
+    def delete(self, job_id):
+        raise NotImplementedError
+
+    def expire(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def _cancel_record(record):
+        # Finished jobs are left alone; a job other requests still wait for only loses one subscriber
+        if record.get('status') in TERMINAL_JOB_STATES:
+            return False
+        record['subscribers'] = record.get('subscribers', 1) - 1
+        if record['subscribers'] <= 0:
+            record.update(status='cancelled', message='Conversion cancelled', subscribers=0)
+        return True
+
+    @staticmethod
+    def _reusable(record, updated_at, reuse_window, now):
+        # In-flight jobs always qualify; finished ones only while recent and their PDF is still on disk
+        if record.get('status') in ('error', 'cancelled'):
+            return False
+        if record.get('status') == 'completed':
+            pdf_path = record.get('pdf_path')
+            return now - updated_at <= reuse_window and bool(pdf_path) and os.path.exists(pdf_path)
+        return True
+
+    def _dedup_stats(self):
+        requests = self.created + self.attached
+        return {'created': self.created, 'attached': self.attached,
+                'dedup_ratio': round(self.attached / requests, 3) if requests else 0.0}
+
+    def _maybe_expire(self):
+        # Sweep expired records at most once a minute, piggybacked on job creation
+        now = self.clock()
+        if now - self.last_expiry >= 60:
+            self.last_expiry = now
+            self.expire()
+
+# Jobs held in this process only; used by the CLI and single-process deployments
+class MemoryJobStore(JobStore):
+    """Dict-backed job store guarded by a lock"""
+
+    def __init__(self, ttl=None, clock=time.time):
+        super().__init__(ttl, clock)
+        self.records = {}  # job_id -> fields
+        self.expires_at = {}
+        self.updated_at = {}
+        self.keys = {}  # request key -> job_id
+        self.lock = threading.Lock()
+
+    def create(self, job_id, **fields):
+        self._maybe_expire()
+        with self.lock:
+            self.records[job_id] = dict(fields)
+            self.updated_at[job_id] = self.clock()
+            self.expires_at[job_id] = self.clock() + self.ttl
+        self._notify()
+
+    def attach(self, key, job_id, reuse_window, **fields):
+        self._maybe_expire()
+        now = self.clock()
+        with self.lock:
+            existing = self.keys.get(key)
+            record = self.records.get(existing)
+            if (record is not None and self.expires_at[existing] > now
+                    and self._reusable(record, self.updated_at[existing], reuse_window, now)):
+                record['subscribers'] = record.get('subscribers', 1) + 1
+                self.attached += 1
+                attached = existing
+            else:
+                self.keys[key] = job_id
+                self.records[job_id] = dict(fields, job_key=key, subscribers=1)
+                self.updated_at[job_id] = now
+                self.expires_at[job_id] = now + self.ttl
+                self.created += 1
+                attached = None
+        self._notify()
+        return (attached, True) if attached else (job_id, False)
+
+    def get(self, job_id):
+        with self.lock:
+            if job_id not in self.records or self.expires_at[job_id] <= self.clock():
+                return None
+            return dict(self.records[job_id])
+
+    def update(self, job_id, batch=False, **fields):
+        return self.transition(job_id, None, None, **fields)
+
+    def transition(self, job_id, from_states, to_state, **fields):
+        with self.lock:
+            record = self.records.get(job_id)
+            if record is None or self.expires_at[job_id] <= self.clock():
+                return False
+            if from_states is not None and record.get('status') not in from_states:
+                return False
+            record.update(fields)
+            if to_state is not None:
+                record['status'] = to_state
+            self.updated_at[job_id] = self.clock()
+            self.expires_at[job_id] = self.clock() + self.ttl
+        self._notify()
+        return True
+
+    def cancel(self, job_id):
+        with self.lock:
+            record = self.records.get(job_id)
+            if record is None or self.expires_at[job_id] <= self.clock():
+                return None
+            changed = self._cancel_record(record)
+            if changed:
+                self.updated_at[job_id] = self.clock()
+            result = (record['status'], record.get('subscribers', 1))
+        if changed:
+            self._notify()
+        return result
+
+    def count_download(self, job_id):
+        with self.lock:
+            record = self.records.get(job_id)
+            if record is None or self.expires_at[job_id] <= self.clock():
+                return None
+            record['downloads'] = record.get('downloads', 0) + 1
+            result = dict(record)
+        self._notify()
+        return result
+
+    def delete(self, job_id):
+        with self.lock:
+            record = self.records.pop(job_id, None)
+            self.expires_at.pop(job_id, None)
+            self.updated_at.pop(job_id, None)
+            if record is not None and self.keys.get(record.get('job_key')) == job_id:
+                del self.keys[record['job_key']]
+        self._notify()
+
+    def expire(self):
+        now = self.clock()
+        with self.lock:
+            stale = [job_id for job_id, expires_at in self.expires_at.items() if expires_at <= now]
+            for job_id in stale:
+                del self.records[job_id]
+                del self.expires_at[job_id]
+                del self.updated_at[job_id]
+            self.keys = {key: job_id for key, job_id in self.keys.items() if job_id in self.records}
+            self.expired += len(stale)
+        return len(stale)
+
+    def stats(self):
+        with self.lock:
+            subscribers = sum(record.get('subscribers', 1) for record in self.records.values())
+            return dict(self._dedup_stats(), backend='memory', jobs=len(self.records), subscribers=subscribers,
+                        expired=self.expired)
+
+# Jobs in an SQLite database shared by every server process on the host
+class SQLiteJobStore(JobStore):
+    """SQLite job store in WAL mode, so readers in other processes never block the writer
+
+    Updates made with batch=True (progress ticks) are buffered per job and written at most
+    once every flush_interval seconds. Any unbatched write or transition for the job writes
+    the buffered fields first, and get() in this process always sees them.
+    """
+
+    def __init__(self, path=None, ttl=None, flush_interval=0.5, clock=time.time):
+        super().__init__(ttl, clock)
+        self.path = path or os.environ.get('FRAMECRAFTER_JOB_DB') or os.path.join(os.getcwd(), "jobs.db")
+        self.flush_interval = flush_interval
+        self.local = threading.local()
+        self.pending = {}  # job_id -> buffered fields not yet written
+        self.flushed_at = {}
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.batched = 0
+
+    def _connect(self):
+        # One connection per thread, reopened in a forked child (e.g. WSGI workers)
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            Utils.ensure_dir(directory)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                         'job_id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL, '
+                         'updated_at REAL NOT NULL, expires_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS job_keys (key TEXT PRIMARY KEY, job_id TEXT NOT NULL)')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front so read-modify-write is atomic across processes
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def create(self, job_id, **fields):
+        self._maybe_expire()
+        now = self.clock()
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO jobs (job_id, status, data, updated_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                         (job_id, fields.get('status', 'queued'), json.dumps(fields), now, now + self.ttl))
+        with self.lock:
+            self.pending.pop(job_id, None)
+            self.flushed_at[job_id] = now
+            self.writes += 1
+        self._notify()
+
+    def attach(self, key, job_id, reuse_window, **fields):
+        self._maybe_expire()
+        now = self.clock()
+        # Lookup and insert share one write transaction, so concurrent identical requests from any process end up on one job
+        with self._transaction() as conn:
+            row = conn.execute('SELECT jobs.job_id, jobs.data, jobs.updated_at, jobs.expires_at FROM job_keys '
+                               'JOIN jobs ON jobs.job_id = job_keys.job_id WHERE job_keys.key = ?', (key,)).fetchone()
+            if row is not None and row[3] > now and self._reusable(json.loads(row[1]), row[2], reuse_window, now):
+                record = json.loads(row[1])
+                record['subscribers'] = record.get('subscribers', 1) + 1
+                conn.execute('UPDATE jobs SET data = ? WHERE job_id = ?', (json.dumps(record), row[0]))
+                attached = row[0]
+            else:
+                record = dict(fields, job_key=key, subscribers=1)
+                conn.execute('INSERT OR REPLACE INTO jobs (job_id, status, data, updated_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                             (job_id, record.get('status', 'queued'), json.dumps(record), now, now + self.ttl))
+                conn.execute('INSERT OR REPLACE INTO job_keys (key, job_id) VALUES (?, ?)', (key, job_id))
+                attached = None
+        with self.lock:
+            self.writes += 1
+            if attached:
+                self.attached += 1
+            else:
+                self.created += 1
+                self.flushed_at[job_id] = now
+        self._notify()
+        return (attached, True) if attached else (job_id, False)
+
+    def get(self, job_id):
+        row = self._connect().execute('SELECT data, expires_at FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None or row[1] <= self.clock():
+            return None
+        record = json.loads(row[0])
+        with self.lock:
+            record.update(self.pending.get(job_id, {}))
+        return record
+
+    def update(self, job_id, batch=False, **fields):
+        if batch:
+            with self.lock:
+                self.pending.setdefault(job_id, {}).update(fields)
+                buffered = self.clock() - self.flushed_at.get(job_id, 0.0) < self.flush_interval
+                if buffered:
+                    self.batched += 1
+            if buffered:
+                # Local readers see buffered fields straight away
+                self._notify()
+                return True
+            fields = {}
+        return self.transition(job_id, None, None, **fields)
+
+    def transition(self, job_id, from_states, to_state, **fields):
+        with self.lock:
+            buffered = self.pending.pop(job_id, {})
+            self.flushed_at[job_id] = self.clock()
+        changes = dict(buffered, **fields)
+        now = self.clock()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT status, data, expires_at FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None or row[2] <= now:
+                return False
+            if from_states is not None and row[0] not in from_states:
+                # The buffered progress still belongs to the job; fields buffered since then are newer
+                if buffered:
+                    with self.lock:
+                        self.pending[job_id] = dict(buffered, **self.pending.get(job_id, {}))
+                return False
+            record = json.loads(row[1])
+            record.update(changes)
+            if to_state is not None:
+                record['status'] = to_state
+            conn.execute('UPDATE jobs SET status = ?, data = ?, updated_at = ?, expires_at = ? WHERE job_id = ?',
+                         (record['status'], json.dumps(record), now, now + self.ttl, job_id))
+        with self.lock:
+            self.writes += 1
+        self._notify()
+        return True
+
+    def cancel(self, job_id):
+        now = self.clock()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data, expires_at FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            record = json.loads(row[0])
+            changed = self._cancel_record(record)
+            if changed:
+                conn.execute('UPDATE jobs SET status = ?, data = ?, updated_at = ? WHERE job_id = ?',
+                             (record['status'], json.dumps(record), now, job_id))
+        if changed:
+            with self.lock:
+                self.writes += 1
+            self._notify()
+        return record['status'], record.get('subscribers', 1)
+
+    def count_download(self, job_id):
+        now = self.clock()
+        # Read-modify-write in one transaction, so downloads finishing in several processes are all counted
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data, expires_at FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            record = json.loads(row[0])
+            record['downloads'] = record.get('downloads', 0) + 1
+            conn.execute('UPDATE jobs SET data = ? WHERE job_id = ?', (json.dumps(record), job_id))
+        with self.lock:
+            self.writes += 1
+            record.update(self.pending.get(job_id, {}))
+        self._notify()
+        return record
+
+    def delete(self, job_id):
+        with self.lock:
+            self.pending.pop(job_id, None)
+            self.flushed_at.pop(job_id, None)
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+            conn.execute('DELETE FROM job_keys WHERE job_id = ?', (job_id,))
+        self._notify()
+
+    def expire(self):
+        with self._transaction() as conn:
+            removed = conn.execute('DELETE FROM jobs WHERE expires_at <= ?', (self.clock(),)).rowcount
+            conn.execute('DELETE FROM job_keys WHERE job_id NOT IN (SELECT job_id FROM jobs)')
+        with self.lock:
+            live = set(self.pending) | set(self.flushed_at)
+        for job_id in live:
+            if self.get(job_id) is None:
+                with self.lock:
+                    self.pending.pop(job_id, None)
+                    self.flushed_at.pop(job_id, None)
+        self.expired += removed
+        return removed
+
+    def stats(self):
+        count, subscribers = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(COALESCE(json_extract(data, '$.subscribers'), 1)), 0) FROM jobs").fetchone()
+        with self.lock:
+            return dict(self._dedup_stats(), backend='sqlite', path=self.path, jobs=count, subscribers=subscribers,
+                        writes=self.writes, batched=self.batched, expired=self.expired)
+
+# Function to build the job store selected by FRAMECRAFTER_JOB_STORE ('sqlite' by default, or 'memory')
+def create_job_store():
+    backend = os.environ.get('FRAMECRAFTER_JOB_STORE', 'sqlite').lower()
+    if backend == 'memory':
+        return MemoryJobStore()
+    if backend == 'sqlite':
+        return SQLiteJobStore()
+    raise ValueError(f"Unknown job store backend: {backend}")
+
+# ------------------------ JOB SCHEDULING ------------------------
+
+# Custom-timestamp jobs with at most this many timestamps run ahead of everything else
+SHORT_JOB_TIMESTAMPS = 50
+
+# Fixed pool of conversion workers fed from a bounded priority queue
+class JobScheduler:
+    """Run jobs on a fixed number of worker threads, lower priority values first
+
+    Worker count and queue bound default to FRAMECRAFTER_WORKERS (2) and
+    FRAMECRAFTER_MAX_QUEUE (20). submit() returns False instead of queueing when full.
+    on_change, when set, is called after the queue grows or shrinks.
+    """
+
+    def __init__(self, workers=None, max_queue=None, default_duration=60.0, on_change=None):
+        self.workers = workers or int(os.environ.get('FRAMECRAFTER_WORKERS', 2))
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get('FRAMECRAFTER_MAX_QUEUE', 20))
+        self.default_duration = default_duration
+        self.heap = []  # (priority, sequence, job_id, target, args, kwargs)
+        self.sequence = 0
+        self.running = {}  # job_id -> start time
+        self.durations = collections.deque(maxlen=20)
+        self.cond = threading.Condition()
+        self.threads = []
+        self.on_change = on_change
+
+    def _changed(self):
+        if self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error(f"Error publishing queue state: {str(e)}")
+
+    def _start_workers(self):
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self._work, daemon=True, name=f"job-worker-{len(self.threads) + 1}")
+            self.threads.append(thread)
+            thread.start()
+
+    def submit(self, job_id, priority, target, *args, **kwargs):
+        """Queue target(*args, **kwargs) for job_id, returns False when the queue is full"""
+        with self.cond:
+            if len(self.heap) >= self.max_queue:
+                return False
+            self._start_workers()
+            heapq.heappush(self.heap, (priority, self.sequence, job_id, target, args, kwargs))
+            self.sequence += 1
+            self.cond.notify()
+        self._changed()
+        return True
+
+    def remove(self, job_id):
+        """Drop a queued job, returns False when it is not queued here"""
+        with self.cond:
+            remaining = [entry for entry in self.heap if entry[2] != job_id]
+            if len(remaining) == len(self.heap):
+                return False
+            self.heap = remaining
+            heapq.heapify(self.heap)
+        self._changed()
+        return True
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while not self.heap:
+                    self.cond.wait()
+                _, _, job_id, target, args, kwargs = heapq.heappop(self.heap)
+                self.running[job_id] = time.time()
+            self._changed()
+            try:
+                target(*args, **kwargs)
+            except Exception as e:
+                logger.exception(f"Error in job {job_id}: {str(e)}")
+            finally:
+                with self.cond:
+                    self.durations.append(time.time() - self.running.pop(job_id))
+
+    def average_duration(self):
+        """Mean duration of recent jobs, used for start time estimates"""
+        with self.cond:
+            return sum(self.durations) / len(self.durations) if self.durations else self.default_duration
+
+    def _estimate_waits(self, count):
+        # Simulate workers draining the queue with average-length jobs
+        duration = self.average_duration()
+        now = time.time()
+        free_at = [max(0.0, duration - (now - started)) for started in self.running.values()]
+        free_at += [0.0] * max(0, self.workers - len(free_at))
+        heapq.heapify(free_at)
+        waits = []
+        for _ in range(count):
+            start = heapq.heappop(free_at)
+            waits.append(start)
+            heapq.heappush(free_at, start + duration)
+        return waits
+
+    def queue_position(self, job_id):
+        """Return (1-based position, estimated seconds until start) for a queued job, or (None, 0)"""
+        with self.cond:
+            ordered = sorted(self.heap)
+            for position, entry in enumerate(ordered):
+                if entry[2] == job_id:
+                    return position + 1, self._estimate_waits(position + 1)[-1]
+        return None, 0
+
+    def queue_snapshot(self):
+        """Return [(job_id, 1-based position, estimated seconds until start)] for every queued job"""
+        with self.cond:
+            ordered = sorted(self.heap)
+            waits = self._estimate_waits(len(ordered))
+            return [(entry[2], position + 1, waits[position]) for position, entry in enumerate(ordered)]
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up"""
+        with self.cond:
+            waits = self._estimate_waits(1)
+        return max(1, int(math.ceil(waits[0])))
+
+    def stats(self):
+        with self.cond:
+            return {'workers': self.workers, 'running': len(self.running), 'queued': len(self.heap),
+                    'max_queue': self.max_queue}
+
+# ------------------------ ARTIFACT LIFECYCLE ------------------------
+
+# Seconds a finished PDF is kept while some of its job's subscribers have not downloaded it
+ARTIFACT_RETENTION = float(os.environ.get('FRAMECRAFTER_ARTIFACT_RETENTION', 3600))
+
+# Seconds a PDF is kept after the last download its job's subscribers were expected to make
+DOWNLOAD_GRACE = float(os.environ.get('FRAMECRAFTER_DOWNLOAD_GRACE', 180))
+
+# Function to return the job ID in a job file's name (<title>_<job_id>.pdf or job_<job_id>), None for other files
+def artifact_job_id(path):
+    name = os.path.basename(path)
+    if name.startswith('job_'):
+        return name[len('job_'):]
+    if name.endswith('.pdf') and '_' in name:
+        return os.path.splitext(name)[0].rsplit('_', 1)[-1]
+    return None
+
+# Lifetimes of PDFs and job temp directories, served by one timer thread
+class ArtifactManager:
+    """Delete job files when they expire, never while in use, and within a disk budget
+
+    Every artifact (a file or directory) has a reference count, held while it is written or
+    downloaded, and a count of downloads still expected from its job's subscribers. While
+    downloads are pending it expires retention seconds after it was added, afterwards grace
+    seconds after the last download. Deadlines sit in a heap served by a single daemon
+    thread; an artifact that expires while referenced goes when its last reference is
+    released. When all artifacts together exceed max_bytes (FRAMECRAFTER_ARTIFACT_MAX_MB,
+    default 4096), the oldest unreferenced ones are deleted first.
+
+    Reference counts only cover this process. With a job store (jobs), the files of a job
+    that is still running, in this process or another, are neither adopted, expired nor
+    evicted, and the downloads still pending are its subscribers minus its counted downloads.
+
+    call_at() and every() run other timed work, such as job record expiry, on the same thread.
+    """
+
+    def __init__(self, max_bytes=None, retention=ARTIFACT_RETENTION, grace=DOWNLOAD_GRACE, clock=time.time, jobs=None):
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get('FRAMECRAFTER_ARTIFACT_MAX_MB', 4096)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.jobs = jobs
+        self.retention = retention
+        self.grace = grace
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.artifacts = collections.OrderedDict()  # path -> fields, oldest first
+        self.heap = []  # (deadline, sequence, action)
+        self.sequence = 0
+        self.total_bytes = 0
+        self.thread = None
+        self.expired = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _measure(path):
+        if os.path.isdir(path):
+            return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _job(self, path):
+        # Record of the job the file belongs to, if any
+        job_id = artifact_job_id(path) if self.jobs is not None else None
+        return self.jobs.get(job_id) if job_id else None
+
+    def _running(self, path):
+        job = self._job(path)
+        return job is not None and job.get('status') not in TERMINAL_JOB_STATES
+
+    def _pending(self, path, artifact):
+        # The job record counts subscribers and downloads across every server process; returns the updated count
+        job = self._job(path)
+        if job is not None:
+            artifact['pending'] = max(0, job.get('subscribers', 1) - job.get('downloads', 0))
+        return artifact['pending']
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True, name="artifact-expiry")
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.heap or self.heap[0][0] > self.clock():
+                    self.cond.wait(self.heap[0][0] - self.clock() if self.heap else None)
+                _, _, action = heapq.heappop(self.heap)
+            try:
+                action()
+            except Exception as e:
+                logger.error(f"Error in scheduled cleanup: {str(e)}")
+
+    def call_at(self, deadline, action):
+        """Run action() on the timer thread once deadline (a clock() time) has passed"""
+        with self.cond:
+            heapq.heappush(self.heap, (deadline, self.sequence, action))
+            self.sequence += 1
+            self._start()
+            self.cond.notify()
+
+    def every(self, interval, action):
+        """Run action() on the timer thread every interval seconds"""
+        def repeat():
+            try:
+                action()
+            finally:
+                self.call_at(self.clock() + interval, repeat)
+        self.call_at(self.clock() + interval, repeat)
+
+    def _expire_at(self, path, deadline):
+        # Called with the lock held; an older deadline of the same artifact is ignored when it fires
+        self.artifacts[path]['deadline'] = deadline
+        self.call_at(deadline, lambda: self._expire(path, deadline))
+
+    def _expire(self, path, deadline):
+        with self.cond:
+            artifact = self.artifacts.get(path)
+            if artifact is None or artifact['deadline'] != deadline:
+                return
+            if artifact['refs'] > 0:
+                artifact['expired'] = True
+                return
+            # A job still running, here or in another process, keeps its files; subscribers that attached in
+            # another process since the deadline was set keep the PDF for retention seconds more
+            previous = artifact['pending']
+            if self._running(path) or self._pending(path, artifact) > previous:
+                self._expire_at(path, self.clock() + (self.retention if artifact['pending'] else self.grace))
+                return
+            self.expired += 1
+            self._delete(path)
+
+    def _delete(self, path):
+        # Called with the lock held
+        artifact = self.artifacts.pop(path)
+        self.total_bytes -= artifact['size']
+        try:
+            if os.path.isdir(path):
+                # Whole directories are only ever job or download directories directly inside the temp directory
+                if os.path.dirname(os.path.abspath(path)) != Utils.get_temp_dir():
+                    logger.error(f"Not deleting {path}: directory outside {Utils.get_temp_dir()}")
+                    return
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+                logger.info(f"Deleted {path}")
+        except OSError as e:
+            logger.error(f"Error deleting {path}: {str(e)}")
+
+    def _enforce_limit(self):
+        # Called with the lock held; evicts oldest first, skipping artifacts in use
+        for path in list(self.artifacts):
+            if self.total_bytes <= self.max_bytes:
+                return
+            if self.artifacts[path]['refs'] == 0 and not self._running(path):
+                self.evicted += 1
+                logger.info(f"Disk budget exceeded, evicting {path}")
+                self._delete(path)
+
+    def add(self, path, refs=0, owner=None, pending=0, deadline=None):
+        """Track path, holding refs references; returns False when it is already tracked
+
+        Without a deadline it expires retention seconds from now if downloads are pending,
+        grace seconds from now otherwise, or never while refs are held.
+        """
+        with self.cond:
+            if path in self.artifacts:
+                return False
+            size = self._measure(path)
+            self.artifacts[path] = {'refs': refs, 'owner': owner, 'pending': pending, 'size': size,
+                                    'deadline': None, 'expired': False, 'removed': False}
+            self.total_bytes += size
+            if deadline is None and not refs:
+                deadline = self.clock() + (self.retention if self._pending(path, self.artifacts[path]) else self.grace)
+            if deadline is not None:
+                self._expire_at(path, deadline)
+            self._enforce_limit()
+            return True
+
+    def acquire(self, path):
+        """Take a reference on path, returns False when it is not tracked"""
+        with self.cond:
+            artifact = self.artifacts.get(path)
+            if artifact is None:
+                return False
+            artifact['refs'] += 1
+            return True
+
+    def release(self, path, pending=None, downloaded=False):
+        """Drop a reference on path
+
+        pending sets the downloads still expected (when a job finishes), downloaded counts
+        one of them as made; a job record overrides both. The deadline follows: retention
+        seconds while downloads are pending, grace seconds once none are left.
+        """
+        with self.cond:
+            artifact = self.artifacts.get(path)
+            if artifact is None:
+                return
+            artifact['refs'] = max(0, artifact['refs'] - 1)
+            if pending is not None:
+                artifact['pending'] = pending
+            if downloaded:
+                artifact['pending'] = max(0, artifact['pending'] - 1)
+            self._pending(path, artifact)
+            size = self._measure(path)
+            self.total_bytes += size - artifact['size']
+            artifact['size'] = size
+            if artifact['refs'] == 0 and artifact['removed']:
+                self.expired += 1
+                self._delete(path)
+                return
+            if artifact['refs'] == 0 and artifact['expired']:
+                # Expired while in use: goes now, unless its job still needs it (see _expire)
+                artifact['expired'] = False
+                self._expire_at(path, self.clock())
+            elif pending is not None or downloaded:
+                self._expire_at(path, self.clock() + (self.retention if artifact['pending'] else self.grace))
+            self._enforce_limit()
+
+    def expect(self, path):
+        """Count one more download of path, keeping it for at least retention seconds from now"""
+        with self.cond:
+            artifact = self.artifacts.get(path)
+            if artifact is None:
+                return False
+            artifact['pending'] += 1
+            self._pending(path, artifact)
+            if artifact['deadline'] is not None:
+                self._expire_at(path, max(artifact['deadline'], self.clock() + self.retention))
+            return True
+
+    def remove(self, path, release=False):
+        """Delete path now, or once its last reference is released; release drops the caller's own first"""
+        with self.cond:
+            artifact = self.artifacts.get(path)
+            if artifact is None:
+                return
+            if release:
+                artifact['refs'] = max(0, artifact['refs'] - 1)
+            if artifact['refs'] > 0:
+                artifact['removed'] = True
+            else:
+                self._delete(path)
+
+    def adopt(self, directory, suffix=''):
+        """Track the files and directories a previous run left in directory, expiring retention after their mtime
+
+        Files of jobs still running, here or in another process, are left to the process running them.
+        """
+        adopted = 0
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if (name.endswith(suffix) and not self._running(path)
+                    and self.add(path, deadline=os.path.getmtime(path) + self.retention)):
+                adopted += 1
+        return adopted
+
+    def job_dir(self, job_id):
+        """Path of a job's own temp directory, tracked with one reference held by the job"""
+        path = os.path.join(Utils.get_temp_dir(), f"job_{job_id}")
+        self.add(path, refs=1, owner=job_id)
+        return path
+
+    def stats(self):
+        with self.cond:
+            return {'artifacts': len(self.artifacts), 'bytes': self.total_bytes, 'max_bytes': self.max_bytes,
+                    'in_use': sum(1 for artifact in self.artifacts.values() if artifact['refs']),
+                    'scheduled': len(self.heap), 'expired': self.expired, 'evicted': self.evicted}
+
+# ------------------------ RESULT CACHE ------------------------
+
+# Finished PDFs shared across jobs, addressed by the request that produced them
+class ResultCache:
+    """On-disk cache of finished PDFs with a size limit and LRU eviction
+
+    Entries are keyed by conversion_key(), so a request for the same video, frames, notes and
+    quality gets the PDF an earlier job made without capturing anything. An entry is a <key>.pdf
+    file and a <key>.json file holding the title, page counts and SHA-1; the JSON file's modification
+    time is refreshed on every hit and orders eviction. PDFs enter and leave the cache as hard
+    links where the file system allows, so storing and serving one copies nothing. The limit
+    defaults to FRAMECRAFTER_RESULT_CACHE_MB (2048 MB); 0 turns the cache off.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get('FRAMECRAFTER_RESULT_CACHE_MB', 2048)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = None  # key -> PDF size, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _link(source, destination):
+        # A hard link shares the bytes; a file system without links, or another volume, gets a copy
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, f"{key}{extension}")
+
+    def _load(self):
+        # Rebuild the LRU order from the info files' modification times
+        if self.entries is not None:
+            return
+        if self.directory is None:
+            self.directory = os.environ.get('FRAMECRAFTER_RESULT_CACHE_DIR') or os.path.join(os.getcwd(), "result_cache")
+        Utils.ensure_dir(self.directory)
+        files = []
+        for name in os.listdir(self.directory):
+            key, extension = os.path.splitext(name)
+            if extension != '.json':
+                continue
+            try:
+                mtime = os.path.getmtime(self._path(key, '.json'))
+                size = os.path.getsize(self._path(key, '.pdf'))
+            except OSError:
+                continue
+            files.append((mtime, key, size))
+        files.sort()
+        self.entries = collections.OrderedDict((key, size) for _, key, size in files)
+        self.total_bytes = sum(size for _, _, size in files)
+
+    def _miss(self, key):
+        with self.lock:
+            self.misses += 1
+            self.total_bytes -= self.entries.pop(key, 0)
+
+    def get(self, key):
+        """Return the stored info of the PDF cached for key, or None"""
+        if self.max_bytes <= 0:
+            return None
+        with self.lock:
+            self._load()
+        try:
+            with open(self._path(key, '.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            self._miss(key)
+            return None
+
+    def restore(self, key, destination):
+        """Link the PDF cached for key to destination; returns False when the entry has gone since get()"""
+        try:
+            os.utime(self._path(key, '.json'))
+            self._link(self._path(key, '.pdf'), destination)
+        except OSError:
+            self._miss(key)
+            return False
+        with self.lock:
+            self.hits += 1
+            # Another process may have stored this entry
+            if key not in self.entries:
+                self.entries[key] = os.path.getsize(destination)
+                self.total_bytes += self.entries[key]
+            self.entries.move_to_end(key)
+        return True
+
+    def put(self, key, pdf_path, **info):
+        """Store a finished PDF and its info under key and evict least recently used entries over the limit"""
+        try:
+            size = os.path.getsize(pdf_path)
+        except OSError:
+            return
+        if not size or size > self.max_bytes:
+            return
+        with self.lock:
+            self._load()
+        # The PDF goes in before its info file, so an entry whose info can be read is complete
+        suffix = f".{uuid.uuid4().hex}.tmp"
+        cached_pdf, info_path = self._path(key, '.pdf'), self._path(key, '.json')
+        try:
+            self._link(pdf_path, cached_pdf + suffix)
+            os.replace(cached_pdf + suffix, cached_pdf)
+            with open(info_path + suffix, 'w', encoding='utf-8') as f:
+                json.dump(dict(info, pdf_size=size), f)
+            os.replace(info_path + suffix, info_path)
+        except OSError as e:
+            logger.warning(f"Could not store PDF in the result cache: {str(e)}")
+            return
+        with self.lock:
+            self.total_bytes += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.stores += 1
+            self._trim()
+
+    def _trim(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            for extension in ('.json', '.pdf'):
+                try:
+                    os.remove(self._path(key, extension))
+                except OSError:
+                    pass
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        if self.max_bytes <= 0:
+            return {'enabled': False}
+        with self.lock:
+            self._load()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+# ------------------------ FLASK WEB APPLICATION ------------------------
+
+app = Flask(__name__, static_folder='static', template_folder='templates')
+CORS(app)
+
+# Conversion jobs, shared with every other server process through the job store
+job_store = create_job_store()
+
+# Function to record queue positions in the job store so any server process can report them
+def publish_queue_positions():
+    now = time.time()
+    for job_id, position, wait in scheduler.queue_snapshot():
+        job_store.update(job_id, queue_position=position, estimated_start=now + wait)
+
+# Conversion workers shared by all requests
+scheduler = JobScheduler(on_change=publish_queue_positions)
+
+# Controls of the jobs running in this process, so a cancel request stops them without waiting for a store poll
+job_controls = {}
+
+# PDFs and job temp directories written or served by this process; job state comes from the shared job store
+artifacts = ArtifactManager(jobs=job_store)
+
+# Finished PDFs kept for later identical requests, shared with every other server process
+result_cache = ResultCache()
+
+# Seconds a finished job's PDF is handed to new identical requests (FRAMECRAFTER_REUSE_WINDOW)
+JOB_REUSE_WINDOW = float(os.environ.get('FRAMECRAFTER_REUSE_WINDOW', 600))
+
+# Function to compute the canonical key of a conversion request; requests with equal keys produce the same PDF
+def conversion_key(youtube_url, mode, timestamp_list, interval, timestamp_notes, quality, fast_mode=False,
+                   scene_threshold=SCENE_THRESHOLD, dedupe_distance=None):
+    def seconds(ts):
+        try:
+            return round(parse_timestamp(ts), 3)
+        except Exception:
+            return str(ts).strip()
+    
+    request_spec = {'video': MetadataCache.key(youtube_url), 'mode': mode, 'quality': quality,
+                    'dedupe_distance': dedupe_distance}
+    if mode == 'interval':
+        request_spec.update(interval=interval, fast_mode=bool(fast_mode))
+    elif mode == 'scenes':
+        request_spec['scene_threshold'] = round(float(scene_threshold), 4)
+    else:
+        # '1:30', '90' and 90 name the same frame; order and duplicates don't change the PDF
+        request_spec['timestamps'] = sorted({seconds(ts) for ts in timestamp_list}, key=str)
+        request_spec['notes'] = sorted([str(seconds(ts)), str(note)] for ts, note in (timestamp_notes or {}).items())
+    return hashlib.sha1(json.dumps(request_spec, sort_keys=True).encode('utf-8')).hexdigest()
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/start_conversion', methods=['POST'])
+def start_conversion():
+    try:
+        data = request.json
+        youtube_url = data.get('youtube_url')
+        mode = data.get('mode', 'interval')
+        
+        if not youtube_url:
+            return jsonify({'error': 'YouTube URL is required'}), 400
+        
+        # Generate a unique job ID
+        job_id = str(uuid.uuid4())
+        
+        # Initialize variables
+        interval = None
+        timestamp_list = []
+        timestamp_notes = {}
+        
+        # Snap interval captures to the nearest keyframe (within 1s) when requested
+        fast_mode = bool(data.get('fast_mode', False))
+        
+        # Write frames to disk during capture instead of holding them in memory (very large jobs)
+        spill_to_disk = bool(data.get('spill_to_disk', False))
+        
+        # Write PDF pages while frames are still being captured instead of after capture
+        pipeline = bool(data.get('pipeline', False))
+        
+        # Output quality profile (target DPI and frame encoder)
+        quality = data.get('quality', DEFAULT_QUALITY)
+        if quality not in QUALITY_PROFILES:
+            return jsonify({'error': f'Quality must be one of: {", ".join(QUALITY_PROFILES)}'}), 400
+        
+        # Number of capture processes for this job
+        workers = int(data.get('workers', 1))
+        if workers < 1 or workers > (os.cpu_count() or 1):
+            return jsonify({'error': f'Workers must be between 1 and {os.cpu_count() or 1}'}), 400
+        
+        # Decoder threads per capture process; by default the CPUs are shared evenly between workers
+        decoder_threads = data.get('decoder_threads')
+        if decoder_threads is not None:
+            decoder_threads = int(decoder_threads)
+            if decoder_threads < 1 or decoder_threads > (os.cpu_count() or 1):
+                return jsonify({'error': f'Decoder threads must be between 1 and {os.cpu_count() or 1}'}), 400
+        
+        # Drop pages that look the same as the one before them (dHash Hamming distance), off unless requested
+        dedupe_distance = None
+        if data.get('dedupe'):
+            dedupe_distance = int(data.get('dedupe_distance', DEDUP_DISTANCE))
+            if dedupe_distance < 0 or dedupe_distance > 64:
+                return jsonify({'error': 'Dedupe distance must be between 0 and 64'}), 400
+        
+        # Change score that starts a new scene in scenes mode
+        scene_threshold = float(data.get('scene_threshold', SCENE_THRESHOLD))
+        
+        # Process based on mode
+        if mode == 'interval':
+            interval = int(data.get('interval', 60))
+            if interval < 5:
+                return jsonify({'error': 'Interval must be at least 5 seconds'}), 400
+        elif mode == 'scenes':
+            if not 0 < scene_threshold < 1:
+                return jsonify({'error': 'Scene threshold must be between 0 and 1'}), 400
+        else:  # custom mode
+            timestamp_json = data.get('timestamp_list')
+            if not timestamp_json:
+                return jsonify({'error': 'Timestamp list is required for custom mode'}), 400
+            
+            try:
+                timestamp_data = json.loads(timestamp_json)
+                
+                # Handle different formats of timestamp data
+                if isinstance(timestamp_data, dict):
+                    # Check if this is the format with video ID as the key
+                    # Format: {"videoId": {"timestamps": {"63": "note1", "369": "note2"}, "title": "Video Title"}}
+                    for video_id, video_data in timestamp_data.items():
+                        if isinstance(video_data, dict) and 'timestamps' in video_data:
+                            # Extract timestamps from nested structure
+                            timestamp_dict = video_data['timestamps']
+                            if isinstance(timestamp_dict, dict):
+                                timestamp_list = list(timestamp_dict.keys())
+                                timestamp_notes = timestamp_dict
+                                break  # We only process the first video ID entry
+                        else:
+                            # Regular format: {"1:30": "note1", "2:45": "note2"}
+                            timestamp_list = list(timestamp_data.keys())
+                            timestamp_notes = timestamp_data
+                elif isinstance(timestamp_data, list):
+                    timestamp_list = timestamp_data
+                else:
+                    return jsonify({'error': 'Invalid timestamp format'}), 400
+            except json.JSONDecodeError:
+                return jsonify({'error': 'Invalid JSON format for timestamps'}), 400
+        
+        # Identical requests share one job: attach to a live or recently finished job with the same key
+        fast_mode = fast_mode and mode == 'interval'
+        job_key = conversion_key(youtube_url, mode, timestamp_list, interval, timestamp_notes, quality, fast_mode,
+                                 scene_threshold, dedupe_distance)
+        job_id, attached = job_store.attach(job_key, job_id, JOB_REUSE_WINDOW, status='queued', message='Job queued',
+                                            progress=0, pdf_path=None, timestamp_notes=timestamp_notes)
+        if attached:
+            job = job_store.get(job_id) or {}
+            if job.get('status') == 'completed' and job.get('pdf_path'):
+                # The finished PDF now waits for this subscriber's download too
+                artifacts.expect(job['pdf_path'])
+            return jsonify({'job_id': job_id, 'attached': True, 'subscribers': job.get('subscribers', 1)})
+        
+        # A PDF made by an earlier identical request completes the job at once
+        cached = result_cache.get(job_key)
+        if cached is not None:
+            pdf_filename = f"{Utils.sanitize_filename(cached.get('title') or 'YouTube_Video')}_{job_id}.pdf"
+            pdf_path = os.path.join(Utils.get_pdf_dir(), pdf_filename)
+            if result_cache.restore(job_key, pdf_path):
+                artifacts.add(pdf_path, refs=1, owner=job_id)
+                completed = job_store.transition(
+                    job_id, ('queued',), 'completed', message='Conversion completed successfully!', progress=100,
+                    details=(f'PDF served from the result cache: {pdf_filename} '
+                             f'({cached["pdf_size"] / (1024 * 1024):.1f} MB, {quality} quality, '
+                             f'{cached.get("pages_saved", 0)} pages saved)'),
+                    pdf_size=cached['pdf_size'], elapsed=0, pdf_path=pdf_path, pdf_filename=pdf_filename,
+                    pages_saved=cached.get('pages_saved', 0), pdf_sha1=cached.get('sha1') or file_etag(pdf_path),
+                    cached_result=True, truncated=[])
+                if completed:
+                    # Identical requests may have attached in the meantime; each of them downloads it too
+                    artifacts.release(pdf_path, pending=(job_store.get(job_id) or {}).get('subscribers', 1))
+                else:
+                    # Cancelled before it could complete
+                    artifacts.remove(pdf_path, release=True)
+                return jsonify({'job_id': job_id, 'attached': False, 'subscribers': 1, 'cached': True})
+        
+        # Short custom-timestamp jobs go ahead of full-length interval jobs
+        priority = 0 if mode == 'custom' and len(timestamp_list) <= SHORT_JOB_TIMESTAMPS else 1
+        
+        # Queue the conversion on the shared worker pool; the checkpoint keeps the request for a restarted server
+        job_request = dict(youtube_url=youtube_url, mode=mode, timestamp_list=timestamp_list, interval=interval,
+                           timestamp_notes=timestamp_notes, fast_mode=fast_mode, workers=workers,
+                           spill_to_disk=spill_to_disk, quality=quality, scene_threshold=scene_threshold,
+                           dedupe_distance=dedupe_distance, decoder_threads=decoder_threads, pipeline=pipeline)
+        checkpoint = Checkpoint(job_id) if CHECKPOINTS else None
+        if checkpoint is not None:
+            checkpoint.start(dict(job_request, priority=priority))
+        accepted = scheduler.submit(job_id, priority, process_conversion, job_id, **job_request)
+        if not accepted:
+            if checkpoint is not None:
+                checkpoint.remove()
+            job_store.delete(job_id)
+            retry_after = scheduler.retry_after()
+            response = jsonify({'error': f'Server is busy, please try again in {retry_after} seconds', 'retry_after': retry_after})
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
+        
+        return jsonify({
+            'job_id': job_id,
+            'attached': False,
+            'subscribers': 1
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def process_conversion(job_id, youtube_url, mode, timestamp_list, interval, timestamp_notes=None, fast_mode=False, workers=1,
+                       spill_to_disk=False, quality=DEFAULT_QUALITY, scene_threshold=SCENE_THRESHOLD, dedupe_distance=None,
+                       decoder_threads=None, pipeline=False):
+    started = time.time()
+    # Per-stage timings of this job; progress is the fraction of the expected (learned) job duration done
+    timer = StageTimer()
+    progress = JobProgress(scenes=mode == 'scenes',
+                           frames=len(timestamp_list) if mode == 'custom' and timestamp_list else 20)
+    # Cancel requests and budgets are checked between units of work
+    control = JobControl(JOB_MAX_SECONDS, JOB_MAX_FRAMES, JOB_MAX_SOURCE_SECONDS, job_id=job_id, store=job_store)
+    job_controls[job_id] = control
+    claimed = False
+    frames = []
+    pdf_path = None
+    # Finished PDFs are stored under the request's canonical key for later identical requests
+    job_key = conversion_key(youtube_url, mode, timestamp_list, interval, timestamp_notes, quality, fast_mode,
+                             scene_threshold, dedupe_distance)
+    screenshots_dir = None
+    # Work finished by an earlier, interrupted run of this job
+    checkpoint = Checkpoint(job_id) if CHECKPOINTS else None
+    try:
+        # Claim the job; another worker or process may already have taken it
+        progress.enter('extract')
+        if not job_store.transition(job_id, ('queued',), 'processing', message='Getting video stream...',
+                                    progress=progress.percent(),
+                                    details='Analyzing YouTube video and preparing for capture'):
+            return
+        claimed = True
+        # Frames stay in memory unless the job opted into spilling them to disk; spill files go in the job's own directory
+        screenshots_dir = artifacts.job_dir(job_id)
+        if checkpoint is not None:
+            checkpoint.start()
+            if checkpoint.frames:
+                # The PDF is built again from the checkpointed screenshots, which takes no capture
+                resumed_pdf = checkpoint.resumed_pdf()
+                job_store.update(job_id, details=(f'Resuming from a checkpoint of {len(checkpoint.frames)} screenshots'
+                                                  + (f' ({resumed_pdf})' if resumed_pdf else '')))
+        
+        # Get video stream URL and info without downloading
+        with timer.stage('extract'):
+            stream_url, video_title, duration = get_streaming_url(youtube_url)
+        control.check()
+        
+        if not stream_url:
+            job_store.transition(job_id, ('processing',), 'error', message='Failed to get video stream',
+                                 stages=timer.summary())
+            return
+        control.check_source(duration)
+        
+        # Update job status
+        progress.set_units('scenes', duration if mode == 'scenes' else 0)
+        if mode == 'interval':
+            progress.set_units('capture', len(generate_interval_timestamps(duration, interval)))
+            progress.set_units('pdf', progress.units['capture'])
+        job_store.update(job_id, message='Preparing to capture screenshots...', progress=progress.percent(1.0),
+                         details=f'Video title: {video_title}, Duration: {duration} seconds', stages=timer.summary())
+        
+        # Determine timestamps
+        if checkpoint is not None and checkpoint.timestamps is not None:
+            # A resumed job captures what it planned before, without detecting scenes again
+            timestamps = checkpoint.timestamps
+            job_store.update(job_id, details=f'Video title: {video_title}, Resuming {len(timestamps)} planned screenshots')
+        elif mode == 'interval':
+            timestamps = generate_interval_timestamps(duration, interval)
+            job_store.update(job_id, details=f'Video title: {video_title}, Taking screenshots every {interval} seconds')
+        elif mode == 'scenes':
+            progress.enter('scenes')
+            job_store.update(job_id, message='Detecting scene changes...')
+            
+            def update_scene_progress(current_frame, total_frames):
+                job_store.update(job_id, batch=True, progress=progress.percent(current_frame / total_frames),
+                                 details=f'Analyzing frame {current_frame} of {total_frames} for scene changes')
+            
+            with timer.stage('scenes'):
+                timestamps = detect_scenes(stream_url, threshold=scene_threshold, progress_callback=update_scene_progress,
+                                           control=control, decoder_threads=decoder_threads)
+            if not timestamps:
+                job_store.transition(job_id, ('processing',), 'error', message='Failed to detect scenes',
+                                     stages=timer.summary())
+                return
+            job_store.update(job_id, details=f'Video title: {video_title}, Detected {len(timestamps)} scenes')
+        else:  # custom timestamps
+            # Convert string timestamps to seconds
+            timestamps = []
+            for ts in timestamp_list:
+                try:
+                    seconds = parse_timestamp(ts)
+                    timestamps.append(seconds)
+                except Exception as e:
+                    logger.warning(f"Error parsing timestamp {ts}: {str(e)}")
+            
+            if not timestamps:
+                timestamps = generate_interval_timestamps(duration, 60)  # Default fallback
+                job_store.update(job_id, details=f'Video title: {video_title}, Using default intervals (60s) as custom timestamps failed')
+            else:
+                job_store.update(job_id, details=f'Video title: {video_title}, Using {len(timestamps)} custom timestamps')
+        if checkpoint is not None and checkpoint.timestamps is None:
+            checkpoint.plan(timestamps)
+        
+        # Jobs over their frame budget keep the earliest timestamps
+        truncated = []
+        requested = len(timestamps)
+        timestamps = control.limit_frames(timestamps)
+        if len(timestamps) < requested:
+            truncated.append(f'first {len(timestamps)} of {requested} screenshots (frame limit)')
+        
+        # Update job status before starting capture
+        progress.set_units('capture', len(timestamps))
+        progress.set_units('pdf', len(timestamps))
+        progress.enter('capture')
+        job_store.update(job_id, message='Capturing screenshots...', progress=progress.percent(), stages=timer.summary())
+        
+        # Define a progress callback function
+        reported_percent = [-1]
+        
+        def update_screenshot_progress(current_index, total):
+            if total <= 0:
+                return
+            # Coalesce to whole-percent steps so long, fast captures don't flood the store and event streams
+            percent = int(current_index / total * 100)
+            if percent == reported_percent[0] and current_index < total:
+                return
+            reported_percent[0] = percent
+            # Progress ticks are batched; the store writes them at most a few times per second
+            job_store.update(job_id, batch=True, progress=progress.percent(current_index / total),
+                             details=f'Capturing screenshot {current_index} of {total} ({percent}%)')
+        
+        # The PDF name is needed up front by pipelined jobs, which write it during capture
+        safe_title = Utils.sanitize_filename(video_title if video_title else "YouTube_Video")
+        pdf_filename = f"{safe_title}_{job_id}.pdf"
+        pdf_path = os.path.join(Utils.get_pdf_dir(), pdf_filename)
+        # The writer's reference keeps the PDF while it is written and streamed
+        artifacts.add(pdf_path, refs=1, owner=job_id)
+        capture_options = dict(output_dir=screenshots_dir, progress_callback=update_screenshot_progress,
+                               fast_mode=fast_mode, workers=workers, spill_to_disk=spill_to_disk, quality=quality,
+                               timer=timer, control=control, decoder_threads=decoder_threads, checkpoint=checkpoint)
+        
+        if pipeline:
+            # Pages are written as frames arrive, so PDF time is part of the capture phase
+            progress.set_units('pdf', 0)
+            job_store.transition(job_id, ('processing',), 'generating_pdf', message='Capturing screenshots into the PDF...',
+                                 progress=progress.percent(), pdf_filename=pdf_filename, stages=timer.summary())
+            result = capture_to_pdf(stream_url, timestamps, video_title=video_title, output_pdf=pdf_path,
+                                    timestamp_notes=timestamp_notes, dedupe_distance=dedupe_distance,
+                                    pdf_progress=checkpoint.pdf_progress if checkpoint is not None else None,
+                                    spill_dir=screenshots_dir, **capture_options)
+            captured, cached_frames, pages_saved = result['frames'], result['cached_frames'], result['pages_saved']
+            job_store.update(job_id, cached_frames=cached_frames, pages_saved=pages_saved)
+        else:
+            # Capture screenshots with progress updates
+            frames = capture_screenshots(stream_url, timestamps, **capture_options)
+            captured = len(frames)
+        
+        if not captured:
+            # Running out of time before the first frame is a budget failure, not a capture one
+            control.check()
+            job_store.transition(job_id, ('processing', 'generating_pdf'), 'error', message='Failed to capture screenshots',
+                                 stages=timer.summary())
+            return
+        
+        # Out of time: capture stopped early and the PDF is made from the frames taken so far
+        if control.out_of_time() and captured < len(timestamps):
+            truncated.append(f'stopped after {captured} of {len(timestamps)} screenshots (time limit)')
+        
+        if not pipeline:
+            # Optionally merge runs of near-identical frames into one page
+            pages_saved = 0
+            if dedupe_distance is not None:
+                frames, timestamp_notes, pages_saved = dedupe_frames(frames, timestamp_notes, dedupe_distance)
+            
+            # Update job status
+            cached_frames = sum(1 for record in frames if record.cached)
+            progress.set_units('pdf', len(frames))
+            progress.enter('pdf')
+            job_store.transition(job_id, ('processing',), 'generating_pdf', message='Creating PDF...',
+                                 progress=progress.percent(),
+                                 details=(f'Combining {len(frames)} screenshots into PDF ({cached_frames} from cache, '
+                                          f'{pages_saved} duplicate pages dropped)'),
+                                 cached_frames=cached_frames, pages_saved=pages_saved, stages=timer.summary())
+            
+            # Pass timestamp notes to the PDF creation function
+            job_store.update(job_id, details='Generating PDF with timestamps and notes', pdf_filename=pdf_filename)
+            reported_pages = [-1]
+            
+            def update_pdf_progress(pages, total):
+                if checkpoint is not None:
+                    checkpoint.pdf_progress(pages, total)
+                # Same whole-percent coalescing as the capture ticks
+                percent = int(pages / total * 100)
+                if percent == reported_pages[0] and pages < total:
+                    return
+                reported_pages[0] = percent
+                job_store.update(job_id, batch=True, progress=progress.percent(pages / total),
+                                 details=f'Adding page {pages} of {total} to the PDF')
+            
+            create_pdf(frames, video_title=video_title, output_pdf=pdf_path, timestamp_notes=timestamp_notes,
+                       progress_callback=update_pdf_progress, timer=timer, control=control)
+        
+        # Cleanup phase
+        progress.enter('finish')
+        job_store.update(job_id, progress=progress.percent(), details='Cleaning up temporary files')
+        
+        with timer.stage('cleanup'):
+            # Release frames (and any spill files) after PDF creation
+            for record in frames:
+                record.discard()
+            
+            # Only this job's temp directory; other jobs' files are left alone
+            artifacts.remove(screenshots_dir, release=True)
+        
+        # Update job status
+        pdf_size = os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0
+        # Hashed once here; downloads send it as the ETag and the result cache keeps it with the PDF
+        pdf_sha1 = file_etag(pdf_path) if pdf_size else None
+        elapsed = time.time() - started
+        phases = progress.finish()
+        completed = job_store.transition(
+            job_id, ('generating_pdf',), 'completed', message='Conversion completed successfully!', progress=100,
+            details=(f'PDF created successfully: {pdf_filename} '
+                     f'({pdf_size / (1024 * 1024):.1f} MB in {elapsed:.1f}s, {quality} quality, '
+                     f'{pages_saved} pages saved)' + ''.join(f', {note}' for note in truncated)),
+            pdf_size=pdf_size, elapsed=round(elapsed, 2), pdf_path=pdf_path, pdf_filename=pdf_filename,
+            pdf_sha1=pdf_sha1, stages=timer.summary(), phases=phases, truncated=truncated)
+        if completed:
+            # A PDF cut short by a budget is not what the request asked for, so only whole results are cached
+            if not truncated:
+                result_cache.put(job_key, pdf_path, title=video_title, pages_saved=pages_saved, sha1=pdf_sha1)
+            # Kept until every subscriber has downloaded it, or the retention time has passed
+            artifacts.release(pdf_path, pending=(job_store.get(job_id) or {}).get('subscribers', 1))
+        
+    except JobCancelled as e:
+        # Budget overruns are failures; cancelled jobs already carry the status set by the cancel request
+        job = job_store.get(job_id) or {}
+        logger.info(f"Job {job_id} stopped: {str(e)}")
+        if isinstance(e, BudgetExceeded):
+            job_store.transition(job_id, ('processing', 'generating_pdf'), 'error', message=f'Error: {str(e)}',
+                                 details=f'Stopped at step: {job.get("details", "Unknown step")}', stages=timer.summary())
+        else:
+            job_store.transition(job_id, ('processing', 'generating_pdf', 'cancelled'), 'cancelled',
+                                 message='Conversion cancelled',
+                                 details=f'Stopped at step: {job.get("details", "Unknown step")}', stages=timer.summary())
+    except Exception as e:
+        logger.exception(f"Error in conversion process: {str(e)}")
+        job = job_store.get(job_id) or {}
+        job_store.transition(job_id, ('queued', 'processing', 'generating_pdf'), 'error', message=f'Error: {str(e)}',
+                             details=f'Failed at step: {job.get("details", "Unknown step")}', stages=timer.summary())
+    finally:
+        job_controls.pop(job_id, None)
+        # Whatever stopped the job, its frames and spill files go now rather than at the next sweep
+        for record in frames:
+            record.discard()
+        if screenshots_dir is not None:
+            artifacts.remove(screenshots_dir, release=True)
+        # Failed and cancelled jobs, including those cancelled after the last page was written, leave no PDF
+        if pdf_path is not None and (job_store.get(job_id) or {}).get('status') != 'completed':
+            artifacts.remove(pdf_path, release=True)
+        # Jobs claimed by another worker never ran here and are not counted
+        if claimed:
+            job = job_store.get(job_id) or {}
+            if checkpoint is not None and job.get('status') in TERMINAL_JOB_STATES:
+                checkpoint.remove()
+            metrics.inc('framecrafter_jobs_total', status=job.get('status', 'unknown'))
+            metrics.observe('framecrafter_job_seconds', time.time() - started)
+
+# Function to re-queue the jobs a stopped server left unfinished, which then resume from their checkpoints
+# Jobs still held by a live process on this host are left alone; returns the number of jobs re-queued
+def resume_interrupted_jobs():
+    resumed = 0
+    for checkpoint in Checkpoint.saved():
+        # CLI runs checkpoint without a request and are resumed with --resume
+        if checkpoint.job is None:
+            continue
+        job_id = checkpoint.name
+        job = job_store.get(job_id)
+        if job is not None and job.get('status') in TERMINAL_JOB_STATES:
+            checkpoint.remove()
+            continue
+        if checkpoint.owner_alive() or job_id in job_controls or scheduler.queue_position(job_id)[0] is not None:
+            continue
+        request = dict(checkpoint.job)
+        priority = request.pop('priority', 1)
+        if job is None:
+            # In-memory job records did not survive the restart
+            job_store.create(job_id, status='queued', message='Job queued after a restart', progress=0, pdf_path=None,
+                             timestamp_notes=request.get('timestamp_notes') or {})
+        elif not job_store.transition(job_id, ('queued', 'processing', 'generating_pdf'), 'queued',
+                                      message='Job queued after a restart', progress=0):
+            continue
+        if not scheduler.submit(job_id, priority, process_conversion, job_id, **request):
+            logger.warning(f"Job queue is full, job {job_id} stays checkpointed")
+            continue
+        resumed += 1
+    if resumed:
+        logger.info(f"Re-queued {resumed} interrupted job(s)")
+    return resumed
+
+# Function to build the client-facing status of a job from its store record
+def job_status_payload(job_id, job):
+    response = {
+        'status': job['status'] if job['status'] != 'error' else 'failed',
+        'message': job['message'],
+        'progress': job['progress'] / 100,  # Convert to 0-1 range for frontend
+        'subscribers': job.get('subscribers', 1)
+    }
+    
+    if job.get('details'):
+        response['details'] = job['details']
+    
+    # Seconds and operation counts per stage so far, to see where a slow job spends its time
+    if job.get('stages'):
+        response['stages'] = job['stages']
+    
+    if job['status'] == 'queued':
+        position, wait = scheduler.queue_position(job_id)
+        if position is None and job.get('queue_position'):
+            # Queued by another server process, which published its position to the store
+            position, wait = job['queue_position'], max(0.0, job['estimated_start'] - time.time())
+        if position is not None:
+            response['queue_position'] = position
+            response['estimated_start'] = round(time.time() + wait)
+            response['details'] = f'Position {position} in queue, estimated start in ~{int(math.ceil(wait))}s'
+    
+    if job['status'] == 'completed' and job.get('pdf_filename'):
+        response['pdf_filename'] = job['pdf_filename']
+        response['pdf_size'] = job.get('pdf_size', 0)
+        response['elapsed'] = job.get('elapsed', 0)
+        response['pages_saved'] = job.get('pages_saved', 0)
+    elif job['status'] == 'generating_pdf' and job.get('pdf_filename'):
+        # The PDF is streamed to disk and can already be downloaded while it is being built
+        response['pdf_filename'] = job['pdf_filename']
+        response['pdf_streaming'] = True
+    
+    return response
+
+@app.route('/job_status/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'status': 'failed', 'message': 'Job not found'}), 404
+    
+    return jsonify(job_status_payload(job_id, job))
+
+@app.route('/job/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    # One subscriber leaves; the job itself only stops when no other request is waiting for it
+    result = job_store.cancel(job_id)
+    if result is None:
+        return jsonify({'status': 'failed', 'message': 'Job not found'}), 404
+    status, subscribers = result
+    if status == 'cancelled':
+        # Queued here: the job never starts. Running here: it stops at its next check.
+        # Queued or running in another server process: that process sees the status in the store.
+        if scheduler.remove(job_id) and CHECKPOINTS:
+            Checkpoint(job_id).remove()
+        control = job_controls.get(job_id)
+        if control is not None:
+            control.cancel("Cancelled by user")
+    job = job_store.get(job_id) or {'status': status, 'message': 'Conversion cancelled', 'progress': 0}
+    return jsonify(dict(job_status_payload(job_id, job), subscribers=subscribers))
+
+# Pushed job events are at least this far apart; updates in between are coalesced into the next one
+JOB_EVENT_INTERVAL = 0.25
+
+# Seconds between keep-alive comments on an idle event stream
+JOB_EVENT_KEEPALIVE = 15
+
+@app.route('/job_events/<job_id>', methods=['GET'])
+def job_events(job_id):
+    if job_store.get(job_id) is None:
+        return jsonify({'status': 'failed', 'message': 'Job not found'}), 404
+    
+    # Server-Sent Events: a 'status' event whenever the job's status changes, then one 'done' event
+    def stream():
+        yield 'retry: 2000\n\n'
+        last_payload = None
+        last_sent = time.time()
+        while True:
+            version = job_store.version
+            job = job_store.get(job_id)
+            if job is None:
+                yield f"event: done\ndata: {json.dumps({'status': 'failed', 'message': 'Job not found'})}\n\n"
+                return
+            payload = job_status_payload(job_id, job)
+            final = job['status'] in TERMINAL_JOB_STATES
+            if payload != last_payload:
+                yield f"event: {'done' if final else 'status'}\ndata: {json.dumps(payload)}\n\n"
+                last_payload = payload
+                last_sent = time.time()
+            elif time.time() - last_sent >= JOB_EVENT_KEEPALIVE:
+                yield ': keep-alive\n\n'
+                last_sent = time.time()
+            if final:
+                return
+            time.sleep(JOB_EVENT_INTERVAL)
+            # Woken at once by writes from this process; other processes' writes are picked up within a second
+            job_store.wait_for_change(version, timeout=1.0)
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/cache_stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({'frames': frame_cache.stats(), 'metadata': metadata_cache.stats(), 'jobs': job_store.stats(),
+                    'artifacts': artifacts.stats(), 'results': result_cache.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Stage histograms and job counters, plus scheduler, job store and cache state read at scrape time
+    queue_stats, store_stats = scheduler.stats(), job_store.stats()
+    frames, metadata, files, results = frame_cache.stats(), metadata_cache.stats(), artifacts.stats(), result_cache.stats()
+    samples = [
+        ('framecrafter_scheduler_jobs', 'gauge', 'Jobs held by this process\'s scheduler', queue_stats['running'],
+         {'state': 'running'}),
+        ('framecrafter_scheduler_jobs', 'gauge', 'Jobs held by this process\'s scheduler', queue_stats['queued'],
+         {'state': 'queued'}),
+        ('framecrafter_stored_jobs', 'gauge', 'Job records in the job store', store_stats['jobs'], {}),
+        ('framecrafter_frame_cache_bytes', 'gauge', 'Size of the frame cache', frames['bytes'], {}),
+        ('framecrafter_frame_cache_lookups_total', 'counter', 'Frame cache lookups', frames['hits'], {'result': 'hit'}),
+        ('framecrafter_frame_cache_lookups_total', 'counter', 'Frame cache lookups', frames['misses'],
+         {'result': 'miss'}),
+        ('framecrafter_metadata_cache_lookups_total', 'counter', 'Video info cache lookups', metadata['hits'],
+         {'result': 'hit'}),
+        ('framecrafter_metadata_cache_lookups_total', 'counter', 'Video info cache lookups', metadata['misses'],
+         {'result': 'miss'}),
+        ('framecrafter_artifact_bytes', 'gauge', 'Size of the PDFs and job files kept on disk', files['bytes'], {}),
+        ('framecrafter_artifacts_deleted_total', 'counter', 'PDFs and job files deleted', files['expired'],
+         {'reason': 'expired'}),
+        ('framecrafter_artifacts_deleted_total', 'counter', 'PDFs and job files deleted', files['evicted'],
+         {'reason': 'evicted'}),
+        ('framecrafter_result_cache_bytes', 'gauge', 'Size of the result cache', results.get('bytes', 0), {}),
+        ('framecrafter_result_cache_lookups_total', 'counter', 'Result cache lookups', results.get('hits', 0),
+         {'result': 'hit'}),
+        ('framecrafter_result_cache_lookups_total', 'counter', 'Result cache lookups', results.get('misses', 0),
+         {'result': 'miss'}),
+    ]
+    samples += [('framecrafter_expected_phase_seconds', 'gauge', 'Learned cost of a job phase per unit of work',
+                 round(progress_model.cost(phase), 6), {'phase': phase, 'unit': unit})
+                for phase, unit in ProgressModel.PHASES]
+    return Response(metrics.render(samples), mimetype='text/plain; version=0.0.4')
+
+# Function to yield a file's bytes as it grows until its writer signals completion
+def follow_file(file_path, done_event, chunk_size=65536):
+    with open(file_path, 'rb') as f:
+        while True:
+            finished = done_event.is_set()
+            chunk = f.read(chunk_size)
+            if chunk:
+                yield chunk
+                continue
+            if finished:
+                return
+            done_event.wait(0.25)
+
+# Completion signal of a job whose PDF may be written by another process
+class JobDoneEvent:
+    """Event-like view of a job record for follow_file()
+
+    is_set() is true once the job has reached a terminal state or its record is gone; wait()
+    returns on the next job store write in this process or after timeout, so writes from other
+    processes are seen on the next poll.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def is_set(self):
+        job = job_store.get(self.job_id)
+        return job is None or job['status'] in TERMINAL_JOB_STATES
+
+    def wait(self, timeout):
+        job_store.wait_for_change(job_store.version, timeout)
+
+# Function to compute the SHA-1 of one version of a file; the modification time and size key the memo
+@functools.lru_cache(maxsize=256)
+def content_digest(file_path, mtime_ns, size):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Function to return a finished file's strong ETag, the same for the same bytes under any name or in any process;
+# used when the digest is first stored and for files no job record describes
+def file_etag(file_path):
+    stat = os.stat(file_path)
+    return content_digest(file_path, stat.st_mtime_ns, stat.st_size)
+
+@app.route('/download/<filename>', methods=['GET'])
+def download_file(filename):
+    pdf_dir = Utils.get_pdf_dir()
+    
+    # Only PDF files directly inside the PDF directory are served, so nothing else is ever tracked for deletion
+    file_path = safe_join(pdf_dir, filename)
+    if (file_path is None or not filename.endswith('.pdf') or os.path.dirname(file_path) != pdf_dir
+            or not os.path.isfile(file_path)):
+        return jsonify({'error': 'File not found'}), 404
+    
+    # The download holds a reference until the response is closed; PDFs written by another process are tracked from here
+    if not artifacts.add(file_path, refs=1) and not artifacts.acquire(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    
+    # Job PDFs are named <title>_<job_id>.pdf; the job record says whether the PDF is finished, whichever process
+    # writes it
+    job_id = artifact_job_id(file_path)
+    job = job_store.get(job_id)
+    if job is not None and job.get('pdf_filename') != filename:
+        job = None
+    if job is not None and job['status'] != 'completed':
+        # A PDF that is still being written is streamed as it grows
+        done_event = FramePDF.in_progress.get(os.path.abspath(file_path)) or JobDoneEvent(job_id)
+        response = Response(follow_file(file_path, done_event), mimetype='application/pdf',
+                            headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+    else:
+        # Conditional response: If-None-Match gets a 304, and Range (with If-Range) resumes a download, for any
+        # client or proxy holding the same ETag. The digest stored at completion saves hashing the PDF here
+        etag = job.get('pdf_sha1') if job is not None else None
+        try:
+            response = send_from_directory(pdf_dir, filename, as_attachment=True, etag=etag or file_etag(file_path))
+        except (OSError, NotFound):
+            artifacts.release(file_path)
+            return jsonify({'error': 'File not found'}), 404
+    # A subscriber has downloaded the PDF once it holds all of it: a whole body, a 304, or a range reaching the end
+    content_range = response.content_range
+    downloaded = response.status_code in (200, 304) or (response.status_code == 206 and content_range is not None
+                                                         and content_range.stop == content_range.length)
+    # Released when the server closes the body (send_file's passthrough body skips call_on_close hooks); once every
+    # subscriber has downloaded the PDF it expires after DOWNLOAD_GRACE seconds
+    def finish_download():
+        # Counted in the job record first, so every server process knows how many downloads are still to come
+        if downloaded and job is not None:
+            job_store.count_download(job_id)
+        artifacts.release(file_path, downloaded=downloaded)
+    
+    response.response = ClosingIterator(response.response, finish_download)
+    return response
+
+# ------------------------ SERVER ------------------------
+
+# Set once this process has done its startup work
+server_initialized = False
+server_init_lock = threading.Lock()
+
+# Function to do a server process's startup work once: pick up files and jobs left by an earlier run, and expire
+# old job records from then on. Runs on the first request under a WSGI server; returns False when already done
+def init_server():
+    global server_initialized
+    with server_init_lock:
+        if server_initialized:
+            return False
+        server_initialized = True
+    
+    # Now and every 30 minutes, on the artifact timer thread: drop job records past their TTL, and track PDFs and
+    # temp files left by an earlier run or by jobs another server process has finished. They expire like new ones,
+    # counted from their last change; files of jobs still running stay with the process running them
+    def housekeeping():
+        expired = job_store.expire()
+        if expired:
+            logger.info(f"Expired {expired} old job records")
+        adopted = artifacts.adopt(Utils.get_pdf_dir(), '.pdf') + artifacts.adopt(Utils.get_temp_dir())
+        if adopted:
+            logger.info(f"Tracking {adopted} files left by an earlier run or another server process")
+    
+    housekeeping()
+    artifacts.every(1800, housekeeping)
+    
+    resume_interrupted_jobs()
+    return True
+
+@app.before_request
+def init_server_on_first_request():
+    if not server_initialized:
+        init_server()
+
+# Function to run the development server on port 5000
+def main():
+    configure_logging()
+    
+    # app.run(debug=True) serves from a child process started by the reloader; the startup work runs there,
+    # before the first request
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        init_server()
+    
+    # Run the Flask app
+    app.run(debug=True, host='0.0.0.0', port=5000) 
@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const youtubeUrlInput = document.getElementById('youtube-url');
     const intervalModeRadio = document.getElementById('interval-mode');
     const customModeRadio = document.getElementById('custom-mode');
+    const scenesModeRadio = document.getElementById('scenes-mode');
     const intervalConfig = document.getElementById('interval-config');
     const customTimestamps = document.getElementById('custom-timestamps');
     const intervalInput = document.getElementById('interval');
@@ -14,6 +15,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const statusMessage = document.querySelector('.status-message');
     const downloadSection = document.querySelector('.download-section');
     const downloadBtn = document.getElementById('download-btn');
+    const cancelSection = document.querySelector('.cancel-section');
+    const cancelBtn = document.getElementById('cancel-btn');
     const errorModal = document.getElementById('error-modal');
     const errorMessage = document.getElementById('error-message');
     const modalClose = document.querySelector('.modal-close');
@@ -29,6 +32,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
     let currentJobId = null;
     let statusCheckInterval = null;
+    let jobEventSource = null;
+    let jobRunning = false;
 
     // Theme switcher
     function initTheme() {
@@ -55,15 +60,12 @@ document.addEventListener('DOMContentLoaded', function() {
     // Mode switcher
     intervalModeRadio.addEventListener('change', toggleMode);
     customModeRadio.addEventListener('change', toggleMode);
+    scenesModeRadio.addEventListener('change', toggleMode);
 
     function toggleMode() {
-        if (intervalModeRadio.checked) {
-            intervalConfig.style.display = 'block';
-            customTimestamps.style.display = 'none';
-        } else {
-            intervalConfig.style.display = 'none';
-            customTimestamps.style.display = 'block';
-        }
+        // Scenes mode needs no configuration, so both panels are hidden
+        intervalConfig.style.display = intervalModeRadio.checked ? 'block' : 'none';
+        customTimestamps.style.display = customModeRadio.checked ? 'block' : 'none';
     }
 
     // Interval presets
@@ -254,7 +256,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         // Collect form data
-        const mode = intervalModeRadio.checked ? 'interval' : 'custom';
+        const mode = intervalModeRadio.checked ? 'interval' : (scenesModeRadio.checked ? 'scenes' : 'custom');
         let interval = null;
         let timestampList = null;
 
@@ -264,7 +266,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 showError('Please enter a valid interval (minimum 5 seconds).');
                 return;
             }
-        } else {
+        } else if (mode === 'custom') {
             // Use the JSON file data
             if (!window.timestampData) {
                 showError('Please upload a valid timestamps JSON file.');
@@ -280,6 +282,7 @@ document.addEventListener('DOMContentLoaded', function() {
         progressBarFill.style.width = '0%';
         progressText.textContent = '0%';
         downloadSection.style.display = 'none';
+        cancelSection.style.display = 'block';
         statusIcon.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
         statusDetails.textContent = '';
 
@@ -291,7 +294,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         if (mode === 'interval') {
             requestData.interval = interval;
-        } else {
+        } else if (mode === 'custom') {
             requestData.timestamp_list = JSON.stringify(timestampList);
         }
 
@@ -313,7 +316,8 @@ document.addEventListener('DOMContentLoaded', function() {
             }
 
             currentJobId = data.job_id;
-            startStatusCheck();
+            jobRunning = true;
+            startJobEvents();
         })
         .catch(error => {
             showError('An error occurred: ' + error.message);
@@ -322,6 +326,72 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Stop the job on the server; keepalive lets the request outlive a closing tab
+    function cancelJob(keepalive) {
+        if (!currentJobId || !jobRunning) return Promise.resolve(null);
+        jobRunning = false;
+        return fetch(`/job/${currentJobId}`, { method: 'DELETE', keepalive: keepalive })
+            .then(response => response.json());
+    }
+
+    cancelBtn.addEventListener('click', function() {
+        cancelBtn.disabled = true;
+        cancelJob(false)
+            .then(data => {
+                if (!data) return;
+                // The job may carry on for other requests that share it; this page stops following it either way
+                if (jobEventSource) {
+                    jobEventSource.close();
+                    jobEventSource = null;
+                }
+                clearInterval(statusCheckInterval);
+                updateStatusUI(Object.assign({}, data, { status: 'cancelled', message: 'Conversion cancelled' }));
+            })
+            .catch(error => showError('Error cancelling conversion: ' + error.message))
+            .finally(() => {
+                cancelBtn.disabled = false;
+            });
+    });
+
+    // Closing or leaving the page abandons the conversion
+    window.addEventListener('pagehide', function() {
+        cancelJob(true);
+    });
+
+    // Follow job progress over Server-Sent Events, falling back to polling when unavailable
+    function startJobEvents() {
+        if (jobEventSource) {
+            jobEventSource.close();
+            jobEventSource = null;
+        }
+
+        if (!window.EventSource) {
+            startStatusCheck();
+            return;
+        }
+
+        const source = new EventSource(`/job_events/${currentJobId}`);
+        jobEventSource = source;
+
+        source.addEventListener('status', function(e) {
+            updateStatusUI(JSON.parse(e.data));
+        });
+
+        source.addEventListener('done', function(e) {
+            source.close();
+            jobEventSource = null;
+            updateStatusUI(JSON.parse(e.data));
+        });
+
+        // Connection refused or dropped before the final event: switch to polling
+        source.onerror = function() {
+            if (jobEventSource !== source) return;
+            source.close();
+            jobEventSource = null;
+            startStatusCheck();
+        };
+    }
+
     // Check job status
     function startStatusCheck() {
         // Clear any existing interval
@@ -342,8 +412,8 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(data => {
                 updateStatusUI(data);
 
-                // If job is completed or failed, stop checking
-                if (data.status === 'completed' || data.status === 'failed') {
+                // If job is completed, failed or cancelled, stop checking
+                if (data.status === 'completed' || data.status === 'failed' || data.status === 'cancelled') {
                     clearInterval(statusCheckInterval);
                 }
             })
@@ -371,6 +441,11 @@ document.addEventListener('DOMContentLoaded', function() {
             statusDetails.textContent = data.details;
         }
 
+        if (data.status === 'completed' || data.status === 'failed' || data.status === 'cancelled') {
+            jobRunning = false;
+            cancelSection.style.display = 'none';
+        }
+
         // Handle completed state
         if (data.status === 'completed') {
             clearInterval(statusCheckInterval);
@@ -391,6 +466,14 @@ document.addEventListener('DOMContentLoaded', function() {
             statusIcon.classList.remove('pulse-animation');
             showError(data.message || 'Conversion failed. Please try again.');
         }
+
+        // Handle cancelled state: back to the form for a new request
+        if (data.status === 'cancelled') {
+            clearInterval(statusCheckInterval);
+            statusIcon.innerHTML = '<i class="fas fa-ban"></i>';
+            statusIcon.classList.remove('pulse-animation');
+            converterSection.style.display = 'block';
+        }
     }
 
     // Add ripple effect to buttons
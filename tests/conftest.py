@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+# Tests import the modules from the repository root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# Job records, caches, keyframe indexes and checkpoints stay out of the tree; set before framecrafter is imported
+os.environ.setdefault('FRAMECRAFTER_JOB_STORE', 'memory')
+for variable in ('FRAMECRAFTER_FRAME_CACHE_DIR', 'FRAMECRAFTER_CHECKPOINT_DIR', 'FRAMECRAFTER_RESULT_CACHE_DIR',
+                 'FRAMECRAFTER_KEYFRAME_INDEX_DIR'):
+    os.environ.setdefault(variable, tempfile.mkdtemp(prefix='framecrafter-test-'))
+
+import framecrafter
+import framecrafter_web
+from benchmarks import videos
+from benchmarks.http_server import serve_directory
+from benchmarks.run import StubExtractor
+
+# Short synthetic MP4 with a keyframe every 12 frames, shared by the tests that decode or fetch a video
+TEST_VIDEO_SPEC = dict(videos.VIDEO_SPECS['360p-mp4v'], width=320, height=180, seconds=8)
+
+@pytest.fixture(scope='session')
+def video_path(tmp_path_factory):
+    videos.VIDEO_SPECS.setdefault('test-mp4v', TEST_VIDEO_SPEC)
+    return videos.ensure_video('test-mp4v', str(tmp_path_factory.mktemp('videos')))
+
+# Local HTTP server with range support serving the test video's directory; yields (video URL, server)
+@pytest.fixture
+def video_server(video_path):
+    with serve_directory(os.path.dirname(video_path)) as (base_url, server):
+        yield f"{base_url}/{os.path.basename(video_path)}", server
+
+# Web app serving from a scratch working directory, with bench://test resolved to the test video
+@pytest.fixture(scope='module')
+def client(video_path, tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp('web'))
+        patch.setattr(framecrafter, 'metadata_cache', framecrafter.MetadataCache(
+            framecrafter.ExtractorPool(factory=lambda: StubExtractor({'test': (video_path, TEST_VIDEO_SPEC)}))))
+        # Identical requests get the result cache rather than the finished job
+        patch.setattr(framecrafter_web, 'JOB_REUSE_WINDOW', 0)
+        yield framecrafter_web.app.test_client()
+
+# Function to wait for a job to reach a terminal state and return its record
+def wait_for_job(job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = framecrafter_web.job_store.get(job_id)
+        if job is not None and job['status'] in framecrafter_web.TERMINAL_JOB_STATES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+# Function to poll a condition until it holds or the timeout passes; returns its last value
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+# Holds new jobs at their stream lookup until the test sets the yielded event, so they stay in flight meanwhile
+@pytest.fixture
+def held_jobs(client, monkeypatch):
+    release = threading.Event()
+
+    def get_streaming_url(youtube_url):
+        release.wait(60)
+        return framecrafter.get_streaming_url(youtube_url)
+
+    monkeypatch.setattr(framecrafter_web, 'get_streaming_url', get_streaming_url)
+    yield release
+    release.set()
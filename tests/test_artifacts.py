@@ -0,0 +1,140 @@
+import os
+import time
+
+import pytest
+
+from conftest import wait_until
+from framecrafter import Utils
+from framecrafter_web import ArtifactManager, MemoryJobStore, SQLiteJobStore
+
+JOB_ID = "0d241dc6-6091-4dce-a50a-e17f56b82ebb"
+
+def write_file(path, size=1000):
+    with open(path, 'wb') as f:
+        f.write(b"x" * size)
+    return path
+
+# Job files live under the working directory, like the server's PDF and temp directories
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def test_adopt_leaves_files_of_running_jobs_alone(workdir):
+    jobs = MemoryJobStore()
+    jobs.create(JOB_ID, status='processing')
+    manager = ArtifactManager(jobs=jobs)
+    pdf_path = write_file(os.path.join(Utils.get_pdf_dir(), f"Title_{JOB_ID}.pdf"))
+    job_dir = Utils.ensure_dir(os.path.join(Utils.get_temp_dir(), f"job_{JOB_ID}"))
+    leftover = write_file(os.path.join(Utils.get_pdf_dir(), "Leftover.pdf"))
+    assert manager.adopt(Utils.get_pdf_dir(), '.pdf') + manager.adopt(Utils.get_temp_dir()) == 1
+    assert list(manager.artifacts) == [leftover]
+
+    jobs.transition(JOB_ID, None, 'completed')
+    assert manager.adopt(Utils.get_pdf_dir(), '.pdf') + manager.adopt(Utils.get_temp_dir()) == 2
+    assert pdf_path in manager.artifacts and job_dir in manager.artifacts
+
+def test_files_of_running_jobs_are_not_evicted_or_expired(workdir):
+    jobs = MemoryJobStore()
+    jobs.create(JOB_ID, status='generating_pdf')
+    manager = ArtifactManager(max_bytes=0, retention=0.2, grace=0.1, jobs=jobs)
+    pdf_path = write_file(os.path.join(Utils.get_pdf_dir(), f"Title_{JOB_ID}.pdf"))
+    # Tracked here without a reference, as a download of another process's PDF leaves it
+    manager.add(pdf_path)
+    time.sleep(0.4)
+    assert os.path.exists(pdf_path)
+    assert manager.evicted == 0
+
+    jobs.transition(JOB_ID, None, 'completed')
+    assert wait_until(lambda: not os.path.exists(pdf_path))
+
+def test_pending_downloads_come_from_the_job_record(workdir):
+    # Two store instances on one database stand in for two server processes
+    database = str(workdir / "jobs.db")
+    owner_store, other_store = SQLiteJobStore(database), SQLiteJobStore(database)
+    owner_store.create(JOB_ID, status='completed', subscribers=2)
+    pdf_path = write_file(os.path.join(Utils.get_pdf_dir(), f"Title_{JOB_ID}.pdf"))
+    manager = ArtifactManager(retention=60, grace=0.1, jobs=other_store)
+
+    # The first subscriber downloads through the other process: one download is still to come
+    assert manager.add(pdf_path, refs=1)
+    other_store.count_download(JOB_ID)
+    manager.release(pdf_path, downloaded=True)
+    assert manager.artifacts[pdf_path]['pending'] == 1
+    time.sleep(0.3)
+    assert os.path.exists(pdf_path)
+
+    # The second one counts in the record too, whichever process serves it
+    owner_store.count_download(JOB_ID)
+    assert manager.acquire(pdf_path)
+    manager.release(pdf_path, downloaded=True)
+    assert manager.artifacts[pdf_path]['pending'] == 0
+    assert wait_until(lambda: not os.path.exists(pdf_path))
+    assert other_store.get(JOB_ID)['downloads'] == 2
+
+def test_referenced_artifacts_outlive_their_deadline(workdir):
+    manager = ArtifactManager(retention=60, grace=0.1)
+    pdf_path = write_file(str(workdir / "Downloading.pdf"))
+    manager.add(pdf_path, refs=1, deadline=time.time() + 0.1)
+    assert wait_until(lambda: manager.artifacts[pdf_path]['expired'])
+    assert os.path.exists(pdf_path)
+    # Expired while in use: deleted once the last reference goes
+    manager.release(pdf_path)
+    assert wait_until(lambda: not os.path.exists(pdf_path))
+    assert manager.stats()['expired'] == 1
+
+def test_remove_waits_for_the_last_reference(workdir):
+    manager = ArtifactManager()
+    pdf_path = write_file(str(workdir / "Cancelled.pdf"))
+    manager.add(pdf_path, refs=1)
+    assert manager.acquire(pdf_path)
+    # The job drops its own reference; a download still holds the other
+    manager.remove(pdf_path, release=True)
+    assert os.path.exists(pdf_path)
+    manager.release(pdf_path, downloaded=True)
+    assert not os.path.exists(pdf_path)
+    assert pdf_path not in manager.artifacts
+    assert not manager.acquire(pdf_path)
+
+def test_deadline_follows_the_pending_downloads(workdir):
+    manager = ArtifactManager(retention=60, grace=0.2)
+    pdf_path = write_file(str(workdir / "Shared.pdf"))
+    manager.add(pdf_path, refs=1)
+    assert manager.artifacts[pdf_path]['deadline'] is None
+    # The job finishes with two subscribers: kept for retention seconds
+    manager.release(pdf_path, pending=2)
+    assert manager.artifacts[pdf_path]['deadline'] == pytest.approx(time.time() + 60, abs=1)
+    # A third request attaches to the finished job
+    assert manager.expect(pdf_path)
+    assert manager.artifacts[pdf_path]['pending'] == 3
+    for downloads_left in (2, 1):
+        manager.acquire(pdf_path)
+        manager.release(pdf_path, downloaded=True)
+        assert manager.artifacts[pdf_path]['pending'] == downloads_left
+        assert os.path.exists(pdf_path)
+    # After the last download only the grace period is left
+    manager.acquire(pdf_path)
+    manager.release(pdf_path, downloaded=True)
+    assert manager.artifacts[pdf_path]['deadline'] == pytest.approx(time.time() + 0.2, abs=0.1)
+    assert wait_until(lambda: not os.path.exists(pdf_path))
+
+def test_budget_evicts_the_oldest_unreferenced_artifacts(workdir):
+    manager = ArtifactManager(max_bytes=2500, retention=60, grace=60)
+    in_use, oldest, newest = (write_file(str(workdir / f"{name}.pdf")) for name in ("InUse", "Oldest", "Newest"))
+    manager.add(in_use, refs=1)
+    manager.add(oldest)
+    assert manager.stats()['bytes'] == 2000
+    manager.add(newest)
+    assert not os.path.exists(oldest)
+    assert os.path.exists(in_use) and os.path.exists(newest)
+    assert manager.stats() == dict(manager.stats(), artifacts=2, bytes=2000, in_use=1, evicted=1)
+
+def test_timer_runs_actions_in_deadline_order(workdir):
+    manager = ArtifactManager()
+    calls, ticks = [], []
+    now = time.time()
+    manager.call_at(now + 0.2, lambda: calls.append('second'))
+    manager.call_at(now + 0.1, lambda: calls.append('first'))
+    manager.every(0.05, lambda: ticks.append(time.time()))
+    assert wait_until(lambda: len(calls) == 2 and len(ticks) >= 3)
+    assert calls == ['first', 'second']
@@ -0,0 +1,51 @@
+import json
+import os
+
+import framecrafter_web
+from conftest import wait_for_job, wait_until
+from framecrafter import Utils
+
+# Function to start a custom-timestamp job and wait until a worker has claimed it
+def start_job(client, timestamps):
+    response = client.post('/start_conversion', json={
+        'youtube_url': 'bench://test', 'mode': 'custom', 'quality': 'draft',
+        'timestamp_list': json.dumps(timestamps)}).get_json()
+    assert wait_until(lambda: framecrafter_web.job_store.get(response['job_id'])['status'] == 'processing')
+    return response
+
+def job_files(job_id):
+    return [name for name in os.listdir(Utils.get_pdf_dir()) + os.listdir(Utils.get_temp_dir()) if job_id in name]
+
+def test_cancelling_the_only_subscriber_stops_the_job(client, held_jobs):
+    job_id = start_job(client, [1.5, 3.5])['job_id']
+    response = client.delete(f"/job/{job_id}")
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'cancelled'
+    assert response.get_json()['subscribers'] == 0
+    held_jobs.set()
+
+    # The worker stops at its next check and leaves no PDF or job directory behind
+    assert wait_until(lambda: job_id not in framecrafter_web.job_controls)
+    job = framecrafter_web.job_store.get(job_id)
+    assert job['status'] == 'cancelled'
+    assert not job['pdf_path']
+    assert job_files(job_id) == []
+
+def test_cancelling_one_of_two_subscribers_keeps_the_job_running(client, held_jobs):
+    first = start_job(client, [2.5, 4.5])
+    request = {'youtube_url': 'bench://test', 'mode': 'custom', 'quality': 'draft',
+               'timestamp_list': json.dumps([4.5, 2.5])}
+    second = client.post('/start_conversion', json=request).get_json()
+    assert second['job_id'] == first['job_id']
+
+    response = client.delete(f"/job/{first['job_id']}").get_json()
+    assert response['status'] == 'processing'
+    assert response['subscribers'] == 1
+    held_jobs.set()
+
+    job = wait_for_job(first['job_id'])
+    assert job['status'] == 'completed'
+    assert os.path.getsize(job['pdf_path']) > 0
+
+def test_cancelling_an_unknown_job_is_not_found(client):
+    assert client.delete("/job/missing").status_code == 404
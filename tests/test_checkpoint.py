@@ -0,0 +1,79 @@
+import os
+import uuid
+
+import framecrafter_web
+from conftest import wait_for_job
+from framecrafter import Checkpoint, FrameCache, capture_screenshots
+
+# Timestamps planned by the interrupted job; the first three were captured before it stopped
+TIMESTAMPS = [1, 2, 3, 4, 5, 6]
+
+def test_frames_point_at_cache_entries_and_copy_the_rest(video_path, tmp_path):
+    cache = FrameCache(str(tmp_path / "cache"))
+    cached = Checkpoint('cached', str(tmp_path))
+    capture_screenshots(video_path, TIMESTAMPS[:2], cache=cache, checkpoint=cached)
+    assert all('cache_key' in entry and 'file' not in entry for entry in cached.frames.values())
+    assert not os.path.exists(cached.frames_dir)
+
+    copied = Checkpoint('copied', str(tmp_path))
+    capture_screenshots(video_path, TIMESTAMPS[:2], cache=None, checkpoint=copied)
+    assert all('file' in entry for entry in copied.frames.values())
+    assert len(os.listdir(copied.frames_dir)) == 2
+
+def test_restore_skips_damaged_frames(video_path, tmp_path):
+    checkpoint = Checkpoint('job', str(tmp_path))
+    frames = capture_screenshots(video_path, TIMESTAMPS[:2], cache=None, checkpoint=checkpoint)
+    # A reloaded manifest finds the frames again
+    reloaded = Checkpoint('job', str(tmp_path))
+    record = reloaded.restore(1, frames[0].quality)
+    assert record.load() == frames[0].load()
+
+    entry = reloaded.frames[Checkpoint.frame_key(2, frames[1].quality)]
+    with open(os.path.join(reloaded.frames_dir, entry['file']), 'r+b') as f:
+        f.write(b"\0" * 16)
+    assert reloaded.restore(2, frames[1].quality) is None
+    assert reloaded.restored == 1
+
+def test_pdf_progress_is_recorded_per_percent_and_reloaded(tmp_path):
+    checkpoint = Checkpoint('job', str(tmp_path))
+    for pages in range(1, 251):
+        checkpoint.pdf_progress(pages, 400)
+    with open(checkpoint.path, encoding='utf-8') as f:
+        assert sum(1 for line in f if '"pdf"' in line) == 62  # Every 4 pages of 400
+    reloaded = Checkpoint('job', str(tmp_path))
+    assert (reloaded.pdf_pages, reloaded.pdf_total) == (248, 400)
+    assert reloaded.resumed_pdf() == "248 of 400 PDF pages had been written"
+    checkpoint.pdf_progress(400, 400)
+    assert Checkpoint('job', str(tmp_path)).pdf_pages == 400
+
+def test_server_resumes_an_interrupted_job(client, video_path, monkeypatch):
+    # Leave a checkpoint as a server stopped during capture would: the request, the plan, three frames and a job
+    # record that never reached a terminal state
+    job_id = str(uuid.uuid4())
+    request = dict(youtube_url='bench://test', mode='custom', timestamp_list=[], interval=60, timestamp_notes={},
+                   quality='draft', priority=1)
+    checkpoint = Checkpoint(job_id)
+    checkpoint.start(request)
+    checkpoint.plan(TIMESTAMPS)
+    capture_screenshots(video_path, TIMESTAMPS[:3], cache=None, quality='draft', checkpoint=checkpoint)
+    framecrafter_web.job_store.create(job_id, status='processing', message='Capturing screenshots...', progress=40,
+                                      pdf_path=None, timestamp_notes={})
+
+    restored = []
+    original_restore = Checkpoint.restore
+
+    def counting_restore(self, timestamp, quality, index=0):
+        record = original_restore(self, timestamp, quality, index)
+        if record is not None:
+            restored.append(timestamp)
+        return record
+
+    monkeypatch.setattr(Checkpoint, 'restore', counting_restore)
+    assert framecrafter_web.resume_interrupted_jobs() == 1
+    job = wait_for_job(job_id)
+    assert job['status'] == 'completed'
+    # The checkpointed frames are reused and only the rest are captured
+    assert sorted(restored) == TIMESTAMPS[:3]
+    assert os.path.getsize(job['pdf_path']) > 0
+    assert not checkpoint.exists()
+    assert not os.path.exists(checkpoint.frames_dir)
@@ -0,0 +1,43 @@
+import json
+
+import framecrafter_web
+from conftest import wait_for_job
+from framecrafter_web import conversion_key
+
+# Custom timestamps with notes, spelled two ways that ask for the same PDF
+TIMESTAMPS = {"0:02.5": "Title slide", "5": "Summary"}
+RESPELLED = {"00:05": "Summary", "2.5": "Title slide"}
+
+def custom_key(url, notes, quality='draft'):
+    return conversion_key(url, 'custom', list(notes), None, notes, quality)
+
+def test_equivalent_requests_share_a_key():
+    watch_url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=3"
+    short_url = " https://youtu.be/dQw4w9WgXcQ "
+    assert custom_key(watch_url, TIMESTAMPS) == custom_key(short_url, RESPELLED)
+    assert (conversion_key(watch_url, 'interval', [], 30, {}, 'draft')
+            == conversion_key(short_url, 'interval', [], 30, {}, 'draft'))
+    # Anything that changes the PDF changes the key
+    assert custom_key(watch_url, TIMESTAMPS) != custom_key(watch_url, dict(TIMESTAMPS, **{"5": "Outro"}))
+    assert custom_key(watch_url, TIMESTAMPS) != custom_key(watch_url, TIMESTAMPS, quality='print')
+    assert custom_key(watch_url, TIMESTAMPS) != custom_key("https://youtu.be/aaaaaaaaaaa", TIMESTAMPS)
+    assert (conversion_key(watch_url, 'interval', [], 30, {}, 'draft')
+            != conversion_key(watch_url, 'interval', [], 30, {}, 'draft', fast_mode=True))
+    assert (conversion_key(watch_url, 'scenes', [], None, {}, 'draft', scene_threshold=0.3)
+            != conversion_key(watch_url, 'scenes', [], None, {}, 'draft', scene_threshold=0.4))
+
+def test_identical_requests_attach_to_the_job_in_flight(client, held_jobs):
+    first = client.post('/start_conversion', json={
+        'youtube_url': 'bench://test', 'mode': 'custom', 'quality': 'draft',
+        'timestamp_list': json.dumps(TIMESTAMPS)}).get_json()
+    second = client.post('/start_conversion', json={
+        'youtube_url': ' bench://test', 'mode': 'custom', 'quality': 'draft',
+        'timestamp_list': json.dumps(RESPELLED)}).get_json()
+    assert not first['attached']
+    assert second == {'job_id': first['job_id'], 'attached': True, 'subscribers': 2}
+    held_jobs.set()
+
+    job = wait_for_job(first['job_id'])
+    assert job['status'] == 'completed'
+    assert job['subscribers'] == 2
+    assert framecrafter_web.job_store.stats()['attached'] >= 1
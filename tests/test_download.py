@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+import framecrafter
+import framecrafter_web
+from conftest import wait_for_job
+
+# Interval request for the test video, resolved by the stub extractor
+REQUEST = {'youtube_url': 'bench://test', 'mode': 'interval', 'interval': 5, 'quality': 'draft'}
+
+@pytest.fixture(scope='module')
+def finished_job(client):
+    response = client.post('/start_conversion', json=REQUEST).get_json()
+    job = wait_for_job(response['job_id'])
+    assert job['status'] == 'completed'
+    with open(job['pdf_path'], 'rb') as f:
+        job['data'] = f.read()
+    return job
+
+def download(client, job, **headers):
+    response = client.get(f"/download/{job['pdf_filename']}", headers=headers)
+    data = response.get_data()
+    response.close()
+    return response, data
+
+def test_completed_job_stores_the_pdf_digest(client, finished_job):
+    assert finished_job['pdf_sha1'] == hashlib.sha1(finished_job['data']).hexdigest()
+    # A cached result carries the digest over without hashing the PDF again
+    response = client.post('/start_conversion', json=REQUEST).get_json()
+    assert response['cached']
+    cached_job = framecrafter_web.job_store.get(response['job_id'])
+    assert cached_job['pdf_sha1'] == finished_job['pdf_sha1']
+
+def test_download_sends_the_stored_digest_as_etag(client, finished_job):
+    response, data = download(client, finished_job)
+    assert response.status_code == 200
+    assert data == finished_job['data']
+    assert response.headers['ETag'] == f'"{finished_job["pdf_sha1"]}"'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+def test_download_with_matching_etag_is_not_modified(client, finished_job):
+    response, data = download(client, finished_job, **{'If-None-Match': f'"{finished_job["pdf_sha1"]}"'})
+    assert response.status_code == 304
+    assert data == b""
+
+def test_download_resumes_with_range_and_if_range(client, finished_job):
+    etag = f'"{finished_job["pdf_sha1"]}"'
+    response, head = download(client, finished_job, Range='bytes=0-99')
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f"bytes 0-99/{len(finished_job['data'])}"
+    response, tail = download(client, finished_job, Range='bytes=100-', **{'If-Range': etag})
+    assert response.status_code == 206
+    assert head + tail == finished_job['data']
+
+def test_download_with_stale_if_range_sends_the_whole_file(client, finished_job):
+    response, data = download(client, finished_job, Range='bytes=100-', **{'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert data == finished_job['data']
+
+def test_download_streams_a_pdf_until_its_job_completes(client, finished_job):
+    # The PDF is written by another process: only the job record says when it is finished
+    job_id = str(uuid.uuid4())
+    pdf_filename = f"Streamed_{job_id}.pdf"
+    pdf_path = os.path.join(framecrafter.Utils.get_pdf_dir(), pdf_filename)
+    content = finished_job['data']
+    with open(pdf_path, 'wb') as f:
+        f.write(content[:1000])
+    framecrafter_web.job_store.create(job_id, status='generating_pdf', pdf_filename=pdf_filename)
+
+    def finish():
+        time.sleep(0.3)
+        with open(pdf_path, 'ab') as f:
+            f.write(content[1000:])
+        framecrafter_web.job_store.transition(job_id, ('generating_pdf',), 'completed', pdf_path=pdf_path)
+
+    writer = threading.Thread(target=finish)
+    writer.start()
+    response, data = download(client, {'pdf_filename': pdf_filename})
+    writer.join()
+    assert response.status_code == 200
+    assert data == content
+    assert 'ETag' not in response.headers
+
+def test_download_hashes_files_without_a_job(client, finished_job):
+    pdf_filename = "Leftover_from_an_earlier_run.pdf"
+    with open(os.path.join(framecrafter.Utils.get_pdf_dir(), pdf_filename), 'wb') as f:
+        f.write(finished_job['data'])
+    response, _ = download(client, {'pdf_filename': pdf_filename})
+    assert response.headers['ETag'] == f'"{finished_job["pdf_sha1"]}"'
+
+def test_download_of_a_missing_file_is_not_found(client):
+    assert client.get("/download/missing.pdf").status_code == 404
+
+@pytest.mark.parametrize('filename', ['..', '.', '..%2F..%2Fetc%2Fpasswd', 'missing.pdf'])
+def test_download_only_tracks_pdf_files_in_the_pdf_dir(client, filename):
+    tracked = dict(framecrafter_web.artifacts.artifacts)
+    assert client.get(f"/download/{filename}").status_code == 404
+    assert framecrafter_web.artifacts.artifacts.keys() == tracked.keys()
+
+def test_artifacts_never_delete_directories_outside_the_temp_dir(tmp_path):
+    sentinel = tmp_path / "keep.txt"
+    sentinel.write_text("app file")
+    manager = framecrafter_web.ArtifactManager(max_bytes=0)
+    manager.add(str(tmp_path))
+    assert sentinel.exists()
+    assert str(tmp_path) not in manager.artifacts
@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+
+from framecrafter import ExtractorPool, MetadataCache
+
+# Extractor session standing in for yt_dlp.YoutubeDL; records the URLs it was asked to extract
+class StubSession:
+    def __init__(self, calls, delay=0.0, fail=False, expire=None):
+        self.calls = calls
+        self.delay = delay
+        self.fail = fail
+        self.expire = expire
+        self.closed = False
+
+    def extract_info(self, url, download=False):
+        self.calls.append(url)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("extractor failed")
+        query = f"?expire={self.expire}" if self.expire else ""
+        return {
+            'title': f"Title of {url}",
+            'duration': 90,
+            'formats': [
+                {'format_id': '18', 'ext': 'mp4', 'height': 360, 'vcodec': 'avc1', 'acodec': 'mp4a',
+                 'url': f"https://media.example/360{query}"},
+                {'format_id': '22', 'ext': 'mp4', 'height': 720, 'vcodec': 'avc1', 'acodec': 'mp4a',
+                 'url': f"https://media.example/720{query}"},
+                {'format_id': '137', 'ext': 'mp4', 'height': 1440, 'vcodec': 'avc1', 'acodec': 'none',
+                 'url': f"https://media.example/1440{query}"},
+            ],
+        }
+
+    def close(self):
+        self.closed = True
+
+# Clock the tests move forward by hand
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def make_cache(calls, clock=None, **session_options):
+    pool = ExtractorPool(size=2, factory=lambda: StubSession(calls, **session_options))
+    return MetadataCache(pool, ttl=600, expiry_margin=60, clock=clock or FakeClock())
+
+def test_pool_reuses_idle_sessions():
+    sessions = []
+    pool = ExtractorPool(size=2, factory=lambda: sessions.append(StubSession([])) or sessions[-1])
+    for _ in range(3):
+        with pool.session() as session:
+            session.extract_info("https://example.com/video")
+    assert pool.created == 1
+    assert len(sessions) == 1
+
+def test_pool_bounds_concurrent_sessions():
+    active, peak, lock = [0], [0], threading.Lock()
+
+    class CountingSession(StubSession):
+        def extract_info(self, url, download=False):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            try:
+                return super().extract_info(url, download)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+    pool = ExtractorPool(size=2, factory=lambda: CountingSession([], delay=0.05))
+
+    def extract(index):
+        with pool.session() as session:
+            session.extract_info(f"https://example.com/{index}")
+
+    threads = [threading.Thread(target=extract, args=(index,)) for index in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] <= 2
+    assert pool.created <= 2
+
+def test_pool_drops_a_session_that_failed():
+    sessions = []
+
+    def factory():
+        sessions.append(StubSession([], fail=not sessions))
+        return sessions[-1]
+
+    pool = ExtractorPool(size=1, factory=factory)
+    with pytest.raises(RuntimeError):
+        with pool.session() as session:
+            session.extract_info("https://example.com/video")
+    assert sessions[0].closed
+    with pool.session() as session:
+        assert session.extract_info("https://example.com/video")['duration'] == 90
+    assert pool.created == 2
+
+def test_metadata_cache_picks_the_best_format_and_serves_hits():
+    calls = []
+    cache = make_cache(calls)
+    info = cache.get("https://example.com/video")
+    # H.264 MP4 at 1080p or lower wins over the taller video-only format
+    assert (info['format_id'], info['height'], info['url']) == ('22', 720, "https://media.example/720")
+    assert info['title'] == "Title of https://example.com/video"
+    assert [f['format_id'] for f in info['formats']] == ['18', '22', '137']
+    assert cache.get("https://example.com/video") is info
+    assert calls == ["https://example.com/video"]
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'refreshes': 0, 'entries': 1, 'sessions': 1}
+
+def test_metadata_cache_shares_entries_between_url_spellings():
+    calls = []
+    cache = make_cache(calls)
+    cache.get("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42")
+    cache.get("https://youtu.be/dQw4w9WgXcQ")
+    cache.get("https://www.youtube.com/shorts/dQw4w9WgXcQ")
+    assert len(calls) == 1
+    assert MetadataCache.key("https://youtu.be/dQw4w9WgXcQ") == "youtube:dQw4w9WgXcQ"
+
+def test_metadata_cache_refreshes_after_ttl():
+    calls, clock = [], FakeClock()
+    cache = make_cache(calls, clock)
+    cache.get("https://example.com/video")
+    clock.now += 599
+    cache.get("https://example.com/video")
+    assert len(calls) == 1
+    clock.now += 2
+    cache.get("https://example.com/video")
+    assert len(calls) == 2
+    assert cache.stats()['refreshes'] == 1
+
+def test_metadata_cache_expires_before_the_stream_url_does():
+    calls, clock = [], FakeClock()
+    cache = make_cache(calls, clock, expire=int(clock.now) + 200)
+    info = cache.get("https://example.com/video")
+    # The signed URL expires at +200s; the entry goes expiry_margin (60s) earlier, well before the TTL
+    assert info['expires_at'] == clock.now + 140
+    clock.now += 141
+    cache.get("https://example.com/video")
+    assert len(calls) == 2
+
+def test_metadata_cache_extracts_once_for_concurrent_requests():
+    calls = []
+    cache = make_cache(calls, delay=0.1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("https://example.com/video")))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+def test_metadata_cache_invalidate_forces_extraction():
+    calls = []
+    cache = make_cache(calls)
+    cache.get("https://example.com/video")
+    cache.invalidate("https://example.com/video")
+    cache.get("https://example.com/video")
+    assert len(calls) == 2
+
+def test_metadata_cache_does_not_cache_failures():
+    calls = []
+    cache = make_cache(calls, fail=True)
+    with pytest.raises(RuntimeError):
+        cache.get("https://example.com/video")
+    assert cache.stats()['entries'] == 0
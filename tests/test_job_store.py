@@ -0,0 +1,144 @@
+import threading
+
+import pytest
+
+from framecrafter_web import MemoryJobStore, SQLiteJobStore
+
+# Clock the tests move forward by hand
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    def make(**options):
+        if request.param == 'memory':
+            return MemoryJobStore(**options)
+        return SQLiteJobStore(str(tmp_path / "jobs.db"), **options)
+    return make
+
+def test_transition_claims_a_job_once(make_store):
+    store = make_store()
+    store.create('job', status='queued')
+    results, start = [], threading.Barrier(8)
+
+    def claim():
+        start.wait()
+        results.append(store.transition('job', ('queued',), 'processing', message='Working'))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+    assert store.get('job')['status'] == 'processing'
+    assert store.get('job')['message'] == 'Working'
+
+def test_transition_and_update_of_unknown_jobs_fail(make_store):
+    store = make_store()
+    assert not store.transition('missing', None, 'completed')
+    assert not store.update('missing', progress=10)
+    assert store.get('missing') is None
+
+def test_attach_shares_live_jobs_and_counts_subscribers(make_store, tmp_path):
+    store = make_store()
+    assert store.attach('key', 'first', reuse_window=60, status='queued') == ('first', False)
+    assert store.attach('key', 'second', reuse_window=60, status='queued') == ('first', True)
+    assert store.get('first')['subscribers'] == 2
+    assert store.get('second') is None
+
+    # A finished job is shared while its PDF is on disk, a failed one never
+    pdf_path = tmp_path / "first.pdf"
+    pdf_path.write_bytes(b"%PDF")
+    store.transition('first', None, 'completed', pdf_path=str(pdf_path))
+    assert store.attach('key', 'third', reuse_window=60, status='queued') == ('first', True)
+    pdf_path.unlink()
+    assert store.attach('key', 'fourth', reuse_window=60, status='queued') == ('fourth', False)
+    store.transition('fourth', None, 'error')
+    assert store.attach('key', 'fifth', reuse_window=60, status='queued') == ('fifth', False)
+    assert store.stats()['attached'] == 2
+
+def test_attach_does_not_reuse_jobs_finished_before_the_window(make_store, tmp_path):
+    clock = FakeClock()
+    store = make_store(clock=clock)
+    pdf_path = tmp_path / "first.pdf"
+    pdf_path.write_bytes(b"%PDF")
+    store.attach('key', 'first', reuse_window=60, status='queued')
+    store.transition('first', None, 'completed', pdf_path=str(pdf_path))
+    clock.now += 61
+    assert store.attach('key', 'second', reuse_window=60, status='queued') == ('second', False)
+
+def test_cancel_only_stops_a_job_nobody_waits_for(make_store):
+    store = make_store()
+    store.attach('key', 'job', reuse_window=60, status='processing')
+    store.attach('key', 'other', reuse_window=60, status='queued')
+    assert store.cancel('job') == ('processing', 1)
+    assert store.cancel('job') == ('cancelled', 0)
+    # Finished jobs are left alone
+    store.create('done', status='completed', subscribers=1)
+    assert store.cancel('done') == ('completed', 1)
+    assert store.cancel('missing') is None
+
+def test_count_download(make_store):
+    store = make_store()
+    store.create('job', status='completed', subscribers=2)
+    assert store.count_download('job')['downloads'] == 1
+    assert store.count_download('job')['downloads'] == 2
+    assert store.count_download('missing') is None
+
+def test_records_expire_after_their_ttl(make_store):
+    clock = FakeClock()
+    store = make_store(ttl=10, clock=clock)
+    store.create('old', status='completed')
+    clock.now += 5
+    store.create('new', status='queued')
+    # Every write pushes the expiry back
+    clock.now += 6
+    assert store.get('old') is None
+    assert not store.update('old', progress=100)
+    assert store.update('new', progress=10)
+    assert store.expire() == 1
+    clock.now += 9
+    assert store.get('new') is not None
+    clock.now += 2
+    assert store.expire() == 1
+    assert store.stats()['jobs'] == 0
+
+def test_batched_updates_are_written_at_most_once_per_interval(tmp_path):
+    clock = FakeClock()
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"), flush_interval=0.5, clock=clock)
+    # Another process reading the same database
+    reader = SQLiteJobStore(str(tmp_path / "jobs.db"), clock=clock)
+    store.create('job', status='processing', progress=0)
+    for progress in (10, 20, 30):
+        store.update('job', batch=True, progress=progress)
+    assert store.get('job')['progress'] == 30
+    assert reader.get('job')['progress'] == 0
+    assert store.stats()['batched'] == 3
+
+    clock.now += 1
+    store.update('job', batch=True, progress=40)
+    assert reader.get('job')['progress'] == 40
+
+    # Any unbatched write takes the buffered fields with it
+    store.update('job', batch=True, progress=50)
+    store.update('job', details='Adding pages')
+    assert reader.get('job')['progress'] == 50
+
+def test_rejected_transition_keeps_buffered_progress(tmp_path):
+    clock = FakeClock()
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"), flush_interval=0.5, clock=clock)
+    reader = SQLiteJobStore(str(tmp_path / "jobs.db"), clock=clock)
+    store.create('job', status='processing', progress=0)
+    store.update('job', batch=True, progress=60, details='Capturing screenshot 6 of 10')
+    assert not store.transition('job', ('queued',), 'processing')
+    assert store.get('job')['progress'] == 60
+    assert reader.get('job')['progress'] == 0
+    # Flushed with the next write
+    store.update('job', message='Capturing screenshots...')
+    assert reader.get('job')['progress'] == 60
+    assert reader.get('job')['details'] == 'Capturing screenshot 6 of 10'
@@ -0,0 +1,81 @@
+import os
+import threading
+
+import pytest
+
+from framecrafter import FrameRecord
+from framecrafter_pdf import FramePipeline, capture_to_pdf
+
+def make_records(count):
+    return [FrameRecord(position, data=b"frame %d" % position) for position in range(count)]
+
+# Function to run capture on a thread, putting (position, record) pairs in the given order, then closing
+def produce(pipeline, items, error=None):
+    results = []
+
+    def run():
+        for position, record in items:
+            results.append(pipeline.put(position, record))
+        pipeline.close(error)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, results
+
+def test_records_are_yielded_in_order_and_early_ones_spill(tmp_path):
+    pipeline = FramePipeline(maxsize=2, spill_dir=str(tmp_path))
+    records = make_records(6)
+    # Position 3 failed; the rest arrive last first, so every record waits for position 0
+    items = [(position, None if position == 3 else records[position]) for position in reversed(range(6))]
+    thread, _ = produce(pipeline, items)
+    yielded = []
+    for record in pipeline:
+        yielded.append((record.timestamp, record.load()))
+        record.discard()
+    thread.join()
+    assert yielded == [(position, b"frame %d" % position) for position in (0, 1, 2, 4, 5)]
+    # Two early records fit in memory, the other two waited on disk
+    assert pipeline.spilled == 2
+    assert records[5].path is None and records[1].path is not None
+    assert pipeline.frames == 5
+    assert pipeline.finished
+    assert os.listdir(tmp_path) == []
+
+def test_stopped_capture_yields_what_arrived_in_order(tmp_path):
+    pipeline = FramePipeline(maxsize=4, spill_dir=str(tmp_path))
+    records = make_records(4)
+    thread, _ = produce(pipeline, [(3, records[3]), (0, records[0]), (2, records[2])])
+    assert [record.timestamp for record in pipeline] == [0, 2, 3]
+    thread.join()
+
+def test_capture_errors_reach_the_consumer(tmp_path):
+    pipeline = FramePipeline(maxsize=2, spill_dir=str(tmp_path))
+    thread, _ = produce(pipeline, [(0, make_records(1)[0])], error=RuntimeError("decoder failed"))
+    with pytest.raises(RuntimeError, match="decoder failed"):
+        list(pipeline)
+    thread.join()
+
+def test_abandon_releases_capture_and_discards_records(tmp_path):
+    pipeline = FramePipeline(maxsize=1, spill_dir=str(tmp_path))
+    records = make_records(3)
+    for record in records:
+        record.spill(str(tmp_path / f"frame_{record.timestamp}.png"))
+    # Capture blocks on the full queue until the consumer goes away
+    thread, results = produce(pipeline, [(0, records[0]), (1, records[1]), (2, records[2])])
+    frames = iter(pipeline)
+    assert next(frames).timestamp == 0
+    pipeline.abandon()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert False in results
+    # Only the record the consumer took is left for it to discard
+    assert os.listdir(tmp_path) == ["frame_0.png"]
+
+def test_capture_to_pdf_writes_every_frame_through_a_small_queue(video_path, tmp_path):
+    timestamps = [7, 1, 4, 2, 6]
+    spill_dir = tmp_path / "spill"
+    result = capture_to_pdf(video_path, timestamps, output_pdf=str(tmp_path / "pipelined.pdf"), cache=None,
+                            quality='draft', queue_size=1, spill_dir=str(spill_dir))
+    assert result['frames'] == len(timestamps)
+    assert os.path.getsize(result['pdf']) > 0
+    assert not spill_dir.exists() or os.listdir(spill_dir) == []
@@ -0,0 +1,116 @@
+import os
+import threading
+import functools
+import http.server
+
+import pytest
+
+from benchmarks.http_server import serve_directory
+from framecrafter import RangeFetcher, SegmentMap, capture_screenshots, fetch_segments, merge_ranges
+
+# Timestamps near the end of the 8-second test video; the GOPs before them are never fetched
+TIMESTAMPS = [6, 7]
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_merge_ranges_joins_close_ranges_and_splits_chunks():
+    assert merge_ranges([(50, 60), (0, 10), (12, 20)], gap=2) == [(0, 20), (50, 60)]
+    assert merge_ranges([(0, 10), (12, 20)], gap=0) == [(0, 10), (12, 20)]
+    assert merge_ranges([(0, 25)], gap=0, chunk_size=10) == [(0, 10), (10, 20), (20, 25)]
+
+def test_range_fetcher_reads_exact_bytes_over_one_connection(video_path, video_server):
+    url, server = video_server
+    data = read_file(video_path)
+    fetcher = RangeFetcher(url, connections=2)
+    try:
+        assert fetcher.read(0, 16) == data[:16]
+        assert fetcher.size == len(data)
+        assert fetcher.read(1000, 500) == data[1000:1500]
+        # Reads past the end return what is left
+        assert fetcher.read(len(data) - 10, 100) == data[-10:]
+        assert fetcher.read(0, 0) == b""
+    finally:
+        fetcher.close()
+    # Sequential reads reuse the keep-alive connection
+    assert fetcher.opened == 1
+    assert fetcher.requests == server.requests == 3
+    assert fetcher.bytes == 16 + 500 + 10
+
+def test_range_fetcher_fetches_ranges_concurrently(video_path, video_server):
+    url, _ = video_server
+    data = read_file(video_path)
+    ranges = [(offset, min(offset + 4096, len(data))) for offset in range(0, len(data), 4096)]
+    received = {}
+    fetcher = RangeFetcher(url, connections=3)
+    try:
+        fetcher.fetch(ranges, lambda offset, chunk: received.__setitem__(offset, chunk))
+    finally:
+        fetcher.close()
+    assert b"".join(received[start] for start, _ in ranges) == data
+    assert fetcher.opened <= 3
+
+# Plain http.server handler: answers every request with the whole file
+class NoRangeHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def test_range_fetcher_rejects_servers_without_range_support(video_path):
+    handler = functools.partial(NoRangeHandler, directory=os.path.dirname(video_path))
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        fetcher = RangeFetcher(f"http://127.0.0.1:{server.server_port}/{os.path.basename(video_path)}")
+        with pytest.raises(ValueError, match="range requests"):
+            fetcher.read(0, 16)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_range_fetcher_reports_http_errors(video_server):
+    url, _ = video_server
+    fetcher = RangeFetcher(url + ".missing")
+    with pytest.raises(ValueError, match="HTTP 404"):
+        fetcher.read(0, 16)
+
+def test_segment_map_indexes_gops_from_the_moov_box(video_path, video_server):
+    url, _ = video_server
+    fetcher = RangeFetcher(url)
+    try:
+        segment_map = SegmentMap.build(fetcher)
+    finally:
+        fetcher.close()
+    assert segment_map.source == 'moov'
+    assert segment_map.size == os.path.getsize(video_path)
+    # One unit per GOP: a keyframe every 12 frames at 30 fps
+    assert segment_map.unit_starts[0] == 0
+    assert segment_map.unit_starts[1] == pytest.approx(0.4, abs=0.01)
+    assert segment_map.unit_starts == sorted(segment_map.unit_starts)
+    assert len(segment_map.unit_starts) == 20
+
+    ranges, units = segment_map.ranges_for(TIMESTAMPS)
+    assert units < len(segment_map.unit_starts)
+    assert sum(end - start for start, end in ranges) < segment_map.size
+    # The container boxes are part of every fetch
+    for start, end in segment_map.header_ranges:
+        assert any(r_start <= start and end <= r_end for r_start, r_end in ranges)
+
+def test_segment_map_rejects_files_that_are_not_mp4(tmp_path):
+    (tmp_path / "notes.bin").write_bytes(b"\0" * 4096)
+    with serve_directory(str(tmp_path)) as (base_url, _):
+        assert fetch_segments(f"{base_url}/notes.bin", TIMESTAMPS, str(tmp_path / "out.mp4")) is None
+
+def test_fetch_segments_builds_a_sparse_copy_that_decodes(video_path, video_server, tmp_path):
+    url, server = video_server
+    output_path = str(tmp_path / "sparse.mp4")
+    stats = fetch_segments(url, TIMESTAMPS, output_path, connections=2)
+    assert stats['source'] == 'moov'
+    assert stats['size'] == os.path.getsize(output_path) == os.path.getsize(video_path)
+    assert stats['fetched'] == server.bytes_sent < stats['size']
+    assert stats['connections'] <= 2
+
+    sparse = capture_screenshots(output_path, TIMESTAMPS, cache=None)
+    full = capture_screenshots(video_path, TIMESTAMPS, cache=None)
+    assert [record.timestamp for record in sparse] == TIMESTAMPS
+    assert [record.dhash for record in sparse] == [record.dhash for record in full]